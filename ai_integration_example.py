@@ -4,19 +4,42 @@ Este arquivo demonstra como você pode adicionar funcionalidades de IA ao app
 
 Para usar:
 1. Instale: pip install openai anthropic
-2. Configure suas chaves de API
-3. Adicione as rotas ao app.py
+2. Configure suas chaves de API (OPENAI_API_KEY, ANTHROPIC_API_KEY)
+3. Geração de roteiros e análise já estão no app: /ai/generate_script e /ai/analyze
 4. Integre ao frontend
 """
 
 import os
 from typing import List, Dict
 
+import script_generation
+
+# Gerador compartilhado pelas funções abaixo (no app, é o de /ai/generate_script)
+_script_generator = None
+
+
+def _generator():
+    global _script_generator
+    if _script_generator is None:
+        from config import get_config
+        settings = get_config(os.environ.get('FLASK_ENV', 'development'))
+        _script_generator = script_generation.ScriptGenerator(
+            script_generation.create_providers(settings),
+            input_tokens=settings.SCRIPT_INPUT_TOKENS,
+            max_tokens=settings.SCRIPT_MAX_TOKENS,
+            ttl_hours=settings.SCRIPT_CACHE_HOURS
+        )
+    return _script_generator
+
+
 # Exemplo com OpenAI GPT
 def generate_script_with_openai(transcriptions: List[Dict]) -> str:
     """
     Gera um novo roteiro baseado nas transcrições usando OpenAI GPT
     
+    Implementado em script_generation.py (cache, orçamento de tokens e
+    cliente reaproveitado); no app, use a rota /ai/generate_script.
+    
     Args:
         transcriptions: Lista de dicionários com transcrições
         
@@ -24,44 +47,7 @@ def generate_script_with_openai(transcriptions: List[Dict]) -> str:
         Roteiro gerado
     """
     try:
-        import openai
-        
-        # Configure sua chave API
-        openai.api_key = os.environ.get('OPENAI_API_KEY')
-        
-        # Combinar transcrições
-        combined_text = "\n\n---\n\n".join([
-            f"Vídeo {i+1} ({t.get('language', 'unknown')}):\n{t['text']}"
-            for i, t in enumerate(transcriptions)
-        ])
-        
-        # Criar prompt
-        prompt = f"""
-        Analise as seguintes transcrições de vídeos e crie um novo roteiro criativo
-        que combine os melhores elementos de cada um:
-        
-        {combined_text}
-        
-        Crie um roteiro estruturado com:
-        - Gancho inicial (10s)
-        - Desenvolvimento (corpo principal)
-        - Conclusão/CTA
-        
-        Mantenha o estilo e tom similares aos vídeos originais.
-        """
-        
-        response = openai.ChatCompletion.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "Você é um criador de roteiros para vídeos curtos."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=1500
-        )
-        
-        return response.choices[0].message.content
-        
+        return _generator().start(transcriptions, 'openai').result()
     except Exception as e:
         return f"Erro ao gerar roteiro: {str(e)}"
 
@@ -78,70 +64,28 @@ def generate_script_with_claude(transcriptions: List[Dict]) -> str:
         Roteiro gerado
     """
     try:
-        import anthropic
-        
-        # Configure sua chave API
-        client = anthropic.Anthropic(
-            api_key=os.environ.get('ANTHROPIC_API_KEY')
-        )
-        
-        # Combinar transcrições
-        combined_text = "\n\n---\n\n".join([
-            f"Vídeo {i+1} ({t.get('language', 'unknown')}):\n{t['text']}"
-            for i, t in enumerate(transcriptions)
-        ])
-        
-        # Criar prompt
-        prompt = f"""
-        Analise as seguintes transcrições de vídeos e crie um novo roteiro criativo:
-        
-        {combined_text}
-        
-        Crie um roteiro para vídeo curto (até 60 segundos) com estrutura clara.
-        """
-        
-        message = client.messages.create(
-            model="claude-3-5-sonnet-20241022",
-            max_tokens=1500,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        return message.content[0].text
-        
+        return _generator().start(transcriptions, 'claude').result()
     except Exception as e:
         return f"Erro ao gerar roteiro: {str(e)}"
 
 
-# Exemplo de análise de conteúdo
+# Análise de conteúdo (implementada em analysis.py e exposta em /ai/analyze)
 def analyze_video_content(transcription: Dict) -> Dict:
     """
     Analisa o conteúdo de uma transcrição
     
     Returns:
-        Dicionário com análises
+        Dicionário com contagens, palavras-chave (TF-IDF contra o corpus),
+        hashtags, momentos-chave e resumo extrativo
     """
-    text = transcription.get('text', '')
+    import analysis
     
-    # Análises básicas
-    analysis = {
-        'word_count': len(text.split()),
-        'char_count': len(text),
-        'language': transcription.get('language', 'unknown'),
-        'duration': transcription.get('duration', 0),
-        'sentiment': 'neutral',  # Placeholder
-        'topics': [],  # Placeholder
-        'keywords': []  # Placeholder
-    }
-    
-    # Aqui você pode adicionar:
+    # Aqui você ainda pode adicionar:
     # - Análise de sentimento (TextBlob, VADER, etc.)
     # - Extração de tópicos (LDA, NMF)
-    # - Extração de palavras-chave (TF-IDF, RAKE)
     # - Detecção de entidades (spaCy, NLTK)
     
-    return analysis
+    return analysis.analyze(transcription)
 
 
 # Exemplo de resumo automático
@@ -184,7 +128,7 @@ def generate_summary(transcription: Dict, max_sentences: int = 3) -> str:
         return '. '.join(sentences[:max_sentences]) + '.'
 
 
-# Exemplo de detecção de momentos-chave
+# Detecção de momentos-chave
 def detect_key_moments(transcription: Dict) -> List[Dict]:
     """
     Detecta momentos-chave no vídeo baseado na transcrição
@@ -192,31 +136,11 @@ def detect_key_moments(transcription: Dict) -> List[Dict]:
     Returns:
         Lista de momentos com timestamp e descrição
     """
-    segments = transcription.get('segments', [])
-    key_moments = []
-    
-    # Palavras que indicam momentos importantes
-    keywords = [
-        'importante', 'lembre-se', 'crucial', 'essencial', 
-        'primeiro', 'segundo', 'terceiro', 'finalmente',
-        'atenção', 'cuidado', 'dica', 'segredo'
-    ]
-    
-    for segment in segments:
-        text = segment.get('text', '').lower()
-        
-        # Verificar se contém palavras-chave
-        if any(keyword in text for keyword in keywords):
-            key_moments.append({
-                'timestamp': segment.get('start', 0),
-                'text': segment.get('text', ''),
-                'importance': 'high'
-            })
-    
-    return key_moments
+    import analysis
+    return analysis.detect_key_moments(transcription.get('segments', []))
 
 
-# Exemplo de geração de hashtags
+# Geração de hashtags
 def generate_hashtags(transcription: Dict, max_tags: int = 10) -> List[str]:
     """
     Gera hashtags relevantes baseadas na transcrição
@@ -224,64 +148,5 @@ def generate_hashtags(transcription: Dict, max_tags: int = 10) -> List[str]:
     Returns:
         Lista de hashtags
     """
-    # Implementação básica
-    # Você pode melhorar com NLP mais avançado
-    
-    text = transcription.get('text', '').lower()
-    words = text.split()
-    
-    # Palavras comuns para remover
-    stopwords = {'o', 'a', 'de', 'da', 'do', 'em', 'um', 'uma', 'os', 'as'}
-    
-    # Contar frequência
-    from collections import Counter
-    word_freq = Counter(
-        word for word in words 
-        if len(word) > 3 and word not in stopwords
-    )
-    
-    # Pegar as mais frequentes
-    top_words = [word for word, _ in word_freq.most_common(max_tags)]
-    
-    # Converter para hashtags
-    hashtags = [f"#{word}" for word in top_words]
-    
-    return hashtags
-
-
-# Rotas Flask para adicionar ao app.py
-"""
-@app.route('/ai/generate_script', methods=['POST'])
-def ai_generate_script():
-    data = request.get_json()
-    transcriptions = data.get('transcriptions', [])
-    
-    # Escolher provedor de IA
-    provider = data.get('provider', 'openai')
-    
-    if provider == 'openai':
-        script = generate_script_with_openai(transcriptions)
-    elif provider == 'claude':
-        script = generate_script_with_claude(transcriptions)
-    else:
-        return jsonify({'error': 'Provedor inválido'}), 400
-    
-    return jsonify({'script': script})
-
-@app.route('/ai/analyze', methods=['POST'])
-def ai_analyze():
-    data = request.get_json()
-    transcription = data.get('transcription', {})
-    
-    analysis = analyze_video_content(transcription)
-    summary = generate_summary(transcription)
-    key_moments = detect_key_moments(transcription)
-    hashtags = generate_hashtags(transcription)
-    
-    return jsonify({
-        'analysis': analysis,
-        'summary': summary,
-        'key_moments': key_moments,
-        'hashtags': hashtags
-    })
-"""
+    import analysis
+    return analysis.analyze(transcription, max_keywords=max(max_tags, 10), max_hashtags=max_tags)['hashtags']
@@ -0,0 +1,372 @@
+"""
+Análise das transcrições: palavras-chave, hashtags, momentos-chave e resumo
+
+Cada texto é tokenizado uma única vez. As palavras-chave saem de TF-IDF contra
+uma tabela de frequência de documentos (DF) do corpus inteiro, mantida em
+SQLite e atualizada a cada vídeo processado: uma palavra frequente no vídeo
+mas rara no corpus pesa mais do que uma que aparece em todo vídeo.
+
+Um lote de transcrições é processado de uma vez em vetores esparsos do NumPy
+(ids dos termos, contagens e deslocamentos por documento, como em CSR). Os
+momentos-chave são encontrados por uma única regex compilada com todas as
+expressões, aplicada uma vez ao texto de todos os segmentos.
+"""
+
+import bisect
+import math
+import re
+import time
+from collections import Counter
+
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    video_id TEXT PRIMARY KEY,
+    terms INTEGER NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS term_df (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Palavras de pelo menos 3 letras (números e sublinhados não viram palavra-chave)
+_TOKEN = re.compile(r'[^\W\d_]{3,}', re.UNICODE)
+_SENTENCE = re.compile(r'(?<=[.!?])\s+')
+
+STOPWORDS = frozenset("""
+a à ao aos as às até com como da das de dela dele deles depois do dos e é ela elas ele eles em entre era
+essa essas esse esses esta está estão estas este estes eu foi for foram há isso isto já lá lhe mais mas
+me mesmo meu minha muito na não nas nem no nos nós o os ou para pela pelas pelo pelos por porque pra
+qual quando que quem se sem ser seu seus só sua suas também te tem têm tá tô um uma umas uns vai vão
+você vocês aqui ali então assim agora ainda tipo coisa coisas gente né sim bem vou vamos tudo todo toda
+todos todas nada cada onde sobre ter fazer faz fiz estou estava pode podem aí hoje gente cara
+the and for are but not you your with this that these those have has had was were been being from they
+them their there here what which who whom when where why how all any both each few more most other
+some such only own same than too very can will just should now into out about over again then once
+our ours its it's i'm don't also because would could get got like just really yeah okay well going
+el la los las del al una unos unas por con para que como pero más sus les este esta estos estas ese
+esa eso ya muy porque cuando donde también hay está están ser fue son tiene tienen hacer todo nada
+""".split())
+
+# Expressões que costumam marcar momentos importantes, por categoria
+KEY_PHRASES = {
+    'emphasis': (
+        'importante', 'muito importante', 'lembre-se', 'lembrem', 'crucial', 'essencial', 'fundamental',
+        'presta atenção', 'preste atenção', 'atenção', 'important', 'remember', 'key point', 'essential',
+        'pay attention', 'importante recordar', 'recuerda',
+    ),
+    'sequence': (
+        'primeiro', 'primeira', 'segundo passo', 'terceiro', 'passo a passo', 'por último', 'finalmente',
+        'first', 'step one', 'next step', 'finally', 'primero', 'por último', 'paso',
+    ),
+    'warning': (
+        'cuidado', 'não faça', 'nunca', 'erro comum', 'evite', 'careful', 'warning', "don't", 'never',
+        'mistake', 'avoid', 'nunca hagas', 'error común',
+    ),
+    'tip': (
+        'dica', 'segredo', 'truque', 'macete', 'o segredo', 'tip', 'secret', 'trick', 'hack', 'consejo',
+        'secreto', 'truco',
+    ),
+    'conclusion': (
+        'resumindo', 'em resumo', 'conclusão', 'para concluir', 'in summary', 'to sum up', 'in conclusion',
+        'en resumen', 'para terminar',
+    ),
+}
+
+_PHRASE_CATEGORY = {
+    ' '.join(phrase.lower().split()): category
+    for category, phrases in KEY_PHRASES.items()
+    for phrase in phrases
+}
+
+
+def _trie_pattern(phrases):
+    """
+    Alternativa de regex fatorada em trie: prefixos comuns são testados uma
+    vez só, em vez de uma tentativa por expressão em cada posição do texto
+    """
+    trie = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node):
+        end = '' in node
+        branches = [
+            (r'\s+' if char == ' ' else re.escape(char)) + build(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 and not end else '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if end else pattern
+
+    return build(trie)
+
+
+# Uma única regex com todas as expressões, aplicada ao texto já em minúsculas
+# (bem mais rápido que re.IGNORECASE)
+_KEY_PHRASE = re.compile(r'\b' + _trie_pattern(_PHRASE_CATEGORY) + r'(?!\w)')
+
+# Termos por consulta IN (limite de parâmetros do SQLite)
+_QUERY_CHUNK = 900
+
+
+def _db():
+    return storage.connect('analysis', _SCHEMA)
+
+
+def tokenize(text):
+    """Palavras em minúsculas, sem stopwords, na ordem do texto"""
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _document_frequencies(db, terms):
+    frequencies = {}
+    for start in range(0, len(terms), _QUERY_CHUNK):
+        chunk = terms[start:start + _QUERY_CHUNK]
+        rows = db.execute(
+            f"SELECT term, df FROM term_df WHERE term IN ({', '.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        frequencies.update((row['term'], row['df']) for row in rows)
+    return frequencies
+
+
+def add_to_corpus(video_id, tokens):
+    """Conta os termos de um vídeo na tabela DF do corpus (uma vez por vídeo)"""
+    terms = sorted(set(tokens))
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        inserted = db.execute(
+            'INSERT OR IGNORE INTO documents (video_id, terms, added_at) VALUES (?, ?, ?)',
+            (video_id, len(terms), time.time())
+        ).rowcount
+        if inserted:
+            db.executemany(
+                'INSERT INTO term_df (term, df) VALUES (?, 1) ON CONFLICT (term) DO UPDATE SET df = df + 1',
+                [(term,) for term in terms]
+            )
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    return bool(inserted)
+
+
+def remove_from_corpus(video_id, tokens):
+    """
+    Tira um vídeo do corpus (retenção)
+
+    Args:
+        tokens: Tokens do texto do vídeo, os mesmos contados em add_to_corpus
+    """
+    terms = sorted(set(tokens))
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        deleted = db.execute('DELETE FROM documents WHERE video_id = ?', (video_id,)).rowcount
+        if deleted and terms:
+            db.executemany('UPDATE term_df SET df = df - 1 WHERE term = ?', [(term,) for term in terms])
+            db.execute('DELETE FROM term_df WHERE df <= 0')
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    return bool(deleted)
+
+
+def corpus_size():
+    """Quantidade de vídeos no corpus"""
+    return _db().execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+
+
+def extract_keywords(token_lists, max_keywords=10, in_corpus=None):
+    """
+    Palavras-chave por TF-IDF de um lote de documentos já tokenizados
+
+    Args:
+        token_lists: Uma lista de tokens por documento
+        max_keywords: Palavras-chave por documento
+        in_corpus: Para cada documento, se ele já está contado na DF do
+            corpus; os que não estão entram na DF só durante este cálculo
+
+    Returns:
+        Para cada documento, lista de (termo, score) do mais para o menos relevante
+    """
+    import numpy as np
+
+    # Vocabulário do lote e documentos como vetores esparsos (ids + contagens)
+    vocabulary = {}
+    ids, counts, indptr = [], [], [0]
+    for tokens in token_lists:
+        frequencies = Counter(tokens)
+        ids.append(np.fromiter((vocabulary.setdefault(term, len(vocabulary)) for term in frequencies),
+                               dtype=np.int64, count=len(frequencies)))
+        counts.append(np.fromiter(frequencies.values(), dtype=np.int64, count=len(frequencies)))
+        indptr.append(indptr[-1] + len(frequencies))
+    if not vocabulary:
+        return [[] for _ in token_lists]
+    ids = np.concatenate(ids)
+    counts = np.concatenate(counts).astype(np.float64)
+    lengths = np.diff(indptr)
+    terms = list(vocabulary)
+
+    db = _db()
+    stored = _document_frequencies(db, terms)
+    df = np.fromiter((stored.get(term, 0) for term in terms), dtype=np.float64, count=len(terms))
+    documents = corpus_size()
+    outside = np.ones(len(token_lists), dtype=bool) if in_corpus is None else ~np.asarray(in_corpus, dtype=bool)
+    if outside.any():
+        df += np.bincount(ids[np.repeat(outside, lengths)], minlength=len(terms))
+        documents += int(outside.sum())
+
+    # TF sublinear e IDF suavizado
+    idf = np.log((1 + documents) / (1 + df)) + 1
+    scores = (1 + np.log(counts)) * idf[ids]
+
+    keywords = []
+    for index in range(len(token_lists)):
+        start, end = indptr[index], indptr[index + 1]
+        if start == end:
+            keywords.append([])
+            continue
+        doc_scores = scores[start:end]
+        top = min(max_keywords, end - start)
+        best = np.argpartition(-doc_scores, top - 1)[:top]
+        best = best[np.argsort(-doc_scores[best])]
+        keywords.append([(terms[ids[start + i]], round(float(doc_scores[i]), 4)) for i in best])
+    return keywords
+
+
+def detect_key_moments(segments):
+    """
+    Segmentos com expressões de destaque ("importante", "dica", "cuidado"...)
+
+    Uma única busca da regex sobre o texto de todos os segmentos; cada
+    ocorrência é levada ao seu segmento pelos deslocamentos.
+    """
+    # Deslocamentos medidos no texto em minúsculas (lower() pode mudar o tamanho)
+    texts = [segment.get('text', '').lower() for segment in segments]
+    offsets = []
+    position = 0
+    for text in texts:
+        offsets.append(position)
+        position += len(text) + 1
+    joined = '\n'.join(texts)
+
+    found = {}
+    for match in _KEY_PHRASE.finditer(joined):
+        index = bisect.bisect_right(offsets, match.start()) - 1
+        phrase = ' '.join(match.group(0).split())
+        found.setdefault(index, []).append((phrase, _PHRASE_CATEGORY.get(phrase, 'emphasis')))
+
+    moments = []
+    for index in sorted(found):
+        matches = found[index]
+        segment = segments[index]
+        moments.append({
+            'timestamp': segment.get('start', 0),
+            'end': segment.get('end'),
+            'text': segment.get('text', '').strip(),
+            'phrases': sorted({phrase for phrase, _ in matches}),
+            'category': matches[0][1],
+            'importance': 'high' if len(matches) > 1 or matches[0][1] == 'emphasis' else 'medium',
+        })
+    return moments
+
+
+def _score_sentences(sentences, weights):
+    """(peso, posição) de cada frase com palavras"""
+    scored = []
+    for position, sentence in enumerate(sentences):
+        tokens = tokenize(sentence)
+        if tokens:
+            # Raiz do tamanho: frases longas não ganham só por serem longas
+            scored.append((sum(weights.get(token, 0) for token in tokens) / math.sqrt(len(tokens)), position))
+    return sorted(scored, reverse=True)
+
+
+def _split_sentences(text):
+    return [sentence.strip() for sentence in _SENTENCE.split(text) if sentence.strip()]
+
+
+def summarize(text, weights, max_sentences=3):
+    """Resumo extrativo: as frases com maior peso de palavras-chave, na ordem original"""
+    sentences = _split_sentences(text)
+    if len(sentences) <= max_sentences:
+        return ' '.join(sentences)
+    chosen = sorted(position for _, position in _score_sentences(sentences, weights)[:max_sentences])
+    return ' '.join(sentences[position] for position in chosen)
+
+
+def condense(text, weights, max_chars):
+    """
+    Reduz um texto a no máximo `max_chars` caracteres
+
+    Ficam as frases de maior peso que couberem, na ordem original; um texto
+    sem pontuação (ou com uma frase maior que o limite) é cortado no fim da
+    última palavra que couber.
+    """
+    if len(text) <= max_chars:
+        return text
+    sentences = _split_sentences(text)
+    chosen, used = [], 0
+    for _, position in _score_sentences(sentences, weights):
+        size = len(sentences[position]) + 1
+        if used + size <= max_chars:
+            chosen.append(position)
+            used += size
+    if not chosen:
+        return text[:max_chars].rsplit(' ', 1)[0]
+    return ' '.join(sentences[position] for position in sorted(chosen))
+
+
+def analyze_batch(transcriptions, max_keywords=10, max_hashtags=8, max_sentences=3, update_corpus=False):
+    """
+    Analisa um lote de transcrições de uma vez
+
+    Args:
+        transcriptions: Dicionários com 'text', 'segments' e, opcionalmente,
+            'video_id', 'language' e 'duration'
+        update_corpus: Adiciona ao corpus os documentos com 'video_id'
+
+    Returns:
+        Uma análise por transcrição: contagens, keywords, hashtags,
+        key_moments e summary
+    """
+    token_lists = [tokenize(transcription.get('text') or '') for transcription in transcriptions]
+
+    in_corpus = []
+    for transcription, tokens in zip(transcriptions, token_lists):
+        counted = bool(update_corpus and transcription.get('video_id') and tokens)
+        if counted:
+            add_to_corpus(transcription['video_id'], tokens)
+        in_corpus.append(counted)
+    keywords = extract_keywords(token_lists, max_keywords, in_corpus)
+
+    results = []
+    for transcription, tokens, doc_keywords in zip(transcriptions, token_lists, keywords):
+        text = transcription.get('text') or ''
+        results.append({
+            'word_count': len(text.split()),
+            'char_count': len(text),
+            'unique_terms': len(set(tokens)),
+            'language': transcription.get('language', 'unknown'),
+            'duration': transcription.get('duration', 0),
+            'keywords': [{'term': term, 'score': score} for term, score in doc_keywords],
+            'hashtags': ['#' + term for term, _ in doc_keywords[:max_hashtags]],
+            'key_moments': detect_key_moments(transcription.get('segments') or []),
+            'summary': summarize(text, dict(doc_keywords), max_sentences),
+        })
+    return results
+
+
+def analyze(transcription, **options):
+    """Analisa uma transcrição (atalho para analyze_batch)"""
+    return analyze_batch([transcription], **options)[0]
@@ -1,32 +1,133 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response
 import os
-import yt_dlp
 from pathlib import Path
 import json
+import glob
+import hashlib
+import mimetypes
 from datetime import datetime
 import uuid
 import subprocess
+import threading
+import time
+
+import storage
+import jobs
+import media
+import file_index
+import retention
+import metrics
+import transcript_index
+import transcript_store
+import analysis
+import fingerprint
+import script_generation
+from language import resolve_language, normalize_language, remember_language
+from captions import fetch_captions
+from result_cache import ResultCache, normalize_url
+from transcription_service import TranscriptionClient, TranscriptionUnavailable, service_settings
+from transcription_backends import create_backend, backend_options
+from concurrency import DownloadLimiter
+from throttling import AdaptiveThrottle, TransientError, backoff_delay, is_transient
+from platforms import detect_platform, platform_profile, PLATFORM_PROFILES
+from ytdlp_pool import YoutubeDLPool
+from config import get_config
+
+settings = get_config(os.environ.get('FLASK_ENV', 'development'))
+
+# Modos de processamento, escolhidos por URL em /process_videos
+MODE_FULL = 'full'  # Vídeo + transcrição (padrão)
+MODE_TRANSCRIPT = 'transcript'  # Só a transcrição: baixa apenas o áudio de menor bitrate
+MODE_METADATA = 'metadata'  # Só título, duração e thumbnail, sem download
+PROCESSING_MODES = (MODE_FULL, MODE_TRANSCRIPT, MODE_METADATA)
+
+DOWNLOAD_FORMATS = {
+    MODE_FULL: 'best[ext=mp4]/best',
+    # Plataformas sem faixa só de áudio (TikTok, Instagram) caem no menor vídeo
+    MODE_TRANSCRIPT: 'worstaudio/worst',
+}
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
 app.config['UPLOAD_FOLDER'] = '/app/downloads'  # Caminho absoluto
 app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max
+# X-Sendfile: o servidor da frente (Apache/lighttpd) lê o arquivo, não o worker
+app.config['USE_X_SENDFILE'] = settings.SENDFILE_MODE == 'x-sendfile'
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 app.config['UPLOAD_FOLDER'] = os.path.join(BASE_DIR, 'downloads')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Bancos SQLite (fila de jobs, caches e índices)
+storage.init_storage(os.path.join(BASE_DIR, settings.DATA_FOLDER))
+
+# Instâncias do yt-dlp reaproveitadas entre jobs: conexões HTTP, cookies e
+# extratores já inicializados (cabeçalhos de TikTok/Instagram em platforms.py)
+ydl_pool = YoutubeDLPool(
+    base_options={
+        'quiet': False,
+        'no_warnings': False,
+        'extractor_retries': 3,
+        'fragment_retries': 3,
+        'skip_unavailable_fragments': True,
+        # Novas tentativas do próprio yt-dlp também esperam, em vez de insistir na hora
+        # (o yt-dlp chama sleep_func(n=tentativa - 1), sempre por nome)
+        'retry_sleep_functions': {
+            kind: (lambda n: backoff_delay(n + 1, 1, 30))
+            for kind in ('http', 'fragment', 'extractor')
+        },
+    },
+    profiles=PLATFORM_PROFILES,
+    variants={
+        'mp3': {
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }],
+        },
+    },
+    max_idle=settings.YTDLP_POOL_MAX_IDLE,
+    max_uses=settings.YTDLP_SESSION_MAX_USES
+)
+
+# Vagas de download compartilhadas por todos os workers do container, com
+# taxa e vagas por plataforma ajustadas conforme os bloqueios recebidos
+platform_throttle = AdaptiveThrottle(
+    per_minute=settings.DOWNLOADS_PER_MINUTE,
+    default_per_minute=settings.DEFAULT_DOWNLOADS_PER_MINUTE,
+    min_per_minute=settings.MIN_DOWNLOADS_PER_MINUTE,
+    burst=settings.RATE_LIMIT_BURST,
+    cooldown=settings.RATE_LIMIT_COOLDOWN_SECONDS
+)
+download_limiter = DownloadLimiter(
+    settings.MAX_CONCURRENT_DOWNLOADS,
+    lock_dir=os.path.join(storage.get_data_folder(), 'locks'),
+    per_host=settings.MAX_DOWNLOADS_PER_HOST,
+    default_per_host=settings.DEFAULT_DOWNLOADS_PER_HOST,
+    throttle=platform_throttle
+)
+
+
+# Serviço de transcrição compartilhado (iniciado pelo gunicorn.conf.py)
+transcription_client = None
+if settings.TRANSCRIPTION_SERVICE:
+    transcription_client = TranscriptionClient(*service_settings(settings, BASE_DIR)[:2])
 
-# Carregar modelo Whisper (usa o modelo base por padrão)
-whisper_model = None
+# Motor de transcrição local, usado apenas quando o serviço não está disponível
+local_backend = None
+local_backend_lock = threading.Lock()
 
-def get_whisper_model():
-    global whisper_model
-    if whisper_model is None:
-        import whisper
-        whisper_model = whisper.load_model("base")
-    return whisper_model
+def get_local_backend():
+    global local_backend
+    with local_backend_lock:
+        if local_backend is None:
+            backend = create_backend(settings.TRANSCRIPTION_BACKEND, **backend_options(settings))
+            with metrics.stage_timer('model_load', backend=settings.TRANSCRIPTION_BACKEND):
+                backend.load()
+            local_backend = backend
+    return local_backend
 
 @app.route('/')
 def index():
@@ -34,6 +135,7 @@ def index():
 
 @app.route('/process_videos', methods=['POST'])
 def process_videos():
+    """Enfileira as URLs e retorna imediatamente os IDs dos jobs"""
     try:
         data = request.get_json()
         urls = data.get('urls', [])
@@ -41,172 +143,450 @@ def process_videos():
         if not urls:
             return jsonify({'error': 'Nenhum URL fornecido'}), 400
         
-        results = []
+        try:
+            items = [job_item(entry, data) for entry in urls]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        for url in urls:
-            try:
-                result = process_single_video(url)
-                results.append(result)
-            except Exception as e:
-                results.append({
-                    'url': url,
-                    'error': str(e),
-                    'success': False
-                })
+        batch_id, batch_jobs = job_queue.submit_batch(items)
         
-        return jsonify({'results': results})
+        return jsonify({
+            'batch_id': batch_id,
+            'status_url': f'/batches/{batch_id}',
+            'events_url': f'/batches/{batch_id}/events',
+            'jobs': [
+                {
+                    'job_id': job['job_id'],
+                    'url': job['url'],
+                    'mode': job['options']['mode'],
+                    'status': job['status'],
+                    'status_url': f"/jobs/{job['job_id']}"
+                }
+                for job in batch_jobs
+            ]
+        }), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def process_single_video(url):
-    """Processa um único vídeo: download e transcrição - APENAS ID, SEM NOME"""
-    video_id = str(uuid.uuid4()).replace('-', '')[:16]  # ID de 16 caracteres sem hífens
+def job_item(entry, defaults):
+    """
+    Converte uma entrada de 'urls' em um item da fila
     
-    print(f"[INFO] Processando vídeo ID: {video_id}")
-    print(f"[INFO] URL: {url}")
-    print(f"[INFO] Pasta downloads: {app.config['UPLOAD_FOLDER']}")
+    A entrada pode ser só o link ou {'url', 'mode', 'language'}; o que faltar
+    vem dos campos de mesmo nome no corpo da requisição.
+    """
+    if isinstance(entry, str):
+        entry = {'url': entry}
+    if not isinstance(entry, dict) or not isinstance(entry.get('url'), str) or not entry['url'].strip():
+        raise ValueError(f'URL inválido: {entry}')
     
-    # Detectar plataforma
-    is_tiktok = 'tiktok.com' in url.lower()
-    is_instagram = 'instagram.com' in url.lower()
+    mode = entry.get('mode') or defaults.get('mode') or MODE_FULL
+    if mode not in PROCESSING_MODES:
+        raise ValueError(f"Modo inválido: {mode}. Opções: {', '.join(PROCESSING_MODES)}")
+    options = {'mode': mode}
     
-    # Nome do arquivo: APENAS ID.ext
-    video_filename = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}.mp4')
+    # Idioma opcional (ex.: 'pt'); sem ele, é resolvido por vídeo
+    requested_language = entry.get('language') or defaults.get('language')
+    if requested_language:
+        options['language'] = normalize_language(requested_language)
+        if options['language'] is None:
+            raise ValueError(f'Idioma inválido: {requested_language}')
     
-    # Configurações base do yt-dlp com caminho absoluto e APENAS ID
-    ydl_opts = {
-        'format': 'best[ext=mp4]/best',
-        'outtmpl': video_filename,  # Caminho completo e absoluto
-        'quiet': False,
-        'no_warnings': False,
-        'extractor_retries': 3,
-        'fragment_retries': 3,
-        'skip_unavailable_fragments': True,
+    return {'url': entry['url'].strip(), 'options': options}
+
+def run_job(job, emit):
+    """Executado pelo pool da fila para cada URL enfileirada"""
+    options = job['options']
+    return process_single_video(
+        job['url'],
+        on_event=emit,
+        language=options.get('language'),
+        mode=options.get('mode', MODE_FULL),
+        job_id=job['job_id']
+    )
+
+def job_response(job):
+    """Formata um job para a API, com o resultado no mesmo formato de antes"""
+    response = {
+        'job_id': job['job_id'],
+        'batch_id': job['batch_id'],
+        'url': job['url'],
+        'mode': job['options'].get('mode', MODE_FULL),
+        'status': job['status'],
     }
+    if job['status'] == jobs.JOB_DONE:
+        response['result'] = compact_result(job['result'])
+    elif job['status'] == jobs.JOB_FAILED:
+        response['result'] = {
+            'url': job['url'],
+            'error': job.get('error', 'Erro desconhecido'),
+            'success': False
+        }
+    return response
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Consulta o estado de um job"""
+    job = jobs.get_job(job_id)
+    if not job:
+        return jsonify({'error': 'Job não encontrado'}), 404
+    return jsonify(job_response(job))
+
+@app.route('/batches/<batch_id>')
+def batch_status(batch_id):
+    """Consulta o estado de todos os jobs de um lote, na ordem de envio"""
+    batch_jobs = jobs.get_batch(batch_id)
+    if not batch_jobs:
+        return jsonify({'error': 'Lote não encontrado'}), 404
     
-    # Configurações específicas para TikTok
-    if is_tiktok:
-        ydl_opts.update({
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Referer': 'https://www.tiktok.com/',
-            },
-            'extractor_args': {
-                'tiktok': {
-                    'api_hostname': 'api22-normal-c-useast2a.tiktokv.com'
-                }
-            }
-        })
+    summary = jobs.batch_status(batch_jobs)
+    formatted = [job_response(job) for job in batch_jobs]
     
-    # Configurações específicas para Instagram
-    if is_instagram:
-        ydl_opts.update({
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            }
-        })
+    return jsonify({
+        'batch_id': batch_id,
+        **summary,
+        'jobs': formatted,
+        'results': [job['result'] for job in formatted if 'result' in job]
+    })
+
+@app.route('/batches/<batch_id>/events')
+def batch_events(batch_id):
+    """Transmite via Server-Sent Events o progresso de cada vídeo do lote"""
+    if not jobs.get_batch(batch_id):
+        return jsonify({'error': 'Lote não encontrado'}), 404
     
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Extrair informações do vídeo
-            info = ydl.extract_info(url, download=True)
-            
-            if not info:
-                raise Exception("Não foi possível extrair informações do vídeo")
-            
-            video_title = info.get('title', 'Vídeo sem título')
-            thumbnail = info.get('thumbnail', '')
-            duration = info.get('duration', 0)
-            
-            # Verificar extensão do arquivo baixado
-            actual_file = None
-            for ext in ['.mp4', '.webm', '.mkv', '.avi', '.mov']:
-                test_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}{ext}')
-                if os.path.exists(test_path):
-                    actual_file = test_path
-                    break
-            
-            # Se não encontrou com extensões comuns, procurar qualquer arquivo com o ID
-            if not actual_file:
-                for file in os.listdir(app.config['UPLOAD_FOLDER']):
-                    if file.startswith(video_id):
-                        actual_file = os.path.join(app.config['UPLOAD_FOLDER'], file)
-                        break
-            
-            if not actual_file or not os.path.exists(actual_file):
-                raise Exception(f"Arquivo de vídeo não encontrado. ID: {video_id}")
-            
-            print(f"[INFO] Vídeo baixado: {actual_file}")
-            
-            # Renomear para formato padrão se necessário
-            final_ext = os.path.splitext(actual_file)[1]
-            final_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}{final_ext}')
-            
-            if actual_file != final_path:
-                os.rename(actual_file, final_path)
-                print(f"[INFO] Renomeado para: {final_path}")
-            
-            # Extrair áudio para transcrição - APENAS ID
-            audio_filename = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_audio.mp3')
-            
-            audio_opts = {
-                'format': 'bestaudio/best',
-                'outtmpl': audio_filename,
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }],
-                'quiet': False,
-            }
+    # EventSource reenvia o último ID recebido ao reconectar
+    last_id = request.headers.get('Last-Event-ID', type=int) or request.args.get('after', 0, type=int)
+    
+    def stream(last_id):
+        last_heartbeat = time.time()
+        while True:
+            events = jobs.get_events(batch_id, last_id)
+            for event in events:
+                last_id = event['id']
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {event['data']}\n\n"
             
-            # Adicionar headers se for TikTok ou Instagram
-            if is_tiktok or is_instagram:
-                audio_opts['http_headers'] = ydl_opts.get('http_headers', {})
+            if events:
+                continue
             
-            print(f"[INFO] Extraindo áudio...")
-            with yt_dlp.YoutubeDL(audio_opts) as ydl_audio:
-                ydl_audio.download([url])
+            summary = jobs.batch_status(jobs.get_batch(batch_id))
+            if summary['status'] == jobs.JOB_DONE:
+                yield f"event: batch_done\ndata: {json.dumps(summary)}\n\n"
+                return
             
-            # Procurar arquivo de áudio
+            # Comentário periódico mantém a conexão aberta em proxies
+            if time.time() - last_heartbeat > 15:
+                last_heartbeat = time.time()
+                yield ": ping\n\n"
+            time.sleep(0.5)
+    
+    return Response(stream(last_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def make_progress_hook(on_event, interval=1.0, video_id=None):
+    """
+    Hook de progresso do yt-dlp que repassa no máximo um evento por intervalo
+
+    Com `video_id`, o progresso também é gravado na tabela de downloads parciais.
+    """
+    last_sent = [0.0]
+    
+    def hook(progress):
+        now = time.time()
+        finished = progress['status'] == 'finished'
+        if progress['status'] != 'downloading' and not finished:
+            return
+        if not finished and now - last_sent[0] < interval:
+            return
+        last_sent[0] = now
+        
+        downloaded = progress.get('downloaded_bytes') or 0
+        total = progress.get('total_bytes') or progress.get('total_bytes_estimate')
+        on_event('download', {
+            'downloaded_bytes': downloaded,
+            'total_bytes': total,
+            'percent': round(100 * downloaded / total, 1) if total else None,
+            'speed': progress.get('speed'),
+            'eta': progress.get('eta'),
+            'finished': finished
+        })
+        if video_id is not None and not finished:
+            jobs.update_download(
+                video_id,
+                downloaded_bytes=downloaded,
+                total_bytes=total,
+                fragment_index=progress.get('fragment_index'),
+                fragment_count=progress.get('fragment_count')
+            )
+    
+    return hook
+
+def download_key(url, mode):
+    """
+    ID estável do conteúdo: o mesmo link no mesmo modo cai sempre no mesmo arquivo
+    
+    Usa a URL normalizada, como o cache de resultados: link curto ou com
+    parâmetros de rastreamento retoma o mesmo download.
+    """
+    return hashlib.sha256(f'{mode}:{normalize_url(url)}'.encode('utf-8')).hexdigest()[:16]
+
+def process_single_video(url, on_event=None, language=None, mode=MODE_FULL, job_id=None):
+    """Processa um único vídeo: download e transcrição - APENAS ID, SEM NOME"""
+    if on_event is None:
+        on_event = lambda event_type, data=None: None
+    
+    # Link já processado: responder do cache, sem rede nem Whisper
+    cached = result_cache.lookup_url(url, mode)
+    metrics.CACHE_LOOKUPS.labels(kind='url', result='hit' if cached else 'miss').inc()
+    if cached:
+        print(f"[INFO] Resultado em cache para: {url} (ID: {cached['video_id']})")
+        return compact_result(cached)
+    
+    # Jobs da fila usam o ID do conteúdo: um download interrompido (worker
+    # morto, deploy, nova tentativa) continua do arquivo .part deixado
+    video_id = None
+    if job_id is not None:
+        key = download_key(url, mode)
+        if jobs.claim_download(key, job_id) is not None:
+            video_id = key
+        else:
+            print(f"[INFO] Conteúdo {key} já está sendo baixado por outro job; usando um ID novo")
+    resumable = video_id is not None
+    if video_id is None:
+        video_id = str(uuid.uuid4()).replace('-', '')[:16]  # ID de 16 caracteres sem hífens
+    
+    # Arquivos deste vídeo ficam protegidos da retenção até o job terminar
+    with retention.pinned(video_id):
+        return download_and_transcribe(url, video_id, on_event, language, mode, resumable)
+
+def download_and_transcribe(url, video_id, on_event, requested_language=None, mode=MODE_FULL, resumable=False):
+    """Baixa o vídeo, extrai o áudio e transcreve, salvando tudo com o ID dado"""
+    print(f"[INFO] Processando vídeo ID: {video_id} (modo: {mode})")
+    print(f"[INFO] URL: {url}")
+    print(f"[INFO] Pasta downloads: {app.config['UPLOAD_FOLDER']}")
+    
+    # Detectar plataforma
+    platform = detect_platform(url)
+    profile = platform_profile(platform)
+    
+    # Nome do arquivo: APENAS ID.ext (no modo transcript, só o áudio temporário)
+    if mode == MODE_TRANSCRIPT:
+        output_template = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_audio.%(ext)s')
+    else:
+        output_template = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}.mp4')
+    
+    try:
+        final_path = None
+        audio_codec = None
+        audio_file = None
+        video_size = 0
+        
+        # Rede: vídeo e áudio são baixados dentro de uma vaga do limitador
+        with download_limiter.slot(url):
+            with ydl_pool.session(
+                profile,
+                output_template,  # Caminho completo e absoluto
+                DOWNLOAD_FORMATS.get(mode, DOWNLOAD_FORMATS[MODE_FULL]),
+                progress_hook=make_progress_hook(on_event, video_id=video_id if resumable else None)
+            ) as ydl:
+                # Extrair informações do vídeo
+                with metrics.stage_timer('extract_info', video_id, platform=platform):
+                    info = ydl.extract_info(url, download=False)
+                
+                if not info:
+                    raise Exception("Não foi possível extrair informações do vídeo")
+                
+                # Mesmo vídeo já processado a partir de outro link
+                cached = result_cache.lookup_video(info, url, mode)
+                metrics.CACHE_LOOKUPS.labels(kind='video', result='hit' if cached else 'miss').inc()
+                if cached:
+                    print(f"[INFO] Resultado em cache para: {url} (ID: {cached['video_id']})")
+                    return compact_result(cached)
+                
+                video_title = info.get('title', 'Vídeo sem título')
+                thumbnail = info.get('thumbnail', '')
+                duration = info.get('duration', 0)
+                on_event('metadata', {
+                    'video_id': video_id,
+                    'title': video_title,
+                    'thumbnail': thumbnail,
+                    'duration': duration
+                })
+                
+                # Só metadados: nada é baixado nem transcrito
+                if mode == MODE_METADATA:
+                    result = {
+                        'success': True,
+                        'mode': mode,
+                        'video_id': video_id,
+                        'title': video_title,
+                        'thumbnail': thumbnail,
+                        'duration': duration,
+                        'uploader': info.get('uploader'),
+                        'filename': None,
+                        'transcription': None,
+                        'url': url
+                    }
+                    result_cache.store(url, info, result, mode=mode)
+                    metrics.log_event('video_processed', video_id, platform=platform, mode=mode)
+                    return result
+                
+                # Idioma fixado antes da transcrição sempre que possível
+                language, language_source = resolve_language(
+                    requested_language, settings.TRANSCRIPTION_LANGUAGE, info, settings.LANGUAGE_CACHE_MIN_VIDEOS
+                )
+                
+                # Legendas da plataforma no idioma, quando existem, dispensam o Whisper
+                captions = None
+                if settings.CAPTIONS_FIRST and language:
+                    captions = find_captions(ydl, info, language, video_id)
+                
+                # No modo transcript, legendas dispensam até o download
+                if mode == MODE_FULL or captions is None:
+                    if resumable:
+                        prepare_resume(video_id, info, on_event)
+                    with metrics.stage_timer('download', video_id, platform=platform, mode=mode):
+                        info = ydl.process_ie_result(info, download=True)
+                    if resumable:
+                        jobs.finish_download(video_id)
+                    
+                    # Caminho do arquivo baixado, informado pelo próprio yt-dlp
+                    downloaded = (info.get('requested_downloads') or [{}])[0]
+                    actual_file = downloaded.get('filepath') or info.get('_filename')
+                    
+                    if not actual_file or not os.path.exists(actual_file):
+                        raise Exception(f"Arquivo de vídeo não encontrado. ID: {video_id}")
+                    
+                    print(f"[INFO] Arquivo baixado: {actual_file}")
+                    video_size = os.path.getsize(actual_file)
+                    metrics.DOWNLOAD_BYTES.observe(video_size)
+                
+                if mode == MODE_TRANSCRIPT:
+                    # Áudio de menor bitrate, entregue direto ao transcritor
+                    if captions is None:
+                        audio_file = actual_file
+                else:
+                    # Renomear para formato padrão se necessário
+                    final_ext = os.path.splitext(actual_file)[1]
+                    final_path = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}{final_ext}')
+                    
+                    if actual_file != final_path:
+                        os.rename(actual_file, final_path)
+                        print(f"[INFO] Renomeado para: {final_path}")
+                    
+                    file_index.register_file(video_id, final_path)
+                    
+                    # Com legendas, o áudio nem é preparado
+                    if captions is None:
+                        # Sem faixa de áudio no vídeo, só resta baixar o áudio separadamente
+                        if settings.AUDIO_EXTRACTION_MODE != 'redownload':
+                            audio_codec = find_audio_codec(final_path)
+                        
+                        if audio_codec is None:
+                            with metrics.stage_timer('audio_download', video_id, platform=platform):
+                                audio_file = download_audio(url, video_id, profile)
+        
+        # Repost de um vídeo já transcrito (outro link, outra plataforma): a
+        # transcrição é reaproveitada e o áudio nem é preparado
+        fingerprints = None
+        duplicate = None
+        if captions is None and settings.FINGERPRINT_ENABLED:
+            fingerprints, duplicate = find_duplicate(video_id, audio_file or final_path, final_path, duration)
+        if duplicate is not None:
+            audio_codec = None
+            if audio_file and audio_file != final_path and os.path.exists(audio_file):
+                os.remove(audio_file)
             audio_file = None
-            for ext in ['.mp3', '.m4a', '.opus', '.ogg']:
-                test_audio = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_audio{ext}')
-                if os.path.exists(test_audio):
-                    audio_file = test_audio
-                    break
-            
-            # Transcrever áudio
-            transcription = {
-                'text': 'Transcrição não disponível',
-                'language': 'unknown',
-                'segments': []
-            }
-            
-            if audio_file and os.path.exists(audio_file):
-                print(f"[INFO] Transcrevendo áudio: {audio_file}")
-                transcription = transcribe_audio(audio_file)
-                # Limpar arquivo de áudio
+        
+        # Áudio derivado localmente do arquivo já baixado (sem novo download)
+        if audio_codec is not None:
+            with metrics.stage_timer('audio_extraction', video_id, mode=settings.AUDIO_EXTRACTION_MODE):
+                audio_file = extract_local_audio(url, video_id, final_path, audio_codec, profile)
+        
+        # Transcrever áudio
+        transcription = {
+            'text': 'Transcrição não disponível',
+            'language': 'unknown',
+            'segments': []
+        }
+        
+        if captions is not None:
+            print(f"[INFO] Usando legendas da plataforma ({captions['source']}, idioma: {language})")
+            transcription = captions
+            for segment in captions['segments']:
+                on_event('segment', segment)
+        elif duplicate is not None:
+            print(f"[INFO] Mesmo áudio do vídeo {duplicate['video_id']} "
+                  f"({duplicate['similarity']:.0%} dos bits iguais): reaproveitando a transcrição")
+            transcription = duplicate['transcription']
+            on_event('duplicate', {'video_id': duplicate['video_id'], 'similarity': duplicate['similarity']})
+            for segment in transcription['segments']:
+                on_event('segment', segment)
+        elif audio_file and os.path.exists(audio_file):
+            on_event('audio_ready')
+            print(f"[INFO] Transcrevendo áudio: {audio_file} (idioma: {language or 'auto'}, origem: {language_source})")
+            transcription = transcribe_audio(
+                audio_file,
+                on_segment=lambda segment: on_event('segment', segment),
+                video_id=video_id,
+                duration=duration,
+                language=language
+            )
+            # Só o idioma detectado pelo motor conta como evidência do canal: os
+            # fixados (pedido, config, metadados, cache do canal) voltariam como
+            # confirmação deles mesmos e uma tag errada ficaria permanente
+            if language_source == 'detect' and transcription['language'] != 'error':
+                remember_language(info, transcription['language'])
+            # Limpar arquivo de áudio (no modo 'direct' ele é o próprio vídeo)
+            if audio_file != final_path:
                 os.remove(audio_file)
                 print(f"[INFO] Áudio temporário removido")
-            else:
-                print(f"[WARNING] Áudio não encontrado para transcrição")
-            
-            return {
-                'success': True,
-                'video_id': video_id,
-                'title': video_title,
-                'thumbnail': thumbnail,
-                'duration': duration,
-                'filename': os.path.basename(final_path),
-                'transcription': transcription,
-                'url': url
+        else:
+            print(f"[WARNING] Áudio não encontrado para transcrição")
+        
+        result = {
+            'success': True,
+            'mode': mode,
+            'video_id': video_id,
+            'title': video_title,
+            'thumbnail': thumbnail,
+            'duration': duration,
+            'filename': os.path.basename(final_path) if final_path else None,
+            'transcription': transcription,
+            'url': url
+        }
+        
+        if duplicate is not None:
+            result['duplicate_of'] = {
+                'video_id': duplicate['video_id'],
+                'similarity': duplicate['similarity'],
+                'visual_similarity': duplicate['visual_similarity']
             }
+        
+        if settings.ANALYSIS_INLINE and transcription['language'] != 'error':
+            result['analysis'] = analyze_result(video_id, transcription, duration)
+        
+        # Segmentos vão para o transcript_store; o resultado leva só o resumo
+        result = compact_result(result, replace=True)
+        
+        # Transcrições com erro não vão para o cache: a próxima tentativa refaz
+        if transcription['language'] != 'error':
+            result_cache.store(url, info, result, final_path, mode=mode)
+            index_transcript(result, transcription)
+            if fingerprints is not None and duplicate is None:
+                remember_fingerprints(video_id, fingerprints, duration)
+        
+        metrics.log_event('video_processed', video_id, platform=platform, mode=mode, bytes=video_size,
+                          duration=duration, language=transcription['language'])
+        return result
     
     except Exception as e:
         error_message = str(e)
         print(f"[ERROR] Falha ao processar vídeo: {error_message}")
+        metrics.log_event('video_failed', video_id, level='error', platform=platform, error=error_message)
         
         # Mensagens de erro mais amigáveis
         if 'Unable to extract' in error_message or 'extract webpage' in error_message:
@@ -216,26 +596,229 @@ def process_single_video(url):
         elif 'Private video' in error_message:
             error_message = "Este vídeo é privado e não pode ser baixado."
         
+        # Bloqueios e falhas de rede: a fila tenta de novo mais tarde
+        if is_transient(e):
+            raise TransientError(error_message) from e
         raise Exception(error_message)
 
-def transcribe_audio(audio_path):
-    """Transcreve áudio usando Whisper"""
+def find_duplicate(video_id, audio_path, video_path, duration):
+    """
+    Impressões do vídeo baixado e o vídeo já transcrito com o mesmo áudio
+    
+    Returns:
+        (impressões ou None, repost encontrado ou None); falhas não afetam o job
+    """
     try:
-        model = get_whisper_model()
-        result = model.transcribe(audio_path, language=None)  # Auto-detecta idioma
-        
-        return {
-            'text': result['text'],
-            'language': result.get('language', 'desconhecido'),
-            'segments': [
-                {
-                    'start': seg['start'],
-                    'end': seg['end'],
-                    'text': seg['text']
-                }
-                for seg in result.get('segments', [])
-            ]
+        with metrics.stage_timer('fingerprint', video_id):
+            fingerprints = fingerprint.compute(
+                audio_path,
+                video_path,
+                duration,
+                keyframes=settings.FINGERPRINT_KEYFRAMES,
+                seconds=settings.FINGERPRINT_SECONDS
+            )
+            if fingerprints is None:
+                return None, None
+            duplicate = fingerprint.find_match(
+                fingerprints, duration, settings.FINGERPRINT_AUDIO_THRESHOLD, exclude=video_id
+            )
+            if duplicate is not None:
+                duplicate['transcription'] = transcript_store.load(duplicate['video_id'])
+                if duplicate['transcription'] is None:
+                    # Transcrição do original não existe mais: transcrever de novo
+                    print(f"[WARNING] Transcrição do vídeo {duplicate['video_id']} não encontrada")
+                    fingerprint.remove(duplicate['video_id'])
+                    duplicate = None
+    except Exception as e:
+        print(f"[WARNING] Falha ao calcular as impressões do vídeo: {str(e)}")
+        return None, None
+    
+    metrics.CACHE_LOOKUPS.labels(kind='fingerprint', result='hit' if duplicate else 'miss').inc()
+    return fingerprints, duplicate
+
+def remember_fingerprints(video_id, fingerprints, duration):
+    """Guarda as impressões para reconhecer reposts deste vídeo; falhas não afetam o job"""
+    try:
+        fingerprint.add(video_id, fingerprints, duration)
+    except Exception as e:
+        print(f"[WARNING] Falha ao guardar as impressões do vídeo: {str(e)}")
+
+def analyze_result(video_id, transcription, duration):
+    """Palavras-chave, hashtags e momentos-chave do vídeo; None se a análise falhar"""
+    if not transcription.get('segments'):
+        return None
+    try:
+        with metrics.stage_timer('analysis', video_id):
+            return analysis.analyze(
+                dict(transcription, video_id=video_id, duration=duration),
+                max_keywords=settings.ANALYSIS_MAX_KEYWORDS,
+                update_corpus=True
+            )
+    except Exception as e:
+        print(f"[WARNING] Falha na análise da transcrição: {str(e)}")
+        return None
+
+def index_transcript(result, transcription):
+    """Disponibiliza a transcrição na busca (/search); falhas não afetam o job"""
+    if not transcription.get('segments'):
+        return
+    try:
+        count = transcript_index.index_transcript(
+            result['video_id'],
+            transcription,
+            title=result['title'],
+            url=result['url'],
+            duration=result['duration']
+        )
+        print(f"[INFO] {count} segmento(s) indexados para busca")
+    except Exception as e:
+        print(f"[WARNING] Falha ao indexar a transcrição: {str(e)}")
+
+def compact_result(result, replace=False):
+    """
+    Troca a transcrição completa do resultado por um resumo
+    
+    Os segmentos ficam no transcript_store e saem em /transcripts/<video_id>,
+    então a resposta de um lote tem o mesmo tamanho para vídeos de 1 ou de 60
+    minutos. Resultados antigos (cache, jobs) são convertidos na primeira leitura.
+    
+    Args:
+        replace: Regravar a transcrição mesmo se o vídeo já tiver uma guardada
+    """
+    transcription = result.get('transcription')
+    if not transcription or 'segments' not in transcription:
+        return result
+    
+    video_id = result['video_id']
+    if transcription.get('language') == 'error':
+        text = transcription.get('text') or ''
+        summary = {
+            'language': 'error',
+            'source': transcription.get('source'),
+            'segment_count': 0,
+            'word_count': len(text.split()),
+            'preview': text,
+            'truncated': False
         }
+        return dict(result, transcription=summary)
+    
+    try:
+        summary = None if replace else transcript_store.get_summary(video_id)
+        if summary is None:
+            summary = transcript_store.store(
+                video_id, transcription, result.get('duration'), settings.TRANSCRIPT_PREVIEW_CHARS
+            )
+    except Exception as e:
+        # Sem o armazenamento, a transcrição completa continua no próprio resultado
+        print(f"[WARNING] Falha ao guardar a transcrição: {str(e)}")
+        return result
+    
+    summary['url'] = f'/transcripts/{video_id}'
+    return dict(result, transcription=summary)
+
+def prepare_resume(video_id, info, on_event):
+    """
+    Confere o download parcial deixado por uma tentativa anterior
+
+    O yt-dlp continua sozinho o .part (pelo offset em bytes) ou os fragmentos
+    (pelo .ytdl); aqui só se garante que o formato escolhido é o mesmo, senão os
+    bytes antigos não servem e são descartados.
+    """
+    state = jobs.get_download(video_id)
+    format_id = info.get('format_id')
+    if state and state['format_id'] and state['format_id'] != format_id:
+        print(f"[INFO] Formato mudou ({state['format_id']} -> {format_id}), descartando download parcial")
+        discard_partial_files(video_id)
+        state = None
+    elif state and state['downloaded_bytes']:
+        print(f"[INFO] Retomando download de {video_id} a partir de {state['downloaded_bytes']} bytes")
+        on_event('resumed', {
+            'downloaded_bytes': state['downloaded_bytes'],
+            'total_bytes': state['total_bytes'],
+            'fragment_index': state['fragment_index']
+        })
+    
+    jobs.update_download(
+        video_id,
+        format_id=format_id,
+        downloaded_bytes=state['downloaded_bytes'] if state else 0
+    )
+
+def discard_partial_files(video_id):
+    """Remove os arquivos parciais (.part, fragmentos e .ytdl) de um vídeo"""
+    pattern = os.path.join(glob.escape(app.config['UPLOAD_FOLDER']), f'{video_id}*')
+    for path in glob.glob(pattern):
+        if path.endswith('.ytdl') or '.part' in os.path.basename(path):
+            os.remove(path)
+
+def find_captions(ydl, info, language, video_id):
+    """Transcrição a partir das legendas do vídeo, ou None para seguir com o ASR"""
+    try:
+        with metrics.stage_timer('captions', video_id, language=language):
+            return fetch_captions(
+                ydl, info, language,
+                allow_automatic=settings.CAPTIONS_ALLOW_AUTOMATIC,
+                min_coverage=settings.CAPTIONS_MIN_COVERAGE
+            )
+    except Exception as e:
+        print(f"[WARNING] Não foi possível usar as legendas: {str(e)}")
+        return None
+
+def find_audio_codec(video_path):
+    """Codec de áudio do vídeo baixado, ou None se ele não tiver áudio"""
+    try:
+        return media.probe_audio_codec(video_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[WARNING] Não foi possível inspecionar o áudio do vídeo: {str(e)}")
+        return None
+
+def extract_local_audio(url, video_id, video_path, audio_codec, profile='generic'):
+    """Extrai o áudio do vídeo com FFmpeg; se falhar, baixa o áudio da URL"""
+    audio_base = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_audio')
+    
+    try:
+        print(f"[INFO] Extraindo áudio localmente (modo {settings.AUDIO_EXTRACTION_MODE})...")
+        return media.extract_audio(video_path, audio_base, settings.AUDIO_EXTRACTION_MODE, codec=audio_codec)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"[WARNING] Falha na extração local do áudio: {str(e)}")
+    
+    with download_limiter.slot(url):
+        return download_audio(url, video_id, profile)
+
+def download_audio(url, video_id, profile='generic'):
+    """Baixa apenas o áudio da URL e converte para MP3 (caminho antigo)"""
+    audio_filename = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_audio.mp3')
+    
+    print(f"[INFO] Baixando áudio...")
+    with ydl_pool.session(profile, audio_filename, 'bestaudio/best', variant='mp3') as ydl_audio:
+        ydl_audio.download([url])
+    
+    # Procurar arquivo de áudio
+    for ext in ['.mp3', '.m4a', '.opus', '.ogg']:
+        test_audio = os.path.join(app.config['UPLOAD_FOLDER'], f'{video_id}_audio{ext}')
+        if os.path.exists(test_audio):
+            return test_audio
+    return None
+
+def transcribe_audio(audio_path, on_segment=None, video_id=None, duration=None, language=None):
+    """Transcreve áudio com o motor configurado; `on_segment` recebe cada segmento pronto"""
+    try:
+        with metrics.stage_timer('transcription', video_id, backend=settings.TRANSCRIPTION_BACKEND) as span:
+            result = None
+            if transcription_client is not None:
+                try:
+                    result = transcription_client.transcribe(audio_path, language=language, on_segment=on_segment)  # None = auto-detecta
+                except TranscriptionUnavailable as e:
+                    print(f"[WARNING] Serviço de transcrição indisponível, usando modelo local: {str(e)}")
+            
+            if result is None:
+                result = get_local_backend().transcribe(audio_path, language=language, on_segment=on_segment)
+        
+        # Sem duração nos metadados, o fim do último segmento é uma boa aproximação
+        if not duration and result['segments']:
+            duration = result['segments'][-1]['end']
+        metrics.observe_transcription(duration, span['seconds'])
+        return result
     except Exception as e:
         print(f"[ERROR] Erro na transcrição: {str(e)}")
         return {
@@ -244,47 +827,312 @@ def transcribe_audio(audio_path):
             'segments': []
         }
 
+# Retenção em segundo plano: idade, cota de disco e arquivos órfãos
+retention_manager = retention.RetentionManager(
+    app.config['UPLOAD_FOLDER'],
+    lock_dir=os.path.join(storage.get_data_folder(), 'locks'),
+    max_age_hours=settings.AUTO_CLEANUP_HOURS,
+    max_bytes=settings.MAX_STORAGE_BYTES,
+    interval=settings.RETENTION_SWEEP_SECONDS,
+    batch_size=settings.RETENTION_SWEEP_BATCH,
+    orphan_grace_hours=settings.ORPHAN_FILE_GRACE_HOURS
+)
+retention_manager.start()
+
+# Cache de resultados por link normalizado / ID do vídeo na plataforma
+result_cache = ResultCache(
+    ttl_hours=settings.AUTO_CLEANUP_HOURS,
+    max_bytes=settings.RESULT_CACHE_MAX_BYTES,
+    file_remover=retention_manager.remove_file
+)
+
+# Pool de processamento em segundo plano (um por worker do Gunicorn)
+job_queue = jobs.JobQueue(
+    run_job,
+    workers=settings.JOB_WORKERS,
+    max_attempts=settings.JOB_MAX_ATTEMPTS,
+    retry_on=(TransientError,),
+    retry_base=settings.JOB_RETRY_BASE_SECONDS,
+    retry_max=settings.JOB_RETRY_MAX_SECONDS,
+    lease_seconds=settings.JOB_LEASE_SECONDS
+)
+job_queue.start()
+metrics.register_queue_depth(jobs.count_by_status)
+metrics.register_platform_limits(platform_throttle.snapshot)
+
+# Roteiros com IA: cache por conteúdo, gerações compartilhadas e vagas por provedor
+script_generator = script_generation.ScriptGenerator(
+    script_generation.create_providers(settings),
+    lock_dir=os.path.join(storage.get_data_folder(), 'locks'),
+    workers=settings.SCRIPT_WORKERS,
+    input_tokens=settings.SCRIPT_INPUT_TOKENS,
+    max_tokens=settings.SCRIPT_MAX_TOKENS,
+    ttl_hours=settings.SCRIPT_CACHE_HOURS
+)
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Métricas do pipeline no formato do Prometheus"""
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+@app.route('/ai/analyze', methods=['POST'])
+def ai_analyze():
+    """
+    Analisa uma ou várias transcrições de uma vez
+    
+    Aceita {"transcription": {...}} ou {"transcriptions": [...]}, cada uma com
+    'text' e, opcionalmente, 'segments' (para os momentos-chave) e 'language'.
+    """
+    data = request.get_json(silent=True) or {}
+    single = 'transcription' in data
+    transcriptions = [data['transcription']] if single else data.get('transcriptions')
+    
+    if not isinstance(transcriptions, list) or not transcriptions:
+        return jsonify({'error': 'Envie transcription ou transcriptions'}), 400
+    if not all(isinstance(t, dict) and isinstance(t.get('text', ''), str) for t in transcriptions):
+        return jsonify({'error': 'Cada transcrição precisa ser um objeto com text'}), 400
+    
+    max_keywords = data.get('max_keywords', settings.ANALYSIS_MAX_KEYWORDS)
+    if not isinstance(max_keywords, int) or not 1 <= max_keywords <= 100:
+        return jsonify({'error': 'max_keywords deve ser um inteiro entre 1 e 100'}), 400
+    
+    try:
+        # Textos avulsos não entram no corpus (só vídeos processados)
+        results = analysis.analyze_batch(
+            [{key: value for key, value in t.items() if key != 'video_id'} for t in transcriptions],
+            max_keywords=max_keywords
+        )
+    except Exception as e:
+        print(f"[ERROR] Erro na análise: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    if single:
+        return jsonify(results[0])
+    return jsonify({'results': results})
+
+@app.route('/ai/generate_script', methods=['POST'])
+def ai_generate_script():
+    """
+    Gera um roteiro a partir de transcrições
+    
+    Corpo: {"transcriptions": [...], "provider": "openai" | "claude" | "mock",
+    "model", "max_tokens", "temperature", "stream", "wait"}. Pedidos iguais
+    saem do cache ou acompanham a geração em andamento. Com stream=true, o
+    texto chega por Server-Sent Events; com wait=false, a resposta é 202 com
+    o script_id para consultar em /ai/scripts/<script_id>.
+    """
+    data = request.get_json(silent=True) or {}
+    transcriptions = data.get('transcriptions')
+    
+    if not isinstance(transcriptions, list) or not transcriptions:
+        return jsonify({'error': 'Envie transcriptions'}), 400
+    if not all(isinstance(t, dict) and isinstance(t.get('text'), str) and t['text'].strip() for t in transcriptions):
+        return jsonify({'error': 'Cada transcrição precisa ser um objeto com text'}), 400
+    
+    max_tokens = data.get('max_tokens', settings.SCRIPT_MAX_TOKENS)
+    if not isinstance(max_tokens, int) or not 1 <= max_tokens <= 8000:
+        return jsonify({'error': 'max_tokens deve ser um inteiro entre 1 e 8000'}), 400
+    temperature = data.get('temperature', 0.7)
+    if not isinstance(temperature, (int, float)) or not 0 <= temperature <= 2:
+        return jsonify({'error': 'temperature deve ser um número entre 0 e 2'}), 400
+    
+    try:
+        generation = script_generator.start(
+            transcriptions,
+            data.get('provider', settings.SCRIPT_DEFAULT_PROVIDER),
+            model=data.get('model'),
+            max_tokens=max_tokens,
+            temperature=temperature
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    def describe(**fields):
+        return {
+            'script_id': generation.key,
+            'provider': generation.provider,
+            'model': generation.model,
+            'cached': generation.cached,
+            **fields
+        }
+    
+    if data.get('stream'):
+        def stream():
+            try:
+                for chunk in generation.follow(settings.SCRIPT_WAIT_SECONDS):
+                    yield f"event: chunk\ndata: {json.dumps({'text': chunk})}\n\n"
+            except script_generation.ScriptGenerationError as e:
+                yield f"event: error\ndata: {json.dumps(describe(error=str(e)))}\n\n"
+                return
+            except TimeoutError:
+                # A geração continua; o resultado fica em /ai/scripts/<script_id>
+                yield f"event: timeout\ndata: {json.dumps(describe(status=script_generation.SCRIPT_RUNNING))}\n\n"
+                return
+            yield f"event: done\ndata: {json.dumps(describe(script=generation.text))}\n\n"
+        
+        return Response(stream(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+    
+    if data.get('wait', True) or generation.done:
+        try:
+            return jsonify(describe(status=script_generation.SCRIPT_DONE,
+                                    script=generation.result(settings.SCRIPT_WAIT_SECONDS)))
+        except script_generation.ScriptGenerationError as e:
+            return jsonify(describe(error=str(e))), 502
+        except TimeoutError:
+            pass
+    
+    return jsonify(describe(status=script_generation.SCRIPT_RUNNING)), 202
+
+@app.route('/ai/scripts/<script_id>')
+def ai_script_status(script_id):
+    """Estado de um roteiro: pronto ou em geração (com o texto parcial)"""
+    script = script_generation.get_script(script_id)
+    if script is None:
+        return jsonify({'error': 'Roteiro não encontrado'}), 404
+    return jsonify(script)
+
+@app.route('/search')
+def search_transcripts():
+    """
+    Busca nas transcrições já processadas
+    
+    Parâmetros: q (obrigatório; "frases entre aspas"), limit, offset,
+    video_id e language. Cada resultado traz o vídeo, o segundo do trecho e
+    um snippet com os termos em <mark>.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Parâmetro q é obrigatório'}), 400
+    
+    start = time.perf_counter()
+    try:
+        results = transcript_index.search(
+            query,
+            limit=request.args.get('limit', 20, type=int),
+            offset=request.args.get('offset', 0, type=int),
+            video_id=request.args.get('video_id'),
+            language=normalize_language(request.args.get('language'))
+        )
+    except Exception as e:
+        print(f"[ERROR] Erro na busca: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'query': query,
+        'results': results,
+        'took_ms': round((time.perf_counter() - start) * 1000, 1)
+    })
+
+@app.route('/transcripts/<video_id>')
+def export_transcript(video_id):
+    """
+    Transcrição completa em streaming, lida do armazenamento comprimido
+    
+    Parâmetros: format (srt, vtt, txt ou jsonl; padrão txt), offset e limit
+    (por índice de segmento), start e end (segundos) e download=1 para baixar
+    como arquivo.
+    """
+    fmt = request.args.get('format', 'txt').lower()
+    if fmt not in transcript_store.EXPORT_FORMATS:
+        return jsonify({'error': f"Formato inválido. Opções: {', '.join(transcript_store.EXPORT_FORMATS)}"}), 400
+    
+    summary = transcript_store.get_summary(video_id)
+    if summary is None:
+        return jsonify({'error': 'Transcrição não encontrada'}), 404
+    
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', type=int)
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    if offset < 0 or (limit is not None and limit < 1) or any(v is not None and v < 0 for v in (start, end)):
+        return jsonify({'error': 'offset, start e end devem ser >= 0 e limit >= 1'}), 400
+    
+    headers = {'X-Segment-Count': str(summary['segment_count'])}
+    if request.args.get('download'):
+        headers['Content-Disposition'] = f'attachment; filename="{video_id}.{fmt}"'
+    
+    return Response(
+        transcript_store.export(video_id, fmt, offset=offset, limit=limit, start=start, end=end),
+        content_type=transcript_store.EXPORT_FORMATS[fmt],
+        headers=headers
+    )
+
 @app.route('/download/<video_id>')
 def download_file(video_id):
     """Rota para download de arquivos usando apenas o ID"""
     try:
         print(f"[INFO] Requisição de download para ID: {video_id}")
         
-        # Procurar arquivo que começa com o video_id (sem incluir _audio)
-        downloads_dir = app.config['UPLOAD_FOLDER']
-        
-        matching_files = [f for f in os.listdir(downloads_dir) 
-                         if f.startswith(video_id) and '_audio' not in f]
+        # Consulta direta no índice, sem listar a pasta
+        entry = file_index.lookup_file(video_id)
         
-        if not matching_files:
+        if not entry:
             print(f"[ERROR] Nenhum arquivo encontrado com ID: {video_id}")
-            print(f"[INFO] Arquivos disponíveis: {os.listdir(downloads_dir)}")
             return jsonify({'error': 'Arquivo não encontrado'}), 404
         
-        filename = matching_files[0]
-        file_path = os.path.join(downloads_dir, filename)
+        file_path = entry['path']
+        download_name = f"{video_id}{entry['ext']}"
+        file_index.touch(video_id)
+        
+        # A retenção não remove o arquivo enquanto ele é enviado
+        pin_token = retention.pin(video_id, ttl=settings.DOWNLOAD_PIN_SECONDS)
+        
+        # ETag e Last-Modified saem do índice, sem ler o arquivo
+        etag = f"{entry['size']:x}-{int(entry['mtime'] * 1000):x}"
+        
+        if settings.SENDFILE_MODE == 'x-accel':
+            print(f"[INFO] Enviando arquivo via proxy (X-Accel-Redirect): {file_path}")
+            return accel_redirect_response(entry, download_name, etag)
         
         print(f"[INFO] Enviando arquivo: {file_path}")
         
-        if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True, download_name=f'{video_id}{os.path.splitext(filename)[1]}')
-        else:
-            return jsonify({'error': 'Arquivo não encontrado'}), 404
+        # conditional=True: Range (206), If-None-Match e If-Modified-Since (304)
+        response = send_file(
+            file_path,
+            as_attachment=True,
+            download_name=download_name,
+            conditional=True,
+            etag=etag,
+            last_modified=entry['mtime'],
+            max_age=settings.DOWNLOAD_CACHE_MAX_AGE
+        )
+        # Avisa o navegador de que pode pedir trechos (seek e retomada)
+        response.headers['Accept-Ranges'] = 'bytes'
+        # Com X-Sendfile/X-Accel o proxy envia depois; o pin expira sozinho
+        if not app.config['USE_X_SENDFILE']:
+            response.call_on_close(lambda: retention.unpin(pin_token))
+        return response
             
     except Exception as e:
         print(f"[ERROR] Erro no download: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def accel_redirect_response(entry, download_name, etag):
+    """Resposta vazia com X-Accel-Redirect: o nginx entrega os bytes (e os Ranges)"""
+    response = Response(mimetype=mimetypes.guess_type(download_name)[0] or 'application/octet-stream')
+    response.headers['X-Accel-Redirect'] = settings.X_ACCEL_PREFIX + os.path.basename(entry['path'])
+    response.headers['Content-Disposition'] = f'attachment; filename="{download_name}"'
+    response.set_etag(etag)
+    response.last_modified = entry['mtime']
+    response.cache_control.max_age = settings.DOWNLOAD_CACHE_MAX_AGE
+    # 304 para If-None-Match/If-Modified-Since sem nem acionar o proxy
+    return response.make_conditional(request)
+
 @app.route('/cleanup', methods=['POST'])
 def cleanup():
-    """Remove arquivos antigos da pasta de downloads"""
+    """
+    Executa agora uma rodada de retenção (idade e cota)
+    
+    Com {"all": true} remove todos os arquivos que não estão em uso.
+    Arquivos de jobs em andamento e downloads ativos nunca são removidos.
+    """
     try:
-        count = 0
-        for filename in os.listdir(app.config['UPLOAD_FOLDER']):
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            if os.path.isfile(file_path):
-                os.remove(file_path)
-                count += 1
+        data = request.get_json(silent=True) or {}
+        count = retention_manager.sweep(remove_all=bool(data.get('all')))
         
         print(f"[INFO] {count} arquivos removidos")
         return jsonify({'success': True, 'message': f'{count} arquivos removidos com sucesso'})
@@ -292,6 +1140,32 @@ def cleanup():
         print(f"[ERROR] Erro na limpeza: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.cli.command('rebuild-index')
+def rebuild_index_command():
+    """Reconstrói o índice de arquivos a partir da pasta de downloads"""
+    count = file_index.rebuild_index(app.config['UPLOAD_FOLDER'])
+    print(f"[INFO] {count} arquivos indexados")
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Indexa para busca as transcrições guardadas no cache de resultados"""
+    count = 0
+    for result in result_cache.iter_results():
+        transcription = result.get('transcription') or {}
+        if transcription and 'segments' not in transcription:
+            transcription = transcript_store.load(result['video_id']) or {}
+        if transcription.get('segments'):
+            transcript_index.index_transcript(
+                result['video_id'],
+                transcription,
+                title=result.get('title'),
+                url=result.get('url'),
+                duration=result.get('duration')
+            )
+            count += 1
+    transcript_index.optimize()
+    print(f"[INFO] {count} transcrições indexadas")
+
 if __name__ == '__main__':
     # Verificar se pasta downloads existe
     print(f"[INFO] Pasta de downloads: {app.config['UPLOAD_FOLDER']}")
@@ -0,0 +1,187 @@
+"""
+Transcrição em lote com o Whisper (usada pelo WhisperBackend)
+
+Clipes curtos (até WINDOW_SECONDS, o tamanho de entrada do Whisper) de todos
+os pedidos em andamento são decodificados juntos, em lotes de até
+Config.TRANSCRIPTION_BATCH_SIZE. Um lote sai assim que enche ou quando
+Config.TRANSCRIPTION_BATCH_MAX_WAIT_MS passa desde o primeiro clipe.
+
+Áudios mais longos não passam por aqui: cortá-los em janelas fixas de 30s
+quebra frases na emenda e descarta o contexto entre janelas que o
+`model.transcribe` usa, o que piora a transcrição. O WhisperBackend manda
+esses pelo caminho sequencial (ver fits()).
+"""
+
+import queue
+import threading
+import time
+
+WINDOW_SECONDS = 30
+# Resolução dos tokens de timestamp do Whisper
+TIMESTAMP_RESOLUTION = 0.02
+# Mesmos limiares do whisper.transcribe para considerar uma janela silenciosa
+NO_SPEECH_THRESHOLD = 0.6
+LOGPROB_THRESHOLD = -1.0
+
+
+class _Request:
+    """Um clipe a transcrever e o resultado de sua decodificação"""
+
+    def __init__(self, audio, language, on_segment=None):
+        self.audio = audio
+        self.language = language
+        self.on_segment = on_segment
+        self.segments = []
+        self.error = None
+        self.done = threading.Event()
+
+
+class BatchedTranscriber:
+    """Agrupa clipes curtos de vários pedidos em uma única chamada ao modelo"""
+
+    def __init__(self, model, batch_size=8, max_wait=0.05, lock=None):
+        import whisper
+
+        self.whisper = whisper
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        self.fp16 = model.device.type != 'cpu'
+        # O mesmo lock do model.transcribe, usado pelos áudios longos
+        self.lock = lock or threading.Lock()
+        self.queue = queue.Queue()
+        self._tokenizers = {}
+        threading.Thread(target=self._worker, name='batch-transcriber', daemon=True).start()
+
+    def fits(self, audio):
+        """Se as amostras (16 kHz) cabem em uma única janela do Whisper"""
+        return len(audio) <= WINDOW_SECONDS * self.whisper.audio.SAMPLE_RATE
+
+    def transcribe(self, audio, language=None, on_segment=None):
+        """
+        Transcreve um clipe de até WINDOW_SECONDS (amostras de 16 kHz); bloqueia até ser decodificado
+
+        `on_segment(segment)` é chamado a cada segmento, na ordem do áudio.
+        """
+        if not self.fits(audio):
+            raise ValueError(f"Clipe maior que {WINDOW_SECONDS}s: use o model.transcribe")
+        if len(audio) == 0:
+            return {'text': '', 'language': language or 'desconhecido', 'segments': []}
+
+        request = _Request(audio, language, on_segment)
+        self.queue.put(request)
+        request.done.wait()
+        if request.error:
+            raise Exception(request.error)
+
+        return {
+            'text': ''.join(segment['text'] for segment in request.segments).strip(),
+            'language': request.language or 'desconhecido',
+            'segments': request.segments
+        }
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            try:
+                with self.lock:
+                    self._process(batch)
+            except Exception as e:
+                print(f"[ERROR] Falha no lote de transcrição: {str(e)}")
+                for item in batch:
+                    item.error = str(e)
+                    item.done.set()
+
+    def _mel(self, audio):
+        whisper = self.whisper
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels)
+        return mel.to(self.model.device)
+
+    def _process(self, batch):
+        import torch
+
+        mels = {id(item): self._mel(item.audio) for item in batch}
+
+        # Detectar o idioma de quem ainda não tem, tudo em uma chamada
+        undetected = [item for item in batch if item.language is None]
+        if undetected:
+            _, probs = self.model.detect_language(torch.stack([mels[id(item)] for item in undetected]))
+            for item, item_probs in zip(undetected, probs):
+                item.language = max(item_probs, key=item_probs.get)
+
+        by_language = {}
+        for item in batch:
+            by_language.setdefault(item.language, []).append(item)
+
+        for language, items in by_language.items():
+            options = self.whisper.DecodingOptions(
+                language=language, task='transcribe', fp16=self.fp16, without_timestamps=False
+            )
+            results = self.whisper.decode(self.model, torch.stack([mels[id(item)] for item in items]), options)
+            for item, result in zip(items, results):
+                silent = (result.no_speech_prob > NO_SPEECH_THRESHOLD
+                          and result.avg_logprob < LOGPROB_THRESHOLD)
+                segments = [] if silent else self._segments(item, result.tokens, language)
+                self._finish(item, segments)
+
+    def _finish(self, item, segments):
+        item.segments = segments
+        if item.on_segment is not None:
+            for segment in segments:
+                item.on_segment(segment)
+        item.done.set()
+
+    def _tokenizer(self, language):
+        if language not in self._tokenizers:
+            self._tokenizers[language] = self.whisper.tokenizer.get_tokenizer(
+                self.model.is_multilingual, num_languages=self.model.num_languages,
+                language=language, task='transcribe'
+            )
+        return self._tokenizers[language]
+
+    def _segments(self, item, tokens, language):
+        """Converte os tokens de um clipe em segmentos com tempo"""
+        tokenizer = self._tokenizer(language)
+        clip_end = len(item.audio) / self.whisper.audio.SAMPLE_RATE
+
+        segments = []
+        start = None
+        text_tokens = []
+
+        def flush(end):
+            text = tokenizer.decode(text_tokens)
+            if text.strip():
+                segments.append({
+                    'start': round(start or 0.0, 2),
+                    'end': round(min(end, clip_end), 2),
+                    'text': text
+                })
+
+        for token in tokens:
+            if token >= tokenizer.timestamp_begin:
+                timestamp = (token - tokenizer.timestamp_begin) * TIMESTAMP_RESOLUTION
+                if start is None:
+                    start = timestamp
+                else:
+                    flush(timestamp)
+                    start = None
+                    text_tokens = []
+            elif token < tokenizer.eot:
+                text_tokens.append(token)
+
+        if text_tokens:
+            flush(clip_end)
+        return segments
@@ -0,0 +1,9 @@
+"""
+Benchmarks offline do pipeline de download e transcrição
+
+Clipes gerados com FFmpeg são servidos por um servidor HTTP local e baixados
+pelo extrator genérico do yt-dlp, sem depender das plataformas reais.
+
+    python -m benchmarks.run --models tiny base --concurrency 1 4
+    python -m benchmarks.compare benchmarks/results/A.json benchmarks/results/B.json
+"""
@@ -0,0 +1,72 @@
+"""
+Compara dois arquivos de resultados (ex.: antes e depois de um commit)
+
+    python -m benchmarks.compare benchmarks/results/ANTES.json benchmarks/results/DEPOIS.json
+"""
+
+import argparse
+import json
+
+# Métrica -> True se valores maiores são melhores
+METRICS = {
+    'throughput_videos_per_min': True,
+    'audio_seconds_per_second': True,
+    'latency_p50': False,
+    'latency_p95': False,
+    'rtf_p50': False,
+    'rtf_p95': False,
+    'model_load_seconds': False,
+    'peak_rss_mb': False,
+}
+
+
+def _key(result):
+    return (result['mode'], result['backend'], result['model'], result['concurrency'])
+
+
+def _change(old, new, higher_is_better):
+    if not old:
+        return '-'
+    delta = (new - old) / old * 100
+    better = delta > 0 if higher_is_better else delta < 0
+    mark = '+' if better else '-' if delta else ' '
+    return f'{delta:+.1f}% {mark}'
+
+
+def compare(before, after):
+    """Linhas (chave, métrica, antes, depois, variação) das combinações presentes nos dois"""
+    old_results = {_key(result): result for result in before['results']}
+    rows = []
+    for result in after['results']:
+        old = old_results.get(_key(result))
+        if old is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            rows.append((_key(result), metric, old[metric], result[metric],
+                         _change(old[metric], result[metric], higher_is_better)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compara resultados de benchmark')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    print(f"Antes: {before['revision']}  Depois: {after['revision']}")
+    current = None
+    for key, metric, old, new, change in compare(before, after):
+        if key != current:
+            mode, backend, model, concurrency = key
+            print(f"\n{mode} / {backend} / {model} / concorrência {concurrency}")
+            current = key
+        print(f"  {metric:<28}{old:>12}{new:>12}  {change}")
+
+
+if __name__ == '__main__':
+    main()
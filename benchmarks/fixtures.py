@@ -0,0 +1,54 @@
+"""
+Clipes de teste gerados com FFmpeg
+
+Por padrão o áudio é um tom senoidal; com `source` (uma gravação de fala),
+o áudio é repetido até a duração pedida, o que deixa o custo da transcrição
+mais próximo do real.
+"""
+
+import os
+import subprocess
+
+DEFAULT_DURATIONS = (15, 60, 300)
+
+
+def clip_name(duration, source=None):
+    kind = os.path.splitext(os.path.basename(source))[0] if source else 'tone'
+    return f'clip_{kind}_{duration}s.mp4'
+
+
+def generate_clip(path, duration, source=None):
+    """Gera um MP4 (H.264 + AAC) de `duration` segundos"""
+    if source:
+        audio_input = ['-stream_loop', '-1', '-i', source]
+    else:
+        audio_input = ['-f', 'lavfi', '-i', 'sine=frequency=440:sample_rate=44100']
+
+    subprocess.run(
+        ['ffmpeg', '-y', '-v', 'error',
+         '-f', 'lavfi', '-i', 'testsrc=size=640x360:rate=25',
+         *audio_input,
+         '-t', str(duration), '-map', '0:v', '-map', '1:a',
+         '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-b:a', '128k',
+         '-movflags', '+faststart', path],
+        check=True
+    )
+
+
+def ensure_fixtures(folder, durations=DEFAULT_DURATIONS, source=None):
+    """
+    Gera os clipes que ainda não existem na pasta
+
+    Returns:
+        Lista de {'name', 'path', 'duration'}
+    """
+    os.makedirs(folder, exist_ok=True)
+    fixtures = []
+    for duration in durations:
+        name = clip_name(duration, source)
+        path = os.path.join(folder, name)
+        if not os.path.exists(path):
+            print(f"[INFO] Gerando clipe de {duration}s: {path}")
+            generate_clip(path, duration, source)
+        fixtures.append({'name': name, 'path': os.path.abspath(path), 'duration': duration})
+    return fixtures
@@ -0,0 +1,263 @@
+"""
+Executa os benchmarks e grava os resultados em JSON
+
+Cada combinação de modelo e concorrência roda em um processo novo: o modelo
+é carregado do zero e o pico de memória (RSS) medido é só daquela execução.
+
+Modos:
+    pipeline: process_single_video (download via HTTP local + áudio + transcrição)
+    transcribe: transcribe_audio direto nos clipes, sem download
+
+Exemplo:
+    python -m benchmarks.run --models tiny base small --concurrency 1 2 4 --durations 15 60
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.fixtures import DEFAULT_DURATIONS, ensure_fixtures
+from benchmarks.server import serve_fixtures
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+
+def percentile(values, p):
+    """Percentil com interpolação linear (p de 0 a 100)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def peak_rss_mb():
+    """Pico de memória residente deste processo"""
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS em bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def stage_means():
+    """Duração média de cada etapa, lida dos histogramas de metrics.py"""
+    import metrics
+
+    sums, counts = {}, {}
+    for metric in metrics.STAGE_SECONDS.collect():
+        for sample in metric.samples:
+            stage = sample.labels.get('stage')
+            if sample.name.endswith('_sum'):
+                sums[stage] = sample.value
+            elif sample.name.endswith('_count'):
+                counts[stage] = sample.value
+    return {stage: round(sums[stage] / counts[stage], 3) for stage in counts if counts[stage]}
+
+
+def run_worker(args):
+    """Executado no processo filho: uma combinação de modelo e concorrência"""
+    import config
+
+    # A configuração é ajustada antes de importar o app, que a lê na importação
+    settings = config.get_config(args.env)
+    settings.WHISPER_MODEL = args.model
+    settings.TRANSCRIPTION_BACKEND = args.backend
+    settings.TRANSCRIPTION_SERVICE = False
+    settings.DATA_FOLDER = args.data_folder
+
+    import app
+
+    if not args.cache:
+        # Mede sempre o caminho completo, sem respostas do cache de resultados
+        app.result_cache.lookup_url = lambda url, mode=None: None
+        app.result_cache.lookup_video = lambda info, url, mode=None: None
+
+    with open(args.fixtures) as f:
+        fixtures = json.load(f)
+
+    start = time.perf_counter()
+    backend = app.get_local_backend()
+    backend.warmup()
+    model_load_seconds = time.perf_counter() - start
+
+    def run_one(task):
+        fixture, index = task
+        started = time.perf_counter()
+        try:
+            if args.mode == 'pipeline':
+                result = app.process_single_video(f"{fixture['url']}?run={index}")
+                transcription = result['transcription']
+                # Os vídeos do benchmark não ficam ocupando a pasta de downloads
+                app.retention_manager.remove_file(os.path.join(app.app.config['UPLOAD_FOLDER'], result['filename']))
+            else:
+                transcription = app.transcribe_audio(fixture['path'], duration=fixture['duration'])
+            ok = transcription['language'] != 'error'
+        except Exception as e:
+            print(f"[ERROR] Falha no benchmark de {fixture['name']}: {str(e)}")
+            ok = False
+        latency = time.perf_counter() - started
+        return {
+            'fixture': fixture['name'],
+            'duration': fixture['duration'],
+            'latency': latency,
+            'rtf': latency / fixture['duration'],
+            'ok': ok,
+        }
+
+    tasks = [(fixture, index) for index in range(args.repeat) for fixture in fixtures]
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        items = list(executor.map(run_one, tasks))
+    wall = time.perf_counter() - wall_start
+
+    latencies = [item['latency'] for item in items]
+    rtfs = [item['rtf'] for item in items]
+    audio_seconds = sum(item['duration'] for item in items)
+    summary = {
+        'mode': args.mode,
+        'backend': args.backend,
+        'model': args.model,
+        'concurrency': args.concurrency,
+        'videos': len(items),
+        'errors': sum(1 for item in items if not item['ok']),
+        'wall_seconds': round(wall, 3),
+        'throughput_videos_per_min': round(len(items) / wall * 60, 3),
+        'audio_seconds_per_second': round(audio_seconds / wall, 3),
+        'latency_p50': round(percentile(latencies, 50), 3),
+        'latency_p95': round(percentile(latencies, 95), 3),
+        'rtf_p50': round(percentile(rtfs, 50), 4),
+        'rtf_p95': round(percentile(rtfs, 95), 4),
+        'model_load_seconds': round(model_load_seconds, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'stages': stage_means(),
+        'items': items,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(summary, f)
+
+
+def run_combination(args, model, concurrency, fixtures_file, data_folder):
+    """Dispara um processo filho e devolve o resumo gravado por ele"""
+    output = os.path.join(data_folder, f'{model}-{concurrency}.json')
+    env = dict(os.environ, FLASK_ENV=args.env)
+    # Métricas locais ao processo filho (sem a pasta compartilhada do Gunicorn)
+    env.pop('PROMETHEUS_MULTIPROC_DIR', None)
+    subprocess.run(
+        [sys.executable, '-m', 'benchmarks.run', '--worker',
+         '--mode', args.mode, '--backend', args.backend, '--model', model,
+         '--concurrency', str(concurrency), '--repeat', str(args.repeat), '--env', args.env,
+         '--fixtures', fixtures_file, '--data-folder', os.path.join(data_folder, f'{model}-{concurrency}'),
+         '--output', output] + (['--cache'] if args.cache else []),
+        cwd=REPO_DIR, env=env, check=True
+    )
+    with open(output) as f:
+        return json.load(f)
+
+
+def print_table(results):
+    header = f"{'modelo':<10}{'conc.':>6}{'vídeos/min':>12}{'p50 (s)':>10}{'p95 (s)':>10}{'RTF p50':>10}{'RSS (MB)':>10}"
+    print(header)
+    print('-' * len(header))
+    for r in results:
+        print(f"{r['model']:<10}{r['concurrency']:>6}{r['throughput_videos_per_min']:>12}"
+              f"{r['latency_p50']:>10}{r['latency_p95']:>10}{r['rtf_p50']:>10}{r['peak_rss_mb']:>10}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark do pipeline de download e transcrição')
+    parser.add_argument('--mode', choices=('pipeline', 'transcribe'), default='pipeline')
+    parser.add_argument('--backend', default='whisper', help='Config.TRANSCRIPTION_BACKEND')
+    parser.add_argument('--models', nargs='+', default=['tiny', 'base'])
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[1, 2, 4])
+    parser.add_argument('--durations', nargs='+', type=int, default=list(DEFAULT_DURATIONS))
+    parser.add_argument('--repeat', type=int, default=2, help='Vezes que cada clipe é processado')
+    parser.add_argument('--source', help='Gravação de fala usada como áudio dos clipes (padrão: tom)')
+    parser.add_argument('--cache', action='store_true', help='Permite respostas do cache de resultados')
+    parser.add_argument('--env', default='development', help='Configuração base (FLASK_ENV)')
+    parser.add_argument('--fixtures-dir', default=os.path.join(BENCH_DIR, 'fixtures'))
+    parser.add_argument('--results-dir', default=os.path.join(BENCH_DIR, 'results'))
+    # Uso interno (processo filho)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--model', help=argparse.SUPPRESS)
+    parser.add_argument('--fixtures', help=argparse.SUPPRESS)
+    parser.add_argument('--data-folder', help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker:
+        args.concurrency = args.concurrency[0]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.worker:
+        run_worker(args)
+        return
+
+    fixtures = ensure_fixtures(args.fixtures_dir, args.durations, args.source)
+    server, base_url = serve_fixtures(args.fixtures_dir)
+    for fixture in fixtures:
+        fixture['url'] = f"{base_url}/{fixture['name']}"
+
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix='bench-') as data_folder:
+            fixtures_file = os.path.join(data_folder, 'fixtures.json')
+            with open(fixtures_file, 'w') as f:
+                json.dump(fixtures, f)
+
+            for model in args.models:
+                for concurrency in args.concurrency:
+                    print(f"[INFO] Benchmark: modelo {model}, concorrência {concurrency}")
+                    results.append(run_combination(args, model, concurrency, fixtures_file, data_folder))
+    finally:
+        server.shutdown()
+
+    revision = git_revision()
+    report = {
+        'revision': revision,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'mode': args.mode,
+        'backend': args.backend,
+        'durations': args.durations,
+        'repeat': args.repeat,
+        'results': results,
+    }
+    os.makedirs(args.results_dir, exist_ok=True)
+    path = os.path.join(args.results_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{revision}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_table(results)
+    print(f"[INFO] Resultados salvos em: {path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+"""
+Servidor HTTP local que faz o papel da plataforma de vídeo
+
+Os clipes são servidos como arquivos; o yt-dlp os reconhece pelo extrator
+genérico (link direto para o vídeo).
+"""
+
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_fixtures(folder, host='127.0.0.1', port=0):
+    """
+    Serve a pasta em segundo plano
+
+    Returns:
+        (servidor, URL base); chame servidor.shutdown() ao terminar
+    """
+    server = ThreadingHTTPServer((host, port), partial(_QuietHandler, directory=folder))
+    threading.Thread(target=server.serve_forever, name='bench-http', daemon=True).start()
+    return server, f'http://{host}:{server.server_address[1]}'
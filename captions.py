@@ -0,0 +1,161 @@
+"""
+Legendas da plataforma no lugar da transcrição
+
+Muitos vídeos (principalmente no YouTube) já têm legendas manuais ou
+automáticas. Baixá-las pelo yt-dlp leva uma fração de segundo, contra minutos
+de Whisper. As faixas são convertidas para o mesmo formato de transcrição do
+resto da aplicação:
+    {'text', 'language', 'segments': [{'start', 'end', 'text'}], 'source'}
+
+Formatos aceitos, em ordem de preferência: json3, srv3 e vtt.
+"""
+
+import html
+import json
+import re
+import xml.etree.ElementTree as ET
+
+from language import normalize_language
+
+FORMAT_PREFERENCE = ('json3', 'srv3', 'vtt')
+
+# Anotações sem fala: [Música], [Applause], (risos)...
+_ANNOTATION = re.compile(r'^\s*[\[(♪][^\])]*[\])♪]?\s*$')
+_VTT_TIMING = re.compile(r'(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})\s+-->\s+(?:(\d+):)?(\d{2}):(\d{2})[.,](\d{3})')
+_VTT_TAG = re.compile(r'<[^>]+>')
+# Sufixo da faixa automática no idioma original (YouTube); as demais são traduções
+_ORIGINAL_SUFFIX = '-orig'
+
+
+def _clean(text):
+    text = html.unescape(_VTT_TAG.sub('', text)).replace('\n', ' ')
+    return ' '.join(text.split())
+
+
+def parse_json3(data):
+    segments = []
+    for event in json.loads(data).get('events', []):
+        # aAppend: continuação de linha nas legendas automáticas
+        if 'segs' not in event or event.get('aAppend'):
+            continue
+        text = _clean(''.join(seg.get('utf8', '') for seg in event['segs']))
+        if not text:
+            continue
+        start = event.get('tStartMs', 0) / 1000
+        segments.append({'start': start, 'end': start + event.get('dDurationMs', 0) / 1000, 'text': text})
+    return segments
+
+
+def parse_srv3(data):
+    segments = []
+    root = ET.fromstring(data)
+    for p in root.iter('p'):
+        text = _clean(''.join(p.itertext()))
+        if not text:
+            continue
+        start = int(p.get('t', 0)) / 1000
+        segments.append({'start': start, 'end': start + int(p.get('d', 0)) / 1000, 'text': text})
+    return segments
+
+
+def _vtt_seconds(hours, minutes, seconds, millis):
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(seconds) + int(millis) / 1000
+
+
+def parse_vtt(data):
+    segments = []
+    previous_lines = []
+    for block in re.split(r'\n\s*\n', data.replace('\r\n', '\n')):
+        lines = block.strip().split('\n')
+        for index, line in enumerate(lines):
+            match = _VTT_TIMING.search(line)
+            if match:
+                break
+        else:
+            continue
+        groups = match.groups()
+        cue_lines = [_clean(line) for line in lines[index + 1:]]
+        # Legendas automáticas repetem a linha anterior no início de cada cue
+        new_lines = [line for line in cue_lines if line and line not in previous_lines]
+        previous_lines = cue_lines
+        text = ' '.join(new_lines)
+        if text:
+            segments.append({'start': _vtt_seconds(*groups[:4]), 'end': _vtt_seconds(*groups[4:]), 'text': text})
+    return segments
+
+
+PARSERS = {'json3': parse_json3, 'srv3': parse_srv3, 'vtt': parse_vtt}
+
+
+def _matching_tracks(tracks, language, original_only=False):
+    for code, formats in (tracks or {}).items():
+        if original_only:
+            if not code.endswith(_ORIGINAL_SUFFIX):
+                continue
+            code = code[:-len(_ORIGINAL_SUFFIX)]
+        if normalize_language(code) == language and formats:
+            yield formats
+
+
+def select_track(info, language, allow_automatic=True):
+    """
+    Escolhe a melhor faixa de legenda no idioma
+
+    Returns:
+        (formato, url, 'subtitles' ou 'automatic_captions') ou None
+    """
+    candidates = [(formats, 'subtitles') for formats in _matching_tracks(info.get('subtitles'), language)]
+    if allow_automatic:
+        automatic = info.get('automatic_captions') or {}
+        # No YouTube só a faixa "-orig" é reconhecimento de fala; as outras são traduções
+        original_only = any(code.endswith(_ORIGINAL_SUFFIX) for code in automatic)
+        candidates += [(formats, 'automatic_captions')
+                       for formats in _matching_tracks(automatic, language, original_only)]
+
+    for formats, source in candidates:
+        by_ext = {fmt.get('ext'): fmt for fmt in formats if fmt.get('url')}
+        for ext in FORMAT_PREFERENCE:
+            if ext in by_ext:
+                return ext, by_ext[ext]['url'], source
+    return None
+
+
+def is_usable(segments, duration, min_coverage):
+    """Se as legendas cobrem fala suficiente do vídeo para dispensar o ASR"""
+    spoken = [segment for segment in segments if not _ANNOTATION.match(segment['text'])]
+    if not spoken:
+        return False
+    if not duration:
+        return True
+    covered = sum(max(0, segment['end'] - segment['start']) for segment in spoken)
+    return covered / duration >= min_coverage
+
+
+def fetch_captions(ydl, info, language, allow_automatic=True, min_coverage=0.2):
+    """
+    Baixa e converte as legendas do vídeo no idioma pedido
+
+    Returns:
+        Transcrição no formato da aplicação, ou None se não houver legendas
+        utilizáveis (a transcrição segue pelo ASR)
+    """
+    track = select_track(info, language, allow_automatic)
+    if track is None:
+        return None
+    ext, url, source = track
+
+    data = ydl.urlopen(url).read().decode('utf-8', errors='replace')
+    segments = [
+        {'start': round(segment['start'], 2), 'end': round(segment['end'], 2), 'text': segment['text']}
+        for segment in PARSERS[ext](data)
+    ]
+    if not is_usable(segments, info.get('duration'), min_coverage):
+        print(f"[INFO] Legendas ({source}, {ext}) insuficientes, usando transcrição")
+        return None
+
+    return {
+        'text': ' '.join(segment['text'] for segment in segments),
+        'language': language,
+        'segments': segments,
+        'source': source,
+    }
@@ -0,0 +1,241 @@
+"""
+Transcrição em partes para áudios longos (usada pelo serviço de transcrição)
+
+Um vídeo de uma hora passado inteiro ao modelo vira um único job serial: ocupa
+um núcleo e mantém o áudio todo em memória. Aqui o áudio é decodificado aos
+poucos pelo FFmpeg, os silêncios longos são descartados por um VAD de energia
+e a fala é cortada em trechos de até Config.LONG_AUDIO_CHUNK_SECONDS,
+transcritos em paralelo por um pool de processos (cada um com seu modelo).
+
+Trechos cortados no meio da fala se sobrepõem em
+Config.LONG_AUDIO_CHUNK_OVERLAP_SECONDS; na costura, cada trecho fica com os
+segmentos da sua metade da sobreposição. Os timestamps voltam para a escala
+global do áudio e no máximo `max_in_flight` trechos ficam em memória.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+
+import media
+from transcription_backends import _result, create_backend
+
+FRAME_SECONDS = 0.03
+# Silêncio mantido antes e depois da fala de cada trecho
+PADDING_SECONDS = 0.2
+
+
+class _Chunk:
+    """Trecho contínuo do áudio; só os segmentos com centro em [keep_from, keep_until) ficam"""
+
+    def __init__(self, index, start, audio, keep_from, keep_until):
+        self.index = index
+        self.start = start
+        self.audio = audio
+        self.keep_from = keep_from
+        self.keep_until = keep_until
+
+
+class SpeechChunker:
+    """Corta o áudio em trechos de fala a partir de blocos de amostras"""
+
+    def __init__(self, threshold_db=-45, min_silence=0.8, chunk_seconds=60, overlap_seconds=2,
+                 sample_rate=media.SAMPLE_RATE):
+        if overlap_seconds >= chunk_seconds:
+            raise ValueError('A sobreposição precisa ser menor que o trecho')
+        self.frame_size = int(sample_rate * FRAME_SECONDS)
+        # Limiar em dBFS convertido para amplitude RMS
+        self.threshold = 10 ** (threshold_db / 20)
+        self.min_silence_frames = max(1, round(min_silence / FRAME_SECONDS))
+        self.padding_frames = round(PADDING_SECONDS / FRAME_SECONDS)
+        self.max_frames = round(chunk_seconds / FRAME_SECONDS)
+        self.overlap_frames = round(overlap_seconds / FRAME_SECONDS)
+
+        self.leftover = None
+        self.position = 0  # Índice global do próximo quadro
+        self.preroll = deque(maxlen=self.padding_frames)
+        self.frames = []
+        self.chunk_start = None  # Quadro onde o trecho atual começa
+        self.silence_run = 0
+        self.keep_from = -math.inf
+        self.index = 0
+
+    def chunks(self, blocks):
+        """Gera os trechos à medida que os blocos de áudio chegam"""
+        import numpy as np
+
+        for block in blocks:
+            if self.leftover is not None:
+                block = np.concatenate((self.leftover, block))
+            count = len(block) // self.frame_size
+            self.leftover = block[count * self.frame_size:]
+            frames = block[:count * self.frame_size].reshape(count, self.frame_size)
+            loud = np.sqrt(np.mean(frames ** 2, axis=1)) >= self.threshold
+            for frame, is_speech in zip(frames, loud):
+                chunk = self._feed(frame, is_speech)
+                if chunk is not None:
+                    yield chunk
+
+        if self.chunk_start is not None:
+            yield self._emit(len(self.frames) - max(0, self.silence_run - self.padding_frames), overlap=False)
+
+    def _feed(self, frame, is_speech):
+        chunk = None
+        if self.chunk_start is None:
+            if is_speech:
+                self.chunk_start = self.position - len(self.preroll)
+                self.frames = list(self.preroll) + [frame]
+                self.preroll.clear()
+                self.silence_run = 0
+            else:
+                self.preroll.append(frame)
+        else:
+            self.frames.append(frame)
+            self.silence_run = 0 if is_speech else self.silence_run + 1
+            if self.silence_run >= self.min_silence_frames:
+                # Fim da fala: o silêncio seguinte não vai para nenhum trecho
+                chunk = self._emit(len(self.frames) - self.silence_run + self.padding_frames, overlap=False)
+            elif len(self.frames) >= self.max_frames:
+                # Trecho cheio no meio da fala: o próximo começa sobreposto
+                chunk = self._emit(len(self.frames), overlap=True)
+        self.position += 1
+        return chunk
+
+    def _emit(self, length, overlap):
+        import numpy as np
+
+        length = min(length, len(self.frames))
+        start = self.chunk_start * FRAME_SECONDS
+        end = start + length * FRAME_SECONDS
+        if overlap:
+            cut = end - self.overlap_frames * FRAME_SECONDS / 2
+            next_frames = self.frames[length - self.overlap_frames:length]
+            next_start = self.chunk_start + length - self.overlap_frames
+        else:
+            cut = math.inf
+            next_frames = []
+            next_start = None
+
+        chunk = _Chunk(self.index, start, np.concatenate(self.frames[:length]), self.keep_from, cut)
+        self.index += 1
+        self.keep_from = cut if overlap else -math.inf
+        self.frames = next_frames
+        self.chunk_start = next_start
+        self.silence_run = 0
+        self.preroll.clear()
+        return chunk
+
+
+# Motor carregado em cada processo do pool
+_worker_backend = None
+
+
+def _watch_parent(parent_pid):
+    # O pool não pode sobreviver ao serviço (ex.: SIGKILL no master)
+    while True:
+        if os.getppid() != parent_pid:
+            os._exit(0)
+        time.sleep(5)
+
+
+def _init_worker(backend_name, options, parent_pid):
+    global _worker_backend
+    threading.Thread(target=_watch_parent, args=(parent_pid,), daemon=True).start()
+    _worker_backend = create_backend(backend_name, **options)
+    _worker_backend.load()
+
+
+def _transcribe_chunk(audio, language):
+    return _worker_backend.transcribe(audio, language)
+
+
+class ChunkedTranscriber:
+    """Transcreve áudios longos em trechos paralelos com um pool de processos"""
+
+    def __init__(self, backend_name, options, workers=2, min_seconds=600, chunk_seconds=60,
+                 overlap_seconds=2, vad_threshold_db=-45, vad_min_silence=0.8):
+        self.backend_name = backend_name
+        self.workers = workers or os.cpu_count() or 1
+        # Cada processo usa a sua parte dos núcleos; lotes não se aplicam aqui
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        self.options = dict(options, batch_size=1, cpu_threads=threads, torch_threads=threads)
+        self.min_seconds = min_seconds
+        self.chunker_options = {
+            'threshold_db': vad_threshold_db,
+            'min_silence': vad_min_silence,
+            'chunk_seconds': chunk_seconds,
+            'overlap_seconds': overlap_seconds,
+        }
+        self.max_in_flight = self.workers * 2
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def is_long(self, audio_path):
+        """Se o arquivo é longo o bastante para valer a transcrição em partes"""
+        try:
+            duration = media.probe_duration(audio_path)
+        except Exception as e:
+            print(f"[WARNING] Não foi possível obter a duração do áudio: {str(e)}")
+            return False
+        return duration is not None and duration >= self.min_seconds
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                print(f"[INFO] Iniciando {self.workers} processo(s) para transcrição em partes...")
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                    initargs=(self.backend_name, self.options, os.getpid())
+                )
+            return self._executor
+
+    def transcribe(self, audio_path, language=None, on_segment=None):
+        """Mesma interface dos motores; `on_segment` recebe os segmentos na ordem do áudio"""
+        executor = self._get_executor()
+        chunker = SpeechChunker(**self.chunker_options)
+        pending = deque()
+        segments = []
+        detected = language
+
+        def collect(chunk, future):
+            nonlocal detected
+            result = future.result()
+            if detected is None and result['language'] != 'desconhecido':
+                detected = result['language']
+            for seg in result['segments']:
+                start = chunk.start + seg['start']
+                end = chunk.start + seg['end']
+                if not chunk.keep_from <= (start + end) / 2 < chunk.keep_until:
+                    continue
+                segment = {'start': round(start, 2), 'end': round(end, 2), 'text': seg['text']}
+                segments.append(segment)
+                if on_segment is not None:
+                    on_segment(segment)
+
+        try:
+            for chunk in chunker.chunks(media.iter_pcm(audio_path)):
+                pending.append((chunk, executor.submit(_transcribe_chunk, chunk.audio, detected)))
+                # Sem idioma definido, o primeiro trecho o detecta para os demais;
+                # depois disso, no máximo max_in_flight trechos ficam pendentes
+                if detected is None or len(pending) >= self.max_in_flight:
+                    collect(*pending.popleft())
+            while pending:
+                collect(*pending.popleft())
+        finally:
+            for _, future in pending:
+                future.cancel()
+
+        print(f"[INFO] Transcrição em partes concluída: {chunker.index} trecho(s)")
+        return _result(segments, detected)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
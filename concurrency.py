@@ -0,0 +1,124 @@
+"""
+Limitador de downloads simultâneos
+
+Os downloads de um lote rodam em paralelo no pool da fila de jobs, mas cada um
+precisa ocupar uma vaga global (Config.MAX_CONCURRENT_DOWNLOADS) e uma vaga da
+sua plataforma (Config.MAX_DOWNLOADS_PER_HOST) para não sobrecarregar TikTok e
+Instagram. As vagas são arquivos travados com flock, então o limite vale para o
+container inteiro e não apenas para um worker do Gunicorn.
+
+Com um AdaptiveThrottle (throttling.py), as vagas da plataforma passam a ser
+um teto: quando ela começa a bloquear, só as primeiras vagas ficam liberadas
+e novos downloads esperam também pelo balde de tokens.
+"""
+
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from platforms import detect_platform
+
+try:
+    import fcntl
+except ImportError:  # Windows: limite vale apenas dentro do processo
+    fcntl = None
+
+
+class SlotSemaphore:
+    """Semáforo com `size` vagas compartilhado entre processos"""
+
+    def __init__(self, name, size, lock_dir, poll_interval=0.2):
+        self.name = name
+        self.size = max(1, size)
+        self.lock_dir = lock_dir
+        self.poll_interval = poll_interval
+        self._local = threading.BoundedSemaphore(self.size)
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def _slot_path(self, index):
+        return os.path.join(self.lock_dir, f'{self.name}.{index}.lock')
+
+    def acquire(self, limit=None):
+        """
+        Bloqueia até conseguir uma vaga; retorna o handle para release()
+
+        Args:
+            limit: Usar só as primeiras `limit` vagas (chamável, relido a cada volta)
+        """
+        self._local.acquire()
+        if fcntl is None:
+            return None
+
+        while True:
+            size = max(1, min(self.size, limit())) if limit else self.size
+            # Começar de uma vaga aleatória evita que todos disputem a vaga 0
+            start = random.randrange(size)
+            for offset in range(size):
+                handle = open(self._slot_path((start + offset) % size), 'a+')
+                try:
+                    fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return handle
+                except BlockingIOError:
+                    handle.close()
+            time.sleep(self.poll_interval * (0.5 + random.random()))
+
+    def release(self, handle):
+        if handle is not None:
+            fcntl.flock(handle, fcntl.LOCK_UN)
+            handle.close()
+        self._local.release()
+
+
+class DownloadLimiter:
+    """Combina o limite global de downloads com limites por plataforma"""
+
+    def __init__(self, max_concurrent, lock_dir, per_host=None, default_per_host=None, throttle=None):
+        self.lock_dir = lock_dir
+        self.throttle = throttle
+        self.per_host = per_host or {}
+        self.default_per_host = default_per_host or max_concurrent
+        self.global_slots = SlotSemaphore('downloads', max_concurrent, lock_dir)
+        self._host_slots = {}
+        self._lock = threading.Lock()
+
+    def _host_semaphore(self, platform):
+        with self._lock:
+            if platform not in self._host_slots:
+                size = self.per_host.get(platform, self.default_per_host)
+                name = 'host-' + ''.join(c if c.isalnum() else '_' for c in platform)
+                self._host_slots[platform] = SlotSemaphore(name, size, self.lock_dir)
+            return self._host_slots[platform]
+
+    @contextmanager
+    def slot(self, url):
+        """Ocupa uma vaga da plataforma e uma vaga global durante o bloco"""
+        platform = detect_platform(url)
+        host_slots = self._host_semaphore(platform)
+        limit = None
+        if self.throttle is not None:
+            limit = lambda: self.throttle.concurrency(platform, host_slots.size)
+
+        # A vaga da plataforma vem primeiro: quem espera pelo TikTok não
+        # deve segurar uma vaga global que um vídeo do YouTube poderia usar
+        host_handle = host_slots.acquire(limit)
+        try:
+            if self.throttle is not None:
+                waited = self.throttle.wait(platform, host_slots.size)
+                if waited:
+                    print(f"[INFO] Aguardou {waited:.1f}s pelo limite de taxa de {platform}")
+            global_handle = self.global_slots.acquire()
+            try:
+                yield
+            except Exception as e:
+                if self.throttle is not None:
+                    self.throttle.record(platform, host_slots.size, e)
+                raise
+            else:
+                if self.throttle is not None:
+                    self.throttle.record(platform, host_slots.size)
+            finally:
+                self.global_slots.release(global_handle)
+        finally:
+            host_slots.release(host_handle)
@@ -13,6 +13,7 @@ class Config:
     
     # Pastas
     UPLOAD_FOLDER = 'downloads'
+    DATA_FOLDER = 'data'  # Bancos SQLite (fila de jobs, caches e índices)
     MAX_CONTENT_LENGTH = 500 * 1024 * 1024  # 500MB
     
     # Whisper - Modelo de transcrição
@@ -24,24 +25,138 @@ class Config:
     # large: Melhor qualidade (~2.9GB)
     WHISPER_MODEL = 'base'
     
+    # Motor de transcrição
+    # whisper: openai-whisper (PyTorch) - PADRÃO
+    # faster-whisper: CTranslate2 quantizado, bem mais rápido em CPU (pip install faster-whisper)
+    # stub: resposta fixa, sem modelo (testes)
+    TRANSCRIPTION_BACKEND = 'whisper'
+    FASTER_WHISPER_COMPUTE_TYPE = 'int8'  # int8, int8_float16, float16, float32
+    FASTER_WHISPER_CPU_THREADS = 0  # 0 = automático
+    
+    # Serviço de transcrição: um processo carrega o modelo uma vez e atende
+    # todos os workers do Gunicorn (desligado = cada worker carrega o seu)
+    TRANSCRIPTION_SERVICE = True
+    TRANSCRIPTION_SERVICE_SOCKET = 'transcriber.sock'  # Dentro de DATA_FOLDER
+    TRANSCRIPTION_SERVICE_AUTHKEY = os.environ.get('TRANSCRIPTION_SERVICE_AUTHKEY') or 'dev-transcriber-key'
+    
+    # Transcrição em lote (no serviço): clipes de até 30s de vários vídeos são
+    # decodificados juntos; áudios mais longos seguem pelo caminho sequencial. 1 = desligado
+    TRANSCRIPTION_BATCH_SIZE = 8
+    TRANSCRIPTION_BATCH_MAX_WAIT_MS = 50  # Espera máxima para completar um lote
+    
+    # Áudios longos (no serviço): decodificação em streaming pelo FFmpeg, silêncios
+    # descartados por VAD de energia e trechos transcritos em paralelo por um pool
+    # de processos, cada um com seu modelo (memória = modelo x LONG_AUDIO_WORKERS)
+    LONG_AUDIO_MIN_SECONDS = 600  # Duração a partir da qual o áudio é dividido (0 = desligado)
+    LONG_AUDIO_WORKERS = 2  # Processos do pool (0 = um por núcleo)
+    LONG_AUDIO_CHUNK_SECONDS = 60  # Tamanho máximo de cada trecho
+    LONG_AUDIO_CHUNK_OVERLAP_SECONDS = 2  # Sobreposição quando o corte cai no meio da fala
+    VAD_THRESHOLD_DB = -45  # Energia (dBFS) abaixo da qual o áudio é considerado silêncio
+    VAD_MIN_SILENCE_MS = 800  # Silêncio mínimo para encerrar um trecho
+    
     # yt-dlp - Opções de download
     YTDLP_FORMAT = 'best[ext=mp4]/best'  # Formato preferencial
     YTDLP_QUIET = True  # Modo silencioso
     
     # Transcrição
-    TRANSCRIPTION_LANGUAGE = None  # None = auto-detecta, ou 'pt', 'en', 'es'
+    # Idioma: pedido na requisição > TRANSCRIPTION_LANGUAGE > metadados do vídeo
+    # > idioma habitual do canal > detecção pelo motor no início do áudio
+    TRANSCRIPTION_LANGUAGE = None  # None = resolve por vídeo, ou 'pt', 'en', 'es'
+    LANGUAGE_CACHE_MIN_VIDEOS = 2  # Vídeos do canal no mesmo idioma para reutilizá-lo
+    
+    # Legendas da plataforma (manuais ou automáticas) no idioma resolvido são usadas
+    # no lugar do Whisper; sem legendas utilizáveis, a transcrição roda normalmente
+    CAPTIONS_FIRST = True
+    CAPTIONS_ALLOW_AUTOMATIC = True  # Aceitar legendas automáticas (reconhecimento de fala da plataforma)
+    CAPTIONS_MIN_COVERAGE = 0.2  # Fração mínima da duração do vídeo coberta por fala nas legendas
+    
+    # Reposts: o mesmo clipe enviado por outro link/plataforma é reconhecido pela
+    # impressão do áudio (fpcalc do Chromaprint, se instalado, ou cromagrama com numpy)
+    # e pelo pHash de quadros-chave; a transcrição existente é reaproveitada sem Whisper
+    FINGERPRINT_ENABLED = True
+    FINGERPRINT_SECONDS = 120  # Trecho inicial do áudio usado na impressão
+    FINGERPRINT_KEYFRAMES = 5  # Quadros com pHash por vídeo
+    FINGERPRINT_AUDIO_THRESHOLD = 0.8  # Fração mínima de bits iguais nas impressões de áudio
     
-    # Limpeza automática
+    # Análise de cada transcrição (palavras-chave por TF-IDF, hashtags, momentos-chave, resumo)
+    ANALYSIS_INLINE = True  # Incluir 'analysis' no resultado de cada vídeo
+    ANALYSIS_MAX_KEYWORDS = 10
+    
+    # Transcrições completas ficam comprimidas em data/transcript_store.db e saem em
+    # /transcripts/<video_id> (SRT, VTT, TXT, JSONL); os resultados levam só um resumo
+    TRANSCRIPT_PREVIEW_CHARS = 500  # Início do texto incluído no resumo
+    
+    # Geração de roteiros com IA (/ai/generate_script)
+    # openai e claude leem OPENAI_API_KEY / ANTHROPIC_API_KEY (pip install openai anthropic)
+    SCRIPT_DEFAULT_PROVIDER = 'openai'
+    SCRIPT_MOCK_PROVIDER = False  # Provedor 'mock': roteiro local, sem rede (testes e desenvolvimento)
+    SCRIPT_MOCK_DELAY_MS = 20  # Espera entre as palavras do provedor 'mock'
+    SCRIPT_INPUT_TOKENS = 6000  # Orçamento das transcrições no prompt; acima dele, vídeos são resumidos
+    SCRIPT_MAX_TOKENS = 1500  # Tamanho máximo do roteiro
+    SCRIPT_MAX_CONCURRENT = 4  # Chamadas simultâneas por provedor (no container inteiro)
+    SCRIPT_WORKERS = 4  # Threads de geração (por worker do Gunicorn)
+    SCRIPT_CACHE_HOURS = 168  # Roteiros prontos reaproveitados por X horas (0 = sem expiração)
+    SCRIPT_WAIT_SECONDS = 120  # Espera em pedidos síncronos; depois disso a resposta é 202 com o script_id
+    
+    # Áudio para transcrição, derivado do vídeo já baixado
+    # direct: entrega o próprio vídeo ao Whisper (ele decodifica via FFmpeg) - PADRÃO
+    # copy: copia a faixa de áudio no codec original, sem recodificar
+    # pcm: WAV 16 kHz mono, o formato que o Whisper usa internamente
+    # mp3: recodifica em MP3 localmente
+    # redownload: baixa o áudio da URL uma segunda vez (comportamento antigo)
+    AUDIO_EXTRACTION_MODE = 'direct'
+    
+    # Entrega dos vídeos em /download/<video_id>
+    # None: o próprio Flask envia, com Range (206) e ETag/Last-Modified - PADRÃO
+    # 'x-sendfile': header X-Sendfile (Apache mod_xsendfile, lighttpd)
+    # 'x-accel': header X-Accel-Redirect (nginx), a partir de X_ACCEL_PREFIX
+    SENDFILE_MODE = None
+    X_ACCEL_PREFIX = '/protected-downloads/'  # location 'internal' do nginx apontando para downloads/
+    DOWNLOAD_CACHE_MAX_AGE = 3600  # Segundos
+    
+    # Limpeza automática (serviço de retenção em segundo plano)
     AUTO_CLEANUP_HOURS = 24  # Deletar arquivos após X horas (0 = desabilitado)
+    MAX_STORAGE_BYTES = 50 * 1024 * 1024 * 1024  # Cota da pasta de downloads; acima dela sai o menos acessado (0 = sem cota)
+    RETENTION_SWEEP_SECONDS = 60  # Intervalo entre rodadas
+    RETENTION_SWEEP_BATCH = 200  # Máximo de arquivos removidos por rodada (idade e cota)
+    ORPHAN_FILE_GRACE_HOURS = 6  # Temporários (.part, _audio) sem dono são removidos após X horas
+    DOWNLOAD_PIN_SECONDS = 3600  # Proteção de um arquivo sendo enviado em /download
+    
+    # Cache de resultados (links repetidos não são baixados nem transcritos de novo)
+    # Entradas expiram junto com AUTO_CLEANUP_HOURS
+    RESULT_CACHE_MAX_BYTES = 20 * 1024 * 1024 * 1024  # 20GB de vídeos (0 = sem limite)
     
     # Performance
-    MAX_CONCURRENT_DOWNLOADS = 3  # Número máximo de downloads simultâneos
+    MAX_CONCURRENT_DOWNLOADS = 3  # Número máximo de downloads simultâneos (no container inteiro)
+    MAX_DOWNLOADS_PER_HOST = {  # Limite por plataforma, dentro do limite global
+        'tiktok': 1,
+        'instagram': 1,
+    }
+    DEFAULT_DOWNLOADS_PER_HOST = 2  # Limite para plataformas não listadas acima
+    # Limites adaptativos: em HTTP 429 (Too Many Requests) a taxa e as vagas da
+    # plataforma caem pela metade; com sucessos voltam a subir até os tetos
+    DOWNLOADS_PER_MINUTE = {  # Teto de novos downloads por minuto, por plataforma
+        'tiktok': 20,
+        'instagram': 20,
+    }
+    DEFAULT_DOWNLOADS_PER_MINUTE = 60  # Teto para plataformas não listadas acima
+    MIN_DOWNLOADS_PER_MINUTE = 2  # Piso da taxa sob bloqueio
+    RATE_LIMIT_BURST = 3  # Downloads que podem começar de uma vez (tamanho do balde)
+    RATE_LIMIT_COOLDOWN_SECONDS = 60  # Tempo após um bloqueio antes de voltar a subir os limites
+    JOB_MAX_ATTEMPTS = 4  # Tentativas por URL em falhas temporárias (1 = sem repetição)
+    JOB_RETRY_BASE_SECONDS = 15  # Espera antes da 2ª tentativa (dobra a cada nova, com jitter)
+    JOB_RETRY_MAX_SECONDS = 600
+    JOB_LEASE_SECONDS = 60  # Sem renovação por esse tempo (worker morto), o job é retomado por outro worker
+    JOB_WORKERS = 4  # Threads que processam jobs em segundo plano (por worker do Gunicorn)
+    YTDLP_POOL_MAX_IDLE = 4  # Instâncias do yt-dlp guardadas por perfil de plataforma (por worker)
+    YTDLP_SESSION_MAX_USES = 100  # Vídeos por instância antes de ser recriada
 
 
 class DevelopmentConfig(Config):
     """Configurações para desenvolvimento"""
     DEBUG = True
     TESTING = False
+    SCRIPT_MOCK_PROVIDER = True
 
 
 class ProductionConfig(Config):
@@ -59,6 +174,9 @@ class TestingConfig(Config):
     """Configurações para testes"""
     TESTING = True
     DEBUG = True
+    TRANSCRIPTION_BACKEND = 'stub'
+    SCRIPT_MOCK_PROVIDER = True
+    SCRIPT_DEFAULT_PROVIDER = 'mock'
 
 
 # Dicionário de configurações
@@ -0,0 +1,158 @@
+"""
+Índice persistente dos arquivos da pasta de downloads
+
+Mapeia video_id -> caminho, extensão, tamanho e mtime. O registro acontece
+quando um download termina, e a rota /download/<video_id> passa a fazer uma
+consulta pela chave primária em vez de listar a pasta inteira.
+
+Para indexar uma pasta já existente:
+    flask --app app rebuild-index
+"""
+
+import os
+import time
+
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    video_id TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime);
+CREATE INDEX IF NOT EXISTS files_last_access ON files (last_access);
+"""
+
+# Arquivos temporários do yt-dlp e da extração de áudio não entram no índice
+_TEMPORARY_SUFFIXES = ('.part', '.ytdl', '.temp', '.tmp')
+
+
+def _db():
+    return storage.connect('file_index', _SCHEMA)
+
+
+def register_file(video_id, path):
+    """Registra (ou atualiza) o arquivo de vídeo de um video_id"""
+    stat = os.stat(path)
+    _db().execute(
+        'INSERT OR REPLACE INTO files (video_id, path, ext, size, mtime, last_access) VALUES (?, ?, ?, ?, ?, ?)',
+        (video_id, os.path.abspath(path), os.path.splitext(path)[1], stat.st_size, stat.st_mtime, time.time())
+    )
+
+
+def lookup_file(video_id):
+    """
+    Retorna o registro do arquivo do video_id, ou None
+
+    Entradas cujo arquivo sumiu do disco são removidas na hora.
+    """
+    row = _db().execute('SELECT * FROM files WHERE video_id = ?', (video_id,)).fetchone()
+    if row is None:
+        return None
+    if not os.path.exists(row['path']):
+        remove_entry(video_id)
+        return None
+    return dict(row)
+
+
+def touch(video_id):
+    """Marca o último acesso ao arquivo (usado na remoção por LRU)"""
+    _db().execute('UPDATE files SET last_access = ? WHERE video_id = ?', (time.time(), video_id))
+
+
+def remove_entry(video_id):
+    _db().execute('DELETE FROM files WHERE video_id = ?', (video_id,))
+
+
+def clear():
+    """Remove todas as entradas do índice"""
+    _db().execute('DELETE FROM files')
+
+
+def contains(video_id):
+    """Se o video_id está no índice (sem verificar o disco)"""
+    return _db().execute('SELECT 1 FROM files WHERE video_id = ?', (video_id,)).fetchone() is not None
+
+
+def total_size():
+    """Soma dos tamanhos de todos os arquivos indexados"""
+    return _db().execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+
+
+def modified_before(timestamp, limit, after=None):
+    """
+    Arquivos modificados antes de `timestamp`, dos mais antigos para os mais novos
+
+    Args:
+        after: (mtime, video_id) da última entrada da página anterior; a
+            página seguinte começa depois dela, então entradas que continuam
+            no índice (fixadas) não voltam na próxima consulta
+    """
+    if after is None:
+        rows = _db().execute(
+            'SELECT * FROM files WHERE mtime < ? ORDER BY mtime, video_id LIMIT ?', (timestamp, limit)
+        ).fetchall()
+    else:
+        rows = _db().execute(
+            'SELECT * FROM files WHERE mtime < ? AND (mtime, video_id) > (?, ?) ORDER BY mtime, video_id LIMIT ?',
+            (timestamp, *after, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def least_recently_used(limit, after=None):
+    """Arquivos acessados há mais tempo primeiro; `after` é (last_access, video_id), como em modified_before"""
+    if after is None:
+        rows = _db().execute('SELECT * FROM files ORDER BY last_access, video_id LIMIT ?', (limit,)).fetchall()
+    else:
+        rows = _db().execute(
+            'SELECT * FROM files WHERE (last_access, video_id) > (?, ?) ORDER BY last_access, video_id LIMIT ?',
+            (*after, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def _video_id_from_name(filename):
+    if filename.startswith('.') or filename.endswith(_TEMPORARY_SUFFIXES) or '_audio' in filename:
+        return None
+    video_id, ext = os.path.splitext(filename)
+    return video_id if ext else None
+
+
+def rebuild_index(folder):
+    """
+    Reconstrói o índice a partir do conteúdo da pasta
+
+    Returns:
+        Número de arquivos indexados
+    """
+    now = time.time()
+    rows = []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if not entry.is_file():
+                continue
+            video_id = _video_id_from_name(entry.name)
+            if video_id is None:
+                continue
+            stat = entry.stat()
+            rows.append((video_id, os.path.abspath(entry.path), os.path.splitext(entry.name)[1],
+                         stat.st_size, stat.st_mtime, now))
+
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute('DELETE FROM files')
+        db.executemany(
+            'INSERT OR REPLACE INTO files (video_id, path, ext, size, mtime, last_access) VALUES (?, ?, ?, ?, ?, ?)',
+            rows
+        )
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    return len(rows)
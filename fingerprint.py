@@ -0,0 +1,364 @@
+"""
+Impressões digitais de áudio e vídeo para achar reposts
+
+O mesmo clipe circula no TikTok, Instagram e YouTube com links e IDs
+diferentes, então o cache de resultados não o reconhece. Logo após o
+download, cada vídeo recebe:
+    - uma impressão de áudio no estilo do Chromaprint: um inteiro de 32 bits
+      a cada ~0,12s, vindo do `fpcalc` (Chromaprint) quando instalado ou, sem
+      ele, de um cromagrama calculado com numpy a partir do FFmpeg
+    - o pHash (DCT 32x32 -> 64 bits) de alguns quadros-chave
+
+As impressões ficam em um índice local (SQLite) com buckets no estilo LSH:
+os 20 bits mais altos de cada sub-impressão de áudio e as quatro faixas de 16
+bits de cada pHash. Um vídeo novo só é comparado com os que dividem buckets
+com ele, e a comparação final é a taxa de bits diferentes entre as impressões
+de áudio no melhor alinhamento (reposts costumam cortar o começo). Acima do
+limiar, a transcrição do original (no transcript_store) é reaproveitada e o
+Whisper não roda. O índice guarda só as impressões; a retenção tira do índice
+os vídeos que remove da pasta de downloads.
+"""
+
+import json
+import shutil
+import sqlite3
+import subprocess
+import time
+from collections import Counter
+
+import media
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    video_id TEXT PRIMARY KEY,
+    algorithm TEXT NOT NULL,
+    duration REAL,
+    audio BLOB NOT NULL,
+    keyframes BLOB,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS audio_terms (
+    term INTEGER NOT NULL,
+    video_id TEXT NOT NULL,
+    PRIMARY KEY (term, video_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS frame_bands (
+    band INTEGER NOT NULL,
+    video_id TEXT NOT NULL,
+    PRIMARY KEY (band, video_id)
+) WITHOUT ROWID;
+"""
+
+ALGORITHM_CHROMAPRINT = 'chromaprint'
+ALGORITHM_CHROMA = 'chroma-numpy'
+
+# Parâmetros do Chromaprint: 11025 Hz, janelas de 4096 com 2/3 de sobreposição
+SAMPLE_RATE = 11025
+FRAME_SIZE = 4096
+HOP_SIZE = FRAME_SIZE // 3
+MIN_FREQUENCY = 28
+MAX_FREQUENCY = 3520
+
+# Bits altos de cada sub-impressão usados como bucket (os mais estáveis)
+TERM_SHIFT = 12
+# Impressões curtas ou quase constantes (silêncio, ruído) casam com qualquer coisa
+MIN_FRAMES = 40
+MIN_DISTINCT_RATIO = 0.3
+# Candidatos verificados por busca e alinhamentos testados por candidato
+MAX_CANDIDATES = 10
+MAX_OFFSETS = 3
+PHASH_SIZE = 32
+_QUERY_CHUNK = 900
+
+
+def _migrate(conn):
+    # Bancos antigos guardavam uma cópia da transcrição (NOT NULL) em cada entrada
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(entries)')}
+    if 'transcription' in columns:
+        try:
+            conn.execute('ALTER TABLE entries DROP COLUMN transcription')
+        except sqlite3.OperationalError as e:
+            # Outro worker pode ter removido a coluna ao mesmo tempo
+            if 'no such column' not in str(e):
+                raise
+
+
+def _db():
+    return storage.connect('fingerprints', _SCHEMA, migrate=_migrate)
+
+
+def chromaprint_available():
+    """Se o fpcalc (Chromaprint) está instalado"""
+    return shutil.which('fpcalc') is not None
+
+
+def _fpcalc(path, seconds):
+    import numpy as np
+
+    result = subprocess.run(
+        ['fpcalc', '-raw', '-json', '-length', str(int(seconds)), path],
+        capture_output=True, text=True, check=True
+    )
+    return np.asarray(json.loads(result.stdout)['fingerprint'], dtype=np.uint32)
+
+
+def _chroma_matrix(np):
+    """Soma das frequências de cada bin da FFT em 12 classes de altura"""
+    frequencies = np.fft.rfftfreq(FRAME_SIZE, 1 / SAMPLE_RATE)
+    matrix = np.zeros((len(frequencies), 12), dtype=np.float32)
+    valid = (frequencies >= MIN_FREQUENCY) & (frequencies <= MAX_FREQUENCY)
+    notes = np.round(12 * np.log2(frequencies[valid] / 440) + 69).astype(int) % 12
+    matrix[np.flatnonzero(valid), notes] = 1
+    return matrix
+
+
+def audio_fingerprint(samples):
+    """
+    Impressão de áudio no estilo do Chromaprint a partir de amostras mono de 11025 Hz
+
+    Cada janela vira 32 bits de comparações no cromagrama suavizado: entre
+    classes vizinhas (12 bits, nos bits altos), entre trítonos (6), entre a
+    janela e as anteriores (12) e da energia ao longo do tempo (2).
+    """
+    import numpy as np
+
+    if len(samples) < FRAME_SIZE:
+        return np.zeros(0, dtype=np.uint32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+    spectrum = np.abs(np.fft.rfft(frames * np.hamming(FRAME_SIZE).astype(np.float32), axis=1)) ** 2
+    chroma = spectrum @ _chroma_matrix(np)
+    energy = np.log1p(chroma.sum(axis=1))
+    chroma /= np.linalg.norm(chroma, axis=1, keepdims=True) + 1e-9
+
+    # Média móvel de 4 janelas: bits estáveis frente à recompressão do áudio
+    kernel = np.ones(4, dtype=np.float32) / 4
+    chroma = np.apply_along_axis(lambda column: np.convolve(column, kernel, mode='same'), 0, chroma)
+    previous = np.vstack([chroma[:1].repeat(4, axis=0), chroma[:-4]])[:len(chroma)]
+    energy_previous = np.concatenate([energy[:1].repeat(2), energy[:-2]])[:len(energy)]
+    energy_older = np.concatenate([energy[:1].repeat(8), energy[:-8]])[:len(energy)]
+
+    bits = np.hstack([
+        chroma > np.roll(chroma, -1, axis=1),
+        chroma[:, :6] > chroma[:, 6:],
+        chroma > previous,
+        (energy > energy_previous)[:, None],
+        (energy > energy_older)[:, None],
+    ])
+    weights = np.uint64(1) << np.arange(31, -1, -1, dtype=np.uint64)
+    return (bits.astype(np.uint64) @ weights).astype(np.uint32)
+
+
+def phash(frame):
+    """pHash de 64 bits de um quadro em tons de cinza (PHASH_SIZE x PHASH_SIZE)"""
+    import numpy as np
+
+    n = np.arange(PHASH_SIZE)
+    dct = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * PHASH_SIZE))
+    coefficients = (dct @ frame.astype(np.float64) @ dct.T)[:8, :8].ravel()
+    # O termo DC (brilho médio) fica fora da mediana
+    bits = coefficients > np.median(coefficients[1:])
+    return int((bits.astype(np.uint64) << np.arange(63, -1, -1, dtype=np.uint64)).sum())
+
+
+def compute(audio_path, video_path=None, duration=None, keyframes=5, seconds=120):
+    """
+    Impressões do arquivo baixado
+
+    Args:
+        audio_path: Arquivo com o áudio (o próprio vídeo ou o áudio baixado)
+        video_path: Vídeo para os quadros-chave (None = só áudio, ex.: modo transcript)
+        duration: Duração do vídeo (espaça os quadros-chave)
+        keyframes: Quadros com pHash
+        seconds: Trecho inicial usado na impressão de áudio
+
+    Returns:
+        {'algorithm', 'audio', 'keyframes'}, ou None se o áudio não servir
+        para comparação (curto demais, silêncio)
+    """
+    import numpy as np
+
+    if chromaprint_available():
+        algorithm, audio = ALGORITHM_CHROMAPRINT, _fpcalc(audio_path, seconds)
+    else:
+        algorithm = ALGORITHM_CHROMA
+        audio = audio_fingerprint(media.decode_audio(audio_path, SAMPLE_RATE, seconds))
+    if len(audio) < MIN_FRAMES or len(np.unique(audio)) < MIN_DISTINCT_RATIO * len(audio):
+        return None
+
+    hashes = None
+    if video_path and keyframes and duration:
+        try:
+            frames = media.extract_gray_frames(video_path, keyframes, duration, PHASH_SIZE)
+            hashes = np.asarray([phash(frame) for frame in frames], dtype=np.uint64) if frames else None
+        except subprocess.CalledProcessError:
+            hashes = None  # Arquivo sem faixa de vídeo
+    return {'algorithm': algorithm, 'audio': audio, 'keyframes': hashes}
+
+
+def _bit_error_rate(np, a, b):
+    return float(np.unpackbits(np.bitwise_xor(a, b).view(np.uint8)).sum()) / (32 * len(a))
+
+
+def audio_similarity(a, b):
+    """
+    Fração de bits iguais entre duas impressões de áudio, no melhor alinhamento
+
+    Os alinhamentos testados vêm dos buckets em comum (diferença de posição
+    mais frequente), não de uma varredura de todos os deslocamentos.
+    """
+    import numpy as np
+
+    positions = {}
+    for index, term in enumerate((b >> TERM_SHIFT).tolist()):
+        positions.setdefault(term, index)
+    offsets = Counter(
+        positions[term] - index
+        for index, term in enumerate((a >> TERM_SHIFT).tolist())
+        if term in positions
+    )
+    best = 0.0
+    for offset in [0] + [offset for offset, _ in offsets.most_common(MAX_OFFSETS)]:
+        start_a, start_b = max(0, -offset), max(0, offset)
+        length = min(len(a) - start_a, len(b) - start_b)
+        if length < max(MIN_FRAMES, min(len(a), len(b)) // 2):
+            continue
+        best = max(best, 1 - _bit_error_rate(np, a[start_a:start_a + length], b[start_b:start_b + length]))
+    return best
+
+
+def visual_similarity(a, b):
+    """Média, por quadro de `a`, da fração de bits iguais ao quadro mais parecido de `b`"""
+    import numpy as np
+
+    if a is None or b is None or not len(a) or not len(b):
+        return None
+    distances = np.unpackbits(np.bitwise_xor(a[:, None], b[None, :]).view(np.uint8).reshape(len(a), len(b), 8),
+                              axis=2).sum(axis=2)
+    return round(float(1 - distances.min(axis=1).mean() / 64), 4)
+
+
+def _terms(audio):
+    return sorted(set((audio >> TERM_SHIFT).tolist()))
+
+
+def _bands(keyframes):
+    # Quatro faixas de 16 bits: pHashes a até 3 bits de distância dividem ao menos uma
+    if keyframes is None:
+        return []
+    return sorted({
+        (band << 16) | ((int(value) >> (16 * band)) & 0xFFFF)
+        for value in keyframes.tolist() for band in range(4)
+    })
+
+
+def _candidates(db, table, column, values):
+    hits = Counter()
+    for start in range(0, len(values), _QUERY_CHUNK):
+        chunk = values[start:start + _QUERY_CHUNK]
+        rows = db.execute(
+            f"SELECT video_id, COUNT(*) FROM {table} WHERE {column} IN ({', '.join('?' * len(chunk))}) "
+            'GROUP BY video_id',
+            chunk
+        ).fetchall()
+        for video_id, count in rows:
+            hits[video_id] += count
+    return hits
+
+
+def find_match(fingerprints, duration=None, threshold=0.8, exclude=None):
+    """
+    Vídeo já indexado com o mesmo áudio
+
+    Args:
+        fingerprints: Resultado de compute()
+        duration: Duração do vídeo novo; candidatos com duração muito diferente são ignorados
+        threshold: Fração mínima de bits iguais na impressão de áudio
+        exclude: video_id a ignorar (o próprio vídeo)
+
+    Returns:
+        {'video_id', 'similarity', 'visual_similarity'} ou None; a transcrição
+        do original sai do transcript_store
+    """
+    import numpy as np
+
+    db = _db()
+    hits = _candidates(db, 'audio_terms', 'term', _terms(fingerprints['audio']))
+    # pHashes trazem reposts cujo áudio foi recomprimido a ponto de mudar os buckets
+    for video_id, count in _candidates(db, 'frame_bands', 'band', _bands(fingerprints['keyframes'])).items():
+        hits[video_id] += count
+    hits.pop(exclude, None)
+
+    best = None
+    for video_id, _ in hits.most_common(MAX_CANDIDATES):
+        row = db.execute('SELECT * FROM entries WHERE video_id = ?', (video_id,)).fetchone()
+        if row is None or row['algorithm'] != fingerprints['algorithm']:
+            continue
+        if duration and row['duration'] and abs(row['duration'] - duration) > max(3, 0.1 * duration):
+            continue
+        similarity = audio_similarity(fingerprints['audio'], np.frombuffer(row['audio'], dtype=np.uint32))
+        if similarity >= threshold and (best is None or similarity > best['similarity']):
+            keyframes = np.frombuffer(row['keyframes'], dtype=np.uint64) if row['keyframes'] else None
+            best = {
+                'video_id': video_id,
+                'similarity': round(similarity, 4),
+                'visual_similarity': visual_similarity(fingerprints['keyframes'], keyframes),
+            }
+    return best
+
+
+def add(video_id, fingerprints, duration):
+    """Guarda as impressões de um vídeo processado"""
+    keyframes = fingerprints['keyframes']
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        _delete(db, video_id)
+        db.execute(
+            'INSERT INTO entries (video_id, algorithm, duration, audio, keyframes, created_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (video_id, fingerprints['algorithm'], duration, fingerprints['audio'].tobytes(),
+             keyframes.tobytes() if keyframes is not None else None, time.time())
+        )
+        db.executemany('INSERT INTO audio_terms (term, video_id) VALUES (?, ?)',
+                       [(term, video_id) for term in _terms(fingerprints['audio'])])
+        db.executemany('INSERT INTO frame_bands (band, video_id) VALUES (?, ?)',
+                       [(band, video_id) for band in _bands(keyframes)])
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+
+
+def _delete(db, video_id):
+    db.execute('DELETE FROM entries WHERE video_id = ?', (video_id,))
+    db.execute('DELETE FROM audio_terms WHERE video_id = ?', (video_id,))
+    db.execute('DELETE FROM frame_bands WHERE video_id = ?', (video_id,))
+
+
+def added_before(timestamp, limit, after=None):
+    """Entradas gravadas antes de `timestamp`, das mais antigas para as mais novas; `after` é (created_at, video_id)"""
+    if after is None:
+        rows = _db().execute(
+            'SELECT video_id, created_at FROM entries WHERE created_at < ? ORDER BY created_at, video_id LIMIT ?',
+            (timestamp, limit)
+        ).fetchall()
+    else:
+        rows = _db().execute(
+            'SELECT video_id, created_at FROM entries WHERE created_at < ? AND (created_at, video_id) > (?, ?) '
+            'ORDER BY created_at, video_id LIMIT ?',
+            (timestamp, *after, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def remove(video_id):
+    """Tira um vídeo do índice"""
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        _delete(db, video_id)
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
@@ -0,0 +1,57 @@
+"""
+Configuração do Gunicorn
+
+Além das opções do servidor, inicia o serviço de transcrição antes dos
+workers para que o modelo Whisper seja carregado uma única vez, e prepara a
+pasta das métricas do Prometheus compartilhadas entre os workers.
+"""
+
+import os
+import shutil
+
+from config import get_config
+from transcription_service import start_service_process, service_settings
+
+bind = '0.0.0.0:5000'
+workers = 4
+# Threads por worker: conexões SSE (/batches/<id>/events) ficam abertas
+# durante todo o processamento e não podem ocupar um worker inteiro
+worker_class = 'gthread'
+threads = 8
+timeout = 300
+accesslog = '-'
+errorlog = '-'
+
+_base_dir = os.path.dirname(os.path.abspath(__file__))
+_settings = get_config(os.environ.get('FLASK_ENV', 'development'))
+_service = None
+
+# Definido antes de os workers importarem o prometheus_client (metrics.py)
+_metrics_dir = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(_base_dir, _settings.DATA_FOLDER, 'metrics')
+)
+
+
+def on_starting(server):
+    """Executado no master, antes do fork dos workers"""
+    global _service
+    # Valores de execuções anteriores não podem entrar na soma
+    shutil.rmtree(_metrics_dir, ignore_errors=True)
+    os.makedirs(_metrics_dir, exist_ok=True)
+    if not _settings.TRANSCRIPTION_SERVICE:
+        return
+    os.makedirs(os.path.join(_base_dir, _settings.DATA_FOLDER), exist_ok=True)
+    _service = start_service_process(*service_settings(_settings, _base_dir))
+    server.log.info(f"Serviço de transcrição iniciado (pid {_service.pid})")
+
+
+def child_exit(server, worker):
+    """Descarta os medidores do worker que terminou"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _service is not None and _service.is_alive():
+        _service.terminate()
+        _service.join(timeout=10)
@@ -0,0 +1,436 @@
+"""
+Fila de processamento assíncrono de vídeos
+
+O endpoint /process_videos apenas registra os jobs e devolve seus IDs; um pool
+de threads em cada worker do Gunicorn executa download e transcrição fora da
+requisição HTTP. O estado fica em SQLite para que qualquer worker consiga
+responder às consultas de status.
+
+Durante o processamento cada job grava eventos (metadados, progresso do
+download, segmentos da transcrição...) que o endpoint de SSE repassa ao
+navegador à medida que acontecem.
+
+Falhas temporárias (tipos em `retry_on`) não encerram o job: ele volta para a
+fila e é repetido após uma espera exponencial com jitter, até `max_attempts`
+tentativas.
+
+Cada job aguardando ou em execução tem um lease do worker que o pegou,
+renovado periodicamente. Se o worker morre (timeout do Gunicorn, deploy), o
+lease expira e outro worker (ou o mesmo, ao reiniciar) retoma o job. O estado
+dos downloads parciais fica na tabela `downloads`, para que a nova tentativa
+continue o arquivo .part em vez de recomeçar do zero.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import storage
+import metrics
+from throttling import backoff_delay
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    batch_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    url TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id, position);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS job_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    batch_id TEXT NOT NULL,
+    job_id TEXT NOT NULL,
+    type TEXT NOT NULL,
+    data TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_events_batch ON job_events (batch_id, id);
+CREATE TABLE IF NOT EXISTS downloads (
+    video_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    format_id TEXT,
+    downloaded_bytes INTEGER NOT NULL DEFAULT 0,
+    total_bytes INTEGER,
+    fragment_index INTEGER,
+    fragment_count INTEGER,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Colunas que bancos criados por versões anteriores não têm
+_JOB_COLUMNS = {
+    'attempts': 'INTEGER NOT NULL DEFAULT 0',
+    'lease_owner': 'TEXT',
+    'lease_expires': 'REAL',
+}
+
+# Jobs abandonados retomados por rodada
+RECOVER_BATCH = 50
+
+
+def _new_id():
+    """ID de 16 caracteres sem hífens (mesmo formato dos vídeos)"""
+    return uuid.uuid4().hex[:16]
+
+
+def _migrate(conn):
+    storage.add_columns(conn, 'jobs', _JOB_COLUMNS)
+
+
+def _db():
+    return storage.connect('jobs', _SCHEMA, _migrate)
+
+
+def _row_to_job(row):
+    job = {
+        'job_id': row['id'],
+        'batch_id': row['batch_id'],
+        'position': row['position'],
+        'url': row['url'],
+        'options': json.loads(row['options']),
+        'status': row['status'],
+        'attempts': row['attempts'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+    }
+    if row['result'] is not None:
+        job['result'] = json.loads(row['result'])
+    if row['error'] is not None:
+        job['error'] = row['error']
+    return job
+
+
+class JobQueue:
+    """Pool de threads que executa `handler(job, emit)` para cada job enfileirado"""
+
+    def __init__(self, handler, workers=4, max_attempts=1, retry_on=(), retry_base=15, retry_max=600,
+                 lease_seconds=60):
+        self.handler = handler
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self.max_attempts = max(1, max_attempts)
+        self.retry_on = retry_on
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.lease_seconds = lease_seconds
+        # Dono dos leases: este processo (cada worker do Gunicorn tem o seu)
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{_new_id()[:6]}'
+
+    def start(self):
+        """Inicia a renovação dos leases e a retomada de jobs abandonados"""
+        threading.Thread(target=self._lease_loop, name='job-leases', daemon=True).start()
+
+    def _lease_loop(self):
+        # A primeira rodada, logo ao iniciar, retoma o que ficou de execuções anteriores
+        while True:
+            try:
+                self._renew_leases()
+                self._recover()
+            except Exception as e:
+                print(f"[ERROR] Erro ao renovar os leases dos jobs: {str(e)}")
+            time.sleep(self.lease_seconds / 3)
+
+    def _renew_leases(self):
+        _db().execute(
+            'UPDATE jobs SET lease_expires = ? WHERE lease_owner = ? AND status IN (?, ?)',
+            (time.time() + self.lease_seconds, self.owner, JOB_QUEUED, JOB_RUNNING)
+        )
+
+    def _recover(self):
+        """Assume os jobs cujo lease expirou (worker morto no meio do processamento)"""
+        now = time.time()
+        db = _db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            rows = db.execute(
+                'SELECT * FROM jobs WHERE status IN (?, ?) AND (lease_expires IS NULL OR lease_expires < ?) '
+                'ORDER BY created_at LIMIT ?',
+                (JOB_QUEUED, JOB_RUNNING, now, RECOVER_BATCH)
+            ).fetchall()
+            for row in rows:
+                db.execute(
+                    'UPDATE jobs SET status = ?, lease_owner = ?, lease_expires = ?, updated_at = ? WHERE id = ?',
+                    (JOB_QUEUED, self.owner, now + self.lease_seconds, now, row['id'])
+                )
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+        for row in rows:
+            job = _row_to_job(row)
+            if job['attempts'] >= self.max_attempts:
+                self._fail(job, lambda event_type, data=None: emit_event(job, event_type, data),
+                           Exception('Processamento interrompido repetidamente'))
+                continue
+            print(f"[INFO] Retomando job {job['job_id']} interrompido ({job['url']})")
+            emit_event(job, 'requeued')
+            self.executor.submit(self._run, job)
+
+    def _start(self, job):
+        """Marca o job como em execução; None se o lease passou para outro worker"""
+        db = _db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            updated = db.execute(
+                'UPDATE jobs SET status = ?, attempts = attempts + 1, lease_expires = ?, updated_at = ? '
+                'WHERE id = ? AND lease_owner = ?',
+                (JOB_RUNNING, time.time() + self.lease_seconds, time.time(), job['job_id'], self.owner)
+            ).rowcount
+            row = db.execute('SELECT attempts FROM jobs WHERE id = ?', (job['job_id'],)).fetchone()
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return row['attempts'] if updated else None
+
+    def submit_batch(self, items):
+        """
+        Registra um lote de URLs e agenda o processamento
+
+        Args:
+            items: Lista de dicionários com 'url' e, opcionalmente, 'options'
+
+        Returns:
+            (batch_id, lista de jobs criados)
+        """
+        batch_id = _new_id()
+        now = time.time()
+        jobs = []
+
+        db = _db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            for position, item in enumerate(items):
+                job_id = _new_id()
+                db.execute(
+                    'INSERT INTO jobs (id, batch_id, position, url, options, status, lease_owner, '
+                    'lease_expires, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (job_id, batch_id, position, item['url'], json.dumps(item.get('options', {})),
+                     JOB_QUEUED, self.owner, now + self.lease_seconds, now, now)
+                )
+                jobs.append({
+                    'job_id': job_id,
+                    'batch_id': batch_id,
+                    'position': position,
+                    'url': item['url'],
+                    'options': item.get('options', {}),
+                    'status': JOB_QUEUED,
+                    'attempts': 0,
+                    'created_at': now,
+                })
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+        for job in jobs:
+            self.executor.submit(self._run, job)
+
+        print(f"[INFO] Lote {batch_id} enfileirado com {len(jobs)} job(s)")
+        return batch_id, jobs
+
+    def _run(self, job):
+        def emit(event_type, data=None):
+            emit_event(job, event_type, data)
+
+        attempt = self._start(job)
+        if attempt is None:
+            return
+        if attempt == 1:
+            metrics.QUEUE_WAIT_SECONDS.observe(time.time() - job['created_at'])
+        emit('started', {'url': job['url'], 'attempt': attempt})
+        # O evento final vem antes do status: quem vê o job concluído
+        # já encontra todos os eventos gravados
+        try:
+            result = self.handler(job, emit)
+        except self.retry_on as e:
+            if attempt >= self.max_attempts:
+                self._fail(job, emit, e)
+                return
+            delay = backoff_delay(attempt, self.retry_base, self.retry_max)
+            print(f"[WARNING] Job {job['job_id']} falhou ({str(e)}); tentativa {attempt + 1} em {delay:.0f}s")
+            emit('retrying', {'error': str(e), 'attempt': attempt + 1, 'delay': round(delay, 1)})
+            update_job(job['job_id'], status=JOB_QUEUED)
+            metrics.JOB_RETRIES.inc()
+            self._schedule(job, delay)
+        except Exception as e:
+            self._fail(job, emit, e)
+        else:
+            emit(JOB_DONE, {'result': result})
+            update_job(job['job_id'], status=JOB_DONE, result=result)
+            metrics.JOBS_FINISHED.labels(status=JOB_DONE).inc()
+
+    def _schedule(self, job, delay):
+        # A espera não ocupa uma thread do pool
+        timer = threading.Timer(delay, self.executor.submit, args=(self._run, job))
+        timer.daemon = True
+        timer.start()
+
+    def _fail(self, job, emit, e):
+        print(f"[ERROR] Job {job['job_id']} falhou: {str(e)}")
+        emit(JOB_FAILED, {'error': str(e)})
+        update_job(job['job_id'], status=JOB_FAILED, error=str(e))
+        metrics.JOBS_FINISHED.labels(status=JOB_FAILED).inc()
+
+
+def update_job(job_id, status, result=None, error=None):
+    """Atualiza o estado de um job"""
+    _db().execute(
+        'UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?',
+        (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+    )
+
+
+def get_job(job_id):
+    """Retorna um job pelo ID ou None"""
+    row = _db().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def get_batch(batch_id):
+    """Retorna os jobs de um lote na ordem em que as URLs foram enviadas"""
+    rows = _db().execute(
+        'SELECT * FROM jobs WHERE batch_id = ? ORDER BY position', (batch_id,)
+    ).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+
+def batch_status(jobs):
+    """Resume o estado de um lote a partir de seus jobs"""
+    finished = sum(1 for job in jobs if job['status'] in (JOB_DONE, JOB_FAILED))
+    if finished == len(jobs):
+        status = JOB_DONE
+    elif any(job['status'] != JOB_QUEUED for job in jobs):
+        status = JOB_RUNNING
+    else:
+        status = JOB_QUEUED
+    return {'status': status, 'total': len(jobs), 'completed': finished}
+
+
+def count_by_status():
+    """Quantidade de jobs aguardando e em execução, somando todos os workers"""
+    counts = {JOB_QUEUED: 0, JOB_RUNNING: 0}
+    rows = _db().execute(
+        'SELECT status, COUNT(*) FROM jobs WHERE status IN (?, ?) GROUP BY status', (JOB_QUEUED, JOB_RUNNING)
+    ).fetchall()
+    for status, count in rows:
+        counts[status] = count
+    return counts
+
+
+def emit_event(job, event_type, data=None):
+    """Registra um evento de progresso do job"""
+    payload = dict(data or {}, job_id=job['job_id'], position=job['position'])
+    _db().execute(
+        'INSERT INTO job_events (batch_id, job_id, type, data, created_at) VALUES (?, ?, ?, ?, ?)',
+        (job['batch_id'], job['job_id'], event_type, json.dumps(payload), time.time())
+    )
+
+
+def get_events(batch_id, after_id=0, limit=500):
+    """Eventos do lote com id maior que `after_id`, em ordem"""
+    rows = _db().execute(
+        'SELECT id, type, data FROM job_events WHERE batch_id = ? AND id > ? ORDER BY id LIMIT ?',
+        (batch_id, after_id, limit)
+    ).fetchall()
+    return [{'id': row['id'], 'type': row['type'], 'data': row['data']} for row in rows]
+
+
+def claim_download(video_id, job_id):
+    """
+    Associa o download de `video_id` ao job, mantendo o progresso já registrado
+
+    Returns:
+        Estado do download (dict da tabela `downloads`), ou None se outro job
+        ainda ativo está baixando o mesmo conteúdo
+    """
+    now = time.time()
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        row = db.execute(
+            'SELECT downloads.*, jobs.status AS job_status FROM downloads '
+            'LEFT JOIN jobs ON jobs.id = downloads.job_id WHERE video_id = ?', (video_id,)
+        ).fetchone()
+        if row is not None and row['job_id'] != job_id and row['job_status'] in (JOB_QUEUED, JOB_RUNNING):
+            db.execute('COMMIT')
+            return None
+        if row is None:
+            db.execute(
+                'INSERT INTO downloads (video_id, job_id, updated_at) VALUES (?, ?, ?)', (video_id, job_id, now)
+            )
+        else:
+            db.execute('UPDATE downloads SET job_id = ?, updated_at = ? WHERE video_id = ?', (job_id, now, video_id))
+        state = db.execute('SELECT * FROM downloads WHERE video_id = ?', (video_id,)).fetchone()
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    return dict(state)
+
+
+def get_download(video_id):
+    """Estado do download parcial de `video_id`, ou None"""
+    row = _db().execute('SELECT * FROM downloads WHERE video_id = ?', (video_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def update_download(video_id, **fields):
+    """Atualiza o progresso do download (format_id, downloaded_bytes, total_bytes, fragment_index...)"""
+    if not fields:
+        return
+    assignments = ', '.join(f'{name} = ?' for name in fields)
+    _db().execute(
+        f'UPDATE downloads SET {assignments}, updated_at = ? WHERE video_id = ?',
+        (*fields.values(), time.time(), video_id)
+    )
+
+
+def finish_download(video_id):
+    """Download completo: não há mais arquivo parcial para retomar"""
+    _db().execute('DELETE FROM downloads WHERE video_id = ?', (video_id,))
+
+
+def prune_finished(before):
+    """Remove jobs concluídos antes de `before` e seus eventos"""
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute(
+            'DELETE FROM job_events WHERE job_id IN '
+            '(SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?)',
+            (JOB_DONE, JOB_FAILED, before)
+        )
+        db.execute(
+            'DELETE FROM downloads WHERE job_id IN '
+            '(SELECT id FROM jobs WHERE status IN (?, ?) AND updated_at < ?)',
+            (JOB_DONE, JOB_FAILED, before)
+        )
+        removed = db.execute(
+            'DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?', (JOB_DONE, JOB_FAILED, before)
+        ).rowcount
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    return removed
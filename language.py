@@ -0,0 +1,128 @@
+"""
+Escolha do idioma antes da transcrição
+
+Com o idioma fixado, o modelo pula a detecção e não corre o risco de errá-la.
+Ordem de resolução:
+    1. Idioma pedido na requisição
+    2. Config.TRANSCRIPTION_LANGUAGE
+    3. Metadados do yt-dlp (campo 'language' e faixas de legenda do vídeo)
+    4. Idioma habitual do canal/autor, aprendido com vídeos anteriores
+    5. Nenhum: o motor detecta a partir do início do áudio
+
+O idioma final de cada transcrição alimenta o cache por canal do passo 4.
+"""
+
+import re
+import time
+
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS uploader_languages (
+    uploader TEXT NOT NULL,
+    language TEXT NOT NULL,
+    videos INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (uploader, language)
+);
+"""
+
+# Fração mínima dos vídeos do canal no mesmo idioma para confiar no cache
+UPLOADER_MIN_SHARE = 0.8
+
+_LANGUAGE_CODE = re.compile(r'^([a-z]{2,3})(?:[-_][a-z0-9]+)*$')
+# Sufixo da faixa automática no idioma original do vídeo (YouTube)
+_ORIGINAL_SUFFIX = '-orig'
+
+
+def _db():
+    return storage.connect('language', _SCHEMA)
+
+
+def normalize_language(code):
+    """'pt-BR' -> 'pt', 'EN' -> 'en'; None para códigos inválidos"""
+    if not code or not isinstance(code, str):
+        return None
+    match = _LANGUAGE_CODE.match(code.strip().lower())
+    return match.group(1) if match else None
+
+
+def from_metadata(info):
+    """Idioma informado pela plataforma, se houver"""
+    language = normalize_language(info.get('language'))
+    if language:
+        return language
+
+    # Legenda automática marcada como original: o idioma falado no vídeo
+    for code in info.get('automatic_captions') or {}:
+        if code.endswith(_ORIGINAL_SUFFIX):
+            return normalize_language(code[:-len(_ORIGINAL_SUFFIX)])
+
+    # Uma única legenda manual quase sempre é a do idioma falado
+    subtitles = {normalize_language(code) for code in (info.get('subtitles') or {}) if code != 'live_chat'}
+    subtitles.discard(None)
+    if len(subtitles) == 1:
+        return subtitles.pop()
+    return None
+
+
+def uploader_key(info):
+    """Chave do canal/autor do vídeo, ou None"""
+    uploader = info.get('channel_id') or info.get('uploader_id') or info.get('uploader')
+    extractor = info.get('extractor_key') or info.get('extractor')
+    if not uploader or not extractor:
+        return None
+    return f'{extractor.lower()}:{uploader}'
+
+
+def from_uploader(info, min_videos=2):
+    """Idioma predominante do canal, se já visto em `min_videos` vídeos"""
+    key = uploader_key(info)
+    if key is None:
+        return None
+    rows = _db().execute(
+        'SELECT language, videos FROM uploader_languages WHERE uploader = ? ORDER BY videos DESC', (key,)
+    ).fetchall()
+    if not rows:
+        return None
+    total = sum(row['videos'] for row in rows)
+    top = rows[0]
+    if top['videos'] >= min_videos and top['videos'] / total >= UPLOADER_MIN_SHARE:
+        return top['language']
+    return None
+
+
+def remember_language(info, language):
+    """Registra o idioma de um vídeo do canal"""
+    key = uploader_key(info)
+    language = normalize_language(language)
+    if key is None or language is None:
+        return
+    _db().execute(
+        'INSERT INTO uploader_languages (uploader, language, videos, updated_at) VALUES (?, ?, 1, ?) '
+        'ON CONFLICT (uploader, language) DO UPDATE SET videos = videos + 1, updated_at = excluded.updated_at',
+        (key, language, time.time())
+    )
+
+
+def resolve_language(requested=None, default=None, info=None, min_uploader_videos=2):
+    """
+    Escolhe o idioma da transcrição
+
+    Returns:
+        (idioma ou None, origem): origem é 'request', 'config', 'metadata',
+        'uploader' ou 'detect' (idioma fica a cargo do motor)
+    """
+    for language, source in ((requested, 'request'), (default, 'config')):
+        language = normalize_language(language)
+        if language:
+            return language, source
+
+    if info:
+        language = from_metadata(info)
+        if language:
+            return language, 'metadata'
+        language = from_uploader(info, min_uploader_videos)
+        if language:
+            return language, 'uploader'
+    return None, 'detect'
@@ -0,0 +1,162 @@
+"""
+Utilitários de mídia baseados em FFmpeg
+
+Permitem obter o áudio a partir do vídeo que já foi baixado, sem pedir ao
+yt-dlp para resolver e baixar a mesma URL uma segunda vez.
+"""
+
+import os
+import subprocess
+
+# Extensão de contêiner para copiar cada codec sem recodificar
+AUDIO_CODEC_EXTENSIONS = {
+    'aac': '.m4a',
+    'alac': '.m4a',
+    'mp3': '.mp3',
+    'opus': '.opus',
+    'vorbis': '.ogg',
+    'flac': '.flac',
+}
+
+# Formato que o Whisper usa internamente: PCM 16 bits, mono, 16 kHz
+SAMPLE_RATE = 16000
+
+
+def probe_audio_codec(path):
+    """
+    Retorna o codec da primeira faixa de áudio do arquivo
+
+    Returns:
+        Nome do codec (ex: 'aac', 'opus') ou None se o arquivo não tiver áudio
+    """
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-select_streams', 'a:0',
+         '-show_entries', 'stream=codec_name', '-of', 'default=nw=1:nk=1', path],
+        capture_output=True, text=True, check=True
+    )
+    return result.stdout.strip() or None
+
+
+def probe_duration(path):
+    """Duração do arquivo em segundos, ou None se o FFprobe não souber"""
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=nw=1:nk=1', path],
+        capture_output=True, text=True, check=True
+    )
+    try:
+        return float(result.stdout.strip())
+    except ValueError:
+        return None
+
+
+def iter_pcm(path, block_seconds=30):
+    """
+    Decodifica o áudio aos poucos, em blocos float32 mono de 16 kHz
+
+    Só um bloco fica em memória por vez, ao contrário de whisper.load_audio,
+    que decodifica o arquivo inteiro de uma vez.
+    """
+    import numpy as np
+
+    process = subprocess.Popen(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', path,
+         '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), '-'],
+        stdout=subprocess.PIPE
+    )
+    block_bytes = int(block_seconds * SAMPLE_RATE) * 2
+    finished = False
+    try:
+        while True:
+            data = process.stdout.read(block_bytes)
+            if not data:
+                finished = True
+                break
+            yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+    finally:
+        process.stdout.close()
+        if not finished:
+            process.kill()
+        process.wait()
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, 'ffmpeg')
+
+
+def extract_audio(video_path, output_base, mode='pcm', codec=None):
+    """
+    Extrai localmente a faixa de áudio de um vídeo já baixado
+
+    Args:
+        video_path: Arquivo de vídeo
+        output_base: Caminho de saída sem extensão
+        mode: 'direct' (usa o próprio vídeo), 'copy' (copia o codec original),
+              'pcm' (WAV 16 kHz mono) ou 'mp3' (recodifica em MP3)
+        codec: Codec de áudio do vídeo, se já conhecido (usado no modo 'copy')
+
+    Returns:
+        Caminho do arquivo de áudio
+    """
+    if mode == 'direct':
+        # O transcritor decodifica o contêiner sozinho: nada a fazer
+        return video_path
+
+    if mode == 'copy':
+        codec = codec or probe_audio_codec(video_path)
+        ext = AUDIO_CODEC_EXTENSIONS.get(codec)
+        if ext:
+            output = output_base + ext
+            args = ['-c:a', 'copy']
+        else:
+            # Codec sem contêiner conhecido: cair para PCM
+            mode = 'pcm'
+
+    if mode == 'pcm':
+        output = output_base + '.wav'
+        args = ['-ac', '1', '-ar', str(SAMPLE_RATE), '-c:a', 'pcm_s16le']
+    elif mode == 'mp3':
+        output = output_base + '.mp3'
+        args = ['-c:a', 'libmp3lame', '-b:a', '192k']
+    elif mode != 'copy':
+        raise ValueError(f'Modo de extração de áudio inválido: {mode}')
+
+    subprocess.run(
+        ['ffmpeg', '-nostdin', '-y', '-loglevel', 'error', '-i', video_path, '-vn', *args, output],
+        check=True
+    )
+
+    if not os.path.exists(output):
+        raise Exception(f"FFmpeg não gerou o arquivo de áudio: {output}")
+    return output
+
+
+def decode_audio(path, sample_rate=SAMPLE_RATE, max_seconds=None):
+    """Decodifica o áudio (ou só os primeiros `max_seconds`) em float32 mono"""
+    import numpy as np
+
+    limit = ['-t', str(max_seconds)] if max_seconds else []
+    result = subprocess.run(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', path, *limit, '-vn',
+         '-f', 's16le', '-ac', '1', '-ar', str(sample_rate), '-'],
+        capture_output=True, check=True
+    )
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
+
+
+def extract_gray_frames(path, count, duration, size=32):
+    """
+    Quadros do vídeo espaçados por igual, em tons de cinza e reduzidos a size x size
+
+    Returns:
+        Lista de matrizes uint8 (vazia se o arquivo não tiver vídeo)
+    """
+    import numpy as np
+
+    result = subprocess.run(
+        ['ffmpeg', '-nostdin', '-loglevel', 'error', '-i', path, '-an',
+         '-vf', f'fps={count}/{max(duration, 1):.3f},scale={size}:{size},format=gray',
+         '-frames:v', str(count), '-f', 'rawvideo', '-'],
+        capture_output=True, check=True
+    )
+    frames = np.frombuffer(result.stdout, np.uint8)
+    usable = len(frames) // (size * size)
+    return list(frames[:usable * size * size].reshape(usable, size, size))
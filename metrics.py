@@ -0,0 +1,164 @@
+"""
+Métricas do pipeline (Prometheus) e logs estruturados
+
+Cada etapa de process_single_video/transcribe_audio é cronometrada com
+stage_timer, que alimenta o histograma pipeline_stage_seconds e escreve uma
+linha de log em JSON com o video_id. A rota /metrics expõe tudo no formato
+do Prometheus.
+
+Com vários workers do Gunicorn, o gunicorn.conf.py define
+PROMETHEUS_MULTIPROC_DIR e os valores de todos os processos são somados na
+leitura.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+_MB = 1024 * 1024
+
+STAGE_SECONDS = Histogram(
+    'pipeline_stage_seconds', 'Duração de cada etapa do pipeline', ['stage'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+)
+DOWNLOAD_BYTES = Histogram(
+    'download_bytes', 'Tamanho dos vídeos baixados',
+    buckets=tuple(size * _MB for size in (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2000))
+)
+AUDIO_SECONDS = Histogram(
+    'transcribed_audio_seconds', 'Duração do áudio de cada transcrição',
+    buckets=(15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+)
+REALTIME_FACTOR = Histogram(
+    'transcription_realtime_factor', 'Tempo de transcrição dividido pela duração do áudio',
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 4)
+)
+QUEUE_WAIT_SECONDS = Histogram(
+    'job_queue_wait_seconds', 'Tempo entre o envio do job e o início do processamento',
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 1800)
+)
+CACHE_LOOKUPS = Counter(
+    'result_cache_lookups', 'Consultas ao cache de resultados (taxa de acerto = hit / total)',
+    ['kind', 'result']
+)
+JOBS_FINISHED = Counter('jobs_finished', 'Jobs concluídos por estado final', ['status'])
+JOB_RETRIES = Counter('job_retries', 'Jobs devolvidos à fila após uma falha temporária')
+SCRIPT_REQUESTS = Counter(
+    'script_requests', 'Pedidos de roteiro por provedor e origem (generated, cached, shared, failed)',
+    ['provider', 'result']
+)
+
+_MULTIPROCESS = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+_collectors = []
+
+
+def log_event(event, video_id=None, level='info', **fields):
+    """Escreve uma linha de log em JSON (uma por evento, fácil de agregar)"""
+    record = {
+        'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+        'level': level,
+        'event': event,
+    }
+    if video_id is not None:
+        record['video_id'] = video_id
+    record.update(fields)
+    print(json.dumps(record, ensure_ascii=False, default=str), file=sys.stdout, flush=True)
+
+
+@contextmanager
+def stage_timer(stage, video_id=None, **fields):
+    """
+    Cronometra uma etapa do pipeline
+
+    O dicionário devolvido recebe 'seconds' ao fim do bloco, para quem precisa
+    da duração (ex.: fator de tempo real da transcrição).
+    """
+    span = {}
+    status = 'ok'
+    start = time.perf_counter()
+    try:
+        yield span
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        span['seconds'] = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=stage).observe(span['seconds'])
+        log_event('stage', video_id=video_id, stage=stage, status=status,
+                  seconds=round(span['seconds'], 3), **fields)
+
+
+def observe_transcription(audio_seconds, transcription_seconds):
+    """Registra a duração do áudio e o fator de tempo real da transcrição"""
+    if not audio_seconds or audio_seconds <= 0:
+        return
+    AUDIO_SECONDS.observe(audio_seconds)
+    REALTIME_FACTOR.observe(transcription_seconds / audio_seconds)
+
+
+class _QueueDepthCollector:
+    """Profundidade da fila lida do banco de jobs no momento da coleta"""
+
+    def __init__(self, count_by_status):
+        self.count_by_status = count_by_status
+
+    def collect(self):
+        gauge = GaugeMetricFamily('job_queue_depth', 'Jobs por estado (fila compartilhada)', labels=['status'])
+        for status, count in self.count_by_status().items():
+            gauge.add_metric([status], count)
+        yield gauge
+
+
+def register_queue_depth(count_by_status):
+    """Expõe a profundidade da fila; `count_by_status()` -> {estado: quantidade}"""
+    collector = _QueueDepthCollector(count_by_status)
+    _collectors.append(collector)
+    if not _MULTIPROCESS:
+        REGISTRY.register(collector)
+
+
+class _PlatformLimitsCollector:
+    """Taxa e vagas atuais de cada plataforma (limites adaptativos)"""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def collect(self):
+        rate = GaugeMetricFamily('platform_downloads_per_minute', 'Taxa de novos downloads liberada', labels=['platform'])
+        slots = GaugeMetricFamily('platform_download_slots', 'Downloads simultâneos liberados', labels=['platform'])
+        throttled = CounterMetricFamily('platform_throttled', 'Bloqueios recebidos da plataforma', labels=['platform'])
+        for platform, limits in self.snapshot().items():
+            rate.add_metric([platform], limits['per_minute'])
+            slots.add_metric([platform], limits['concurrency'])
+            throttled.add_metric([platform], limits['throttled'])
+        yield rate
+        yield slots
+        yield throttled
+
+
+def register_platform_limits(snapshot):
+    """Expõe os limites por plataforma; `snapshot()` -> {plataforma: limites}"""
+    collector = _PlatformLimitsCollector(snapshot)
+    _collectors.append(collector)
+    if not _MULTIPROCESS:
+        REGISTRY.register(collector)
+
+
+def render():
+    """Conteúdo e content-type da resposta de /metrics"""
+    if not _MULTIPROCESS:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    # Soma os arquivos de todos os workers; a fila vem direto do banco
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    for collector in _collectors:
+        registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,59 @@
+"""
+Identificação da plataforma de origem de um link
+"""
+
+from urllib.parse import urlparse
+
+# Domínios conhecidos de cada plataforma suportada
+PLATFORM_DOMAINS = {
+    'youtube': ('youtube.com', 'youtu.be'),
+    'tiktok': ('tiktok.com',),
+    'instagram': ('instagram.com',),
+    'pinterest': ('pinterest.com', 'pin.it'),
+}
+
+
+def detect_platform(url):
+    """
+    Retorna o nome da plataforma do link ('youtube', 'tiktok', ...)
+
+    Para sites não listados em PLATFORM_DOMAINS retorna o próprio hostname,
+    de modo que cada site desconhecido tenha seus próprios limites.
+    """
+    host = (urlparse(url).hostname or '').lower()
+    for platform, domains in PLATFORM_DOMAINS.items():
+        if any(host == domain or host.endswith('.' + domain) for domain in domains):
+            return platform
+    return host or 'desconhecido'
+
+
+_BROWSER_USER_AGENT = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+    '(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+)
+
+# Opções do yt-dlp específicas de cada perfil; o resto usa 'generic'
+PLATFORM_PROFILES = {
+    'generic': {},
+    'tiktok': {
+        'http_headers': {
+            'User-Agent': _BROWSER_USER_AGENT,
+            'Referer': 'https://www.tiktok.com/',
+        },
+        'extractor_args': {
+            'tiktok': {
+                'api_hostname': 'api22-normal-c-useast2a.tiktokv.com'
+            }
+        }
+    },
+    'instagram': {
+        'http_headers': {
+            'User-Agent': _BROWSER_USER_AGENT,
+        }
+    },
+}
+
+
+def platform_profile(platform):
+    """Perfil de opções do yt-dlp usado para a plataforma"""
+    return platform if platform in PLATFORM_PROFILES else 'generic'
@@ -0,0 +1,243 @@
+"""
+Cache persistente de resultados de processamento
+
+Associa o link normalizado e o ID do vídeo na plataforma (extractor + id do
+yt-dlp) ao arquivo baixado, aos metadados e à transcrição. Um link repetido é
+respondido direto do SQLite, sem rede e sem Whisper.
+
+Entradas expiram após Config.AUTO_CLEANUP_HOURS e, quando o total de bytes
+passa de Config.RESULT_CACHE_MAX_BYTES, as menos acessadas são removidas
+(junto com o arquivo de vídeo).
+
+Cada modo de processamento (full, transcript, metadata) tem suas próprias
+entradas; um pedido é atendido pelo resultado do seu modo ou de um modo mais
+completo (um 'full' serve a todos).
+"""
+
+import json
+import os
+import re
+import time
+from urllib.parse import urlparse, parse_qsl, urlencode
+
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    file_path TEXT,
+    size INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS aliases (
+    alias TEXT PRIMARY KEY,
+    entry_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS aliases_entry ON aliases (entry_id);
+"""
+
+# Parâmetros de rastreamento que não mudam o vídeo apontado pelo link
+TRACKING_PARAMS = {
+    'si', 'feature', 'pp', 'igshid', 'igsh', 'fbclid', 'gclid', 'is_from_webapp',
+    'sender_device', 'sender_web_id', 'web_id', 'share_app_id', 'share_link_id',
+    '_r', '_t', 'embed_source', 'ab_channel',
+}
+
+# Modo pedido -> modos cujos resultados também o atendem
+MODE_COVERAGE = {
+    'full': ('full',),
+    'transcript': ('transcript', 'full'),
+    'metadata': ('metadata', 'transcript', 'full'),
+}
+
+_YOUTUBE_PATH_ID = re.compile(r'^/(?:shorts|embed|live|v)/([\w-]{11})')
+_INSTAGRAM_POST = re.compile(r'^/(?:[\w.]+/)?(?:p|reel|reels|tv)/([\w-]+)')
+
+
+def normalize_url(url):
+    """
+    Reduz variações de um mesmo link a uma forma canônica
+
+    Ex: youtu.be/ID, m.youtube.com/shorts/ID e youtube.com/watch?v=ID&si=x
+    viram todos https://youtube.com/watch?v=ID
+    """
+    parsed = urlparse(url.strip())
+    host = (parsed.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.', 'vm.'):
+        if host.startswith(prefix) and host.count('.') > 1:
+            host = host[len(prefix):]
+            break
+    path = parsed.path.rstrip('/') or '/'
+    params = [(k, v) for k, v in parse_qsl(parsed.query) if k not in TRACKING_PARAMS and not k.startswith('utm_')]
+
+    if host == 'youtu.be':
+        return f'https://youtube.com/watch?v={path.lstrip("/")}'
+    if host.endswith('youtube.com'):
+        match = _YOUTUBE_PATH_ID.match(path)
+        video = match.group(1) if match else dict(params).get('v')
+        if video:
+            return f'https://youtube.com/watch?v={video}'
+    if host.endswith('instagram.com'):
+        match = _INSTAGRAM_POST.match(path)
+        if match:
+            return f'https://instagram.com/p/{match.group(1)}'
+    if host.endswith('tiktok.com'):
+        # Links do TikTok só carregam rastreamento na query string
+        params = []
+
+    query = urlencode(sorted(params))
+    return f'https://{host}{path}' + (f'?{query}' if query else '')
+
+
+def _scoped(mode, key):
+    """Chave dentro do modo; 'full' mantém as chaves sem prefixo"""
+    return key if mode == 'full' else f'{mode}/{key}'
+
+
+def video_key(info):
+    """Chave estável do vídeo na plataforma, a partir do info do yt-dlp"""
+    extractor = info.get('extractor_key') or info.get('extractor')
+    if not extractor or not info.get('id'):
+        return None
+    return f'{extractor.lower()}:{info["id"]}'
+
+
+class ResultCache:
+    """Cache de resultados compartilhado por todos os workers"""
+
+    def __init__(self, ttl_hours=0, max_bytes=0, file_remover=None):
+        self.ttl = ttl_hours * 3600 if ttl_hours else None
+        self.max_bytes = max_bytes
+        # Quem apaga o arquivo de vídeo; retorna False se ele estiver em uso
+        self.file_remover = file_remover or self._remove_file
+
+    @staticmethod
+    def _remove_file(path):
+        if os.path.exists(path):
+            os.remove(path)
+        return True
+
+    def _db(self):
+        return storage.connect('result_cache', _SCHEMA)
+
+    def _lookup(self, alias, url):
+        db = self._db()
+        row = db.execute(
+            'SELECT e.* FROM aliases a JOIN entries e ON e.id = a.entry_id WHERE a.alias = ?', (alias,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        expired = self.ttl is not None and row['created_at'] < time.time() - self.ttl
+        if expired or (row['file_path'] and not os.path.exists(row['file_path'])):
+            self._delete(row['id'])
+            return None
+
+        db.execute('UPDATE entries SET last_access = ? WHERE id = ?', (time.time(), row['id']))
+        result = json.loads(row['result'])
+        result.update({'url': url, 'cached': True})
+        return result
+
+    def lookup_url(self, url, mode='full'):
+        """Resultado salvo para o link (normalizado), ou None"""
+        for cached_mode in MODE_COVERAGE[mode]:
+            result = self._lookup(_scoped(cached_mode, 'url:' + normalize_url(url)), url)
+            if result is not None:
+                return result
+        return None
+
+    def lookup_video(self, info, url, mode='full'):
+        """Resultado salvo para o mesmo vídeo enviado por outro link, ou None"""
+        key = video_key(info)
+        if key is None:
+            return None
+
+        for cached_mode in MODE_COVERAGE[mode]:
+            result = self._lookup(_scoped(cached_mode, 'id:' + key), url)
+            if result is not None:
+                # Próximas submissões deste link nem precisam consultar a plataforma
+                self._db().execute(
+                    'INSERT OR REPLACE INTO aliases (alias, entry_id) VALUES (?, ?)',
+                    (_scoped(cached_mode, 'url:' + normalize_url(url)), _scoped(cached_mode, key))
+                )
+                return result
+        return None
+
+    def store(self, url, info, result, file_path=None, mode='full'):
+        """Salva o resultado de um vídeo processado com sucesso"""
+        key = _scoped(mode, video_key(info) or 'url:' + normalize_url(url))
+        size = os.path.getsize(file_path) if file_path and os.path.exists(file_path) else 0
+        now = time.time()
+
+        stored = {k: v for k, v in result.items() if k not in ('url', 'cached')}
+        aliases = {
+            _scoped(mode, 'url:' + normalize_url(url)),
+            _scoped(mode, 'url:' + normalize_url(info.get('webpage_url') or url)),
+        }
+        if video_key(info):
+            aliases.add(_scoped(mode, 'id:' + video_key(info)))
+
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'INSERT OR REPLACE INTO entries (id, result, file_path, size, created_at, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, json.dumps(stored), file_path, size, now, now)
+            )
+            db.executemany(
+                'INSERT OR REPLACE INTO aliases (alias, entry_id) VALUES (?, ?)',
+                [(alias, key) for alias in aliases]
+            )
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+        self.evict()
+
+    def iter_results(self):
+        """Todos os resultados salvos (ex.: para reconstruir o índice de busca)"""
+        for row in self._db().execute('SELECT result FROM entries'):
+            yield json.loads(row['result'])
+
+    def _delete(self, entry_id, remove_file=False):
+        db = self._db()
+        row = db.execute('SELECT file_path FROM entries WHERE id = ?', (entry_id,)).fetchone()
+        if remove_file and row and row['file_path'] and not self.file_remover(row['file_path']):
+            # Arquivo em uso (download ativo): a entrada fica para a próxima rodada
+            return False
+        db.execute('DELETE FROM entries WHERE id = ?', (entry_id,))
+        db.execute('DELETE FROM aliases WHERE entry_id = ?', (entry_id,))
+        return True
+
+    def evict(self):
+        """Remove entradas expiradas e, acima do limite de bytes, as menos acessadas"""
+        db = self._db()
+        removed = 0
+
+        if self.ttl is not None:
+            expired = db.execute(
+                'SELECT id FROM entries WHERE created_at < ?', (time.time() - self.ttl,)
+            ).fetchall()
+            for row in expired:
+                if self._delete(row['id'], remove_file=True):
+                    removed += 1
+
+        if self.max_bytes:
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            if total > self.max_bytes:
+                candidates = db.execute('SELECT id, size FROM entries ORDER BY last_access').fetchall()
+                for row in candidates:
+                    if total <= self.max_bytes:
+                        break
+                    if self._delete(row['id'], remove_file=True):
+                        total -= row['size']
+                        removed += 1
+
+        if removed:
+            print(f"[INFO] Cache: {removed} entrada(s) removida(s)")
+        return removed
@@ -0,0 +1,290 @@
+"""
+Retenção da pasta de downloads
+
+Um serviço em segundo plano remove arquivos por idade (Config.AUTO_CLEANUP_HOURS)
+e, quando o total passa de Config.MAX_STORAGE_BYTES, os acessados há mais tempo
+(LRU pelo índice de arquivos). Cada rodada remove no máximo
+Config.RETENTION_SWEEP_BATCH arquivos por critério, então o disco é mantido sob
+controle sem uma varredura única e pesada. Os candidatos são lidos em páginas
+(keyset), e arquivos fixados não impedem a remoção dos seguintes.
+
+Vídeos removidos saem de todos os bancos por vídeo: índice de arquivos,
+transcrição guardada (transcript_store), índice de busca, corpus da análise e
+índice de reposts. Transcrições e impressões de vídeos sem arquivo (modos
+transcript e metadata) vencem pela mesma idade.
+
+Arquivos de jobs em andamento e downloads ativos ficam "fixados" (pins em
+SQLite, válidos entre processos) e nunca são removidos. Só um worker do
+Gunicorn por vez executa as varreduras, escolhido por um flock.
+"""
+
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import storage
+import analysis
+import file_index
+import fingerprint
+import jobs
+import transcript_index
+import transcript_store
+
+try:
+    import fcntl
+except ImportError:  # Windows: todos os workers varrem
+    fcntl = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pins (
+    token TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pins_video ON pins (video_id);
+"""
+
+
+def _db():
+    return storage.connect('retention', _SCHEMA)
+
+
+def pin(video_id, ttl):
+    """Protege os arquivos do video_id por até `ttl` segundos; retorna o token"""
+    token = uuid.uuid4().hex
+    _db().execute(
+        'INSERT INTO pins (token, video_id, expires_at) VALUES (?, ?, ?)',
+        (token, video_id, time.time() + ttl)
+    )
+    return token
+
+
+def unpin(token):
+    _db().execute('DELETE FROM pins WHERE token = ?', (token,))
+
+
+@contextmanager
+def pinned(video_id, ttl=6 * 3600):
+    """Mantém os arquivos do video_id protegidos durante o bloco"""
+    token = pin(video_id, ttl)
+    try:
+        yield
+    finally:
+        unpin(token)
+
+
+def is_pinned(video_id):
+    row = _db().execute(
+        'SELECT 1 FROM pins WHERE video_id = ? AND expires_at > ? LIMIT 1', (video_id, time.time())
+    ).fetchone()
+    return row is not None
+
+
+def _forget(video_id):
+    """Apaga tudo o que foi guardado por vídeo (arquivo indexado, transcrição, busca, corpus e reposts)"""
+    # Os termos a descontar do corpus saem do texto guardado, antes de apagá-lo
+    transcription = transcript_store.load(video_id)
+    analysis.remove_from_corpus(video_id, analysis.tokenize(transcription['text']) if transcription else [])
+    transcript_index.remove_transcript(video_id)
+    transcript_store.remove(video_id)
+    fingerprint.remove(video_id)
+    file_index.remove_entry(video_id)
+
+
+def _owner_id(filename):
+    """video_id dono de um arquivo (vídeo, áudio temporário ou .part)"""
+    return filename.split('.')[0].split('_audio')[0]
+
+
+class RetentionManager:
+    """Varreduras incrementais por idade, cota e arquivos órfãos"""
+
+    def __init__(self, upload_folder, lock_dir, max_age_hours=0, max_bytes=0,
+                 interval=60, batch_size=200, orphan_grace_hours=6):
+        self.upload_folder = upload_folder
+        self.lock_path = os.path.join(lock_dir, 'retention.lock')
+        self.max_age = max_age_hours * 3600 if max_age_hours else None
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.batch_size = batch_size
+        self.orphan_grace = orphan_grace_hours * 3600
+        self._orphan_scan = None
+        self._leader_handle = None
+        self._lock = threading.Lock()
+        os.makedirs(lock_dir, exist_ok=True)
+
+    def start(self):
+        """Inicia a thread de varredura deste processo"""
+        threading.Thread(target=self._loop, name='retention', daemon=True).start()
+
+    def _is_leader(self):
+        if fcntl is None:
+            return True
+        if self._leader_handle is None:
+            handle = open(self.lock_path, 'a+')
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                handle.close()
+                return False
+            # O lock fica com este processo até ele terminar
+            self._leader_handle = handle
+        return True
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            if not self._is_leader():
+                continue
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"[ERROR] Erro na retenção: {str(e)}")
+
+    def remove_file(self, path):
+        """Remove um arquivo de vídeo e sua entrada no índice, se não estiver fixado"""
+        video_id = _owner_id(os.path.basename(path))
+        if is_pinned(video_id):
+            return False
+        if os.path.exists(path):
+            os.remove(path)
+        _forget(video_id)
+        return True
+
+    def sweep(self, remove_all=False):
+        """
+        Executa uma rodada de retenção
+
+        Args:
+            remove_all: Remove todos os arquivos não fixados (rota /cleanup)
+
+        Returns:
+            Número de arquivos removidos
+        """
+        with self._lock:
+            _db().execute('DELETE FROM pins WHERE expires_at <= ?', (time.time(),))
+
+            if remove_all:
+                removed = self._sweep_all()
+            else:
+                removed = self._sweep_age() + self._sweep_quota() + self._sweep_orphans()
+                forgotten = self._sweep_stored()
+                if forgotten:
+                    print(f"[INFO] Retenção: {forgotten} vídeo(s) sem arquivo removido(s) dos bancos")
+
+            if self.max_age is not None:
+                jobs.prune_finished(time.time() - self.max_age)
+
+        if removed:
+            print(f"[INFO] Retenção: {removed} arquivo(s) removido(s)")
+        return removed
+
+    def _sweep_age(self):
+        if self.max_age is None:
+            return 0
+        cutoff = time.time() - self.max_age
+        removed = 0
+        after = None
+        # Páginas por (mtime, video_id): arquivos fixados ficam para trás em vez
+        # de ocupar a mesma primeira página a cada rodada
+        while removed < self.batch_size:
+            entries = file_index.modified_before(cutoff, self.batch_size, after=after)
+            for entry in entries:
+                if self.remove_file(entry['path']):
+                    removed += 1
+                    if removed >= self.batch_size:
+                        break
+            if len(entries) < self.batch_size:
+                break
+            after = (entries[-1]['mtime'], entries[-1]['video_id'])
+        return removed
+
+    def _sweep_quota(self):
+        if not self.max_bytes:
+            return 0
+        total = file_index.total_size()
+        removed = 0
+        after = None
+        while total > self.max_bytes and removed < self.batch_size:
+            entries = file_index.least_recently_used(self.batch_size, after=after)
+            for entry in entries:
+                if total <= self.max_bytes or removed >= self.batch_size:
+                    break
+                if self.remove_file(entry['path']):
+                    total -= entry['size']
+                    removed += 1
+            if len(entries) < self.batch_size:
+                break
+            after = (entries[-1]['last_access'], entries[-1]['video_id'])
+        return removed
+
+    def _sweep_stored(self):
+        """Transcrições e impressões vencidas de vídeos sem arquivo na pasta"""
+        if self.max_age is None:
+            return 0
+        cutoff = time.time() - self.max_age
+        forgotten = 0
+        for older_than in (transcript_store.stored_before, fingerprint.added_before):
+            after = None
+            while forgotten < self.batch_size:
+                entries = older_than(cutoff, self.batch_size, after=after)
+                for entry in entries:
+                    video_id = entry['video_id']
+                    # Vídeos com arquivo saem junto com ele, em _sweep_age/_sweep_quota
+                    if file_index.contains(video_id) or is_pinned(video_id):
+                        continue
+                    _forget(video_id)
+                    forgotten += 1
+                    if forgotten >= self.batch_size:
+                        break
+                if len(entries) < self.batch_size:
+                    break
+                after = (entries[-1]['created_at'], entries[-1]['video_id'])
+        return forgotten
+
+    def _iter_orphans(self):
+        with os.scandir(self.upload_folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    yield entry
+
+    def _sweep_orphans(self):
+        """Temporários esquecidos (áudio, .part) e arquivos fora do índice"""
+        # A varredura da pasta continua de onde parou na rodada anterior
+        if self._orphan_scan is None:
+            self._orphan_scan = self._iter_orphans()
+
+        removed = 0
+        cutoff = time.time() - self.orphan_grace
+        for _ in range(self.batch_size):
+            entry = next(self._orphan_scan, None)
+            if entry is None:
+                self._orphan_scan = None
+                break
+            video_id = _owner_id(entry.name)
+            if file_index.contains(video_id) and not entry.name.endswith('.part') and '_audio' not in entry.name:
+                continue
+            try:
+                if entry.stat().st_mtime >= cutoff or is_pinned(video_id):
+                    continue
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                continue
+        return removed
+
+    def _sweep_all(self):
+        removed = 0
+        for entry in self._iter_orphans():
+            video_id = _owner_id(entry.name)
+            if is_pinned(video_id):
+                continue
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            _forget(video_id)
+            removed += 1
+        return removed
@@ -0,0 +1,514 @@
+"""
+Geração de roteiros com IA a partir de transcrições
+
+Um pedido (transcrições + provedor + modelo + parâmetros) vira uma chave
+SHA-256 do conteúdo normalizado. A partir dela:
+    - roteiros já gerados saem direto do SQLite, sem chamar o provedor
+    - pedidos iguais que chegam durante a geração acompanham a mesma geração
+      (no mesmo worker, pela memória; em outro worker, pelo texto parcial que
+      o dono grava no banco), em vez de pagar o provedor de novo
+    - a geração roda em segundo plano, com vagas por provedor compartilhadas
+      pelo container (SlotSemaphore), e o texto pode ser lido à medida que sai
+
+Antes do envio, as transcrições são reduzidas a um orçamento de tokens: cada
+vídeo recebe uma parte justa e os que passam dela viram um resumo extrativo
+(as frases com mais palavras-chave, analysis.condense).
+
+Provedores: 'openai', 'claude' e 'mock' (local, sem rede; para testes e
+desenvolvimento). Os clientes das SDKs são criados uma vez por processo.
+"""
+
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import analysis
+import metrics
+import storage
+from concurrency import SlotSemaphore
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scripts (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    text TEXT NOT NULL DEFAULT '',
+    input_chars INTEGER NOT NULL DEFAULT 0,
+    trimmed INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS scripts_finished ON scripts (finished_at);
+"""
+
+SCRIPT_RUNNING = 'running'
+SCRIPT_DONE = 'done'
+
+# Muda quando o prompt muda: roteiros antigos deixam de ser reaproveitados
+PROMPT_VERSION = 1
+SYSTEM_PROMPT = 'Você é um criador de roteiros para vídeos curtos.'
+PROMPT_TEMPLATE = """Analise as seguintes transcrições de vídeos e crie um novo roteiro criativo
+que combine os melhores elementos de cada um:
+
+{videos}
+
+Crie um roteiro estruturado com:
+- Gancho inicial (10s)
+- Desenvolvimento (corpo principal)
+- Conclusão/CTA
+
+Mantenha o estilo e tom similares aos vídeos originais."""
+
+# Estimativa sem tokenizador: ~4 caracteres por token em pt/en/es
+CHARS_PER_TOKEN = 4
+# Palavras-chave usadas para escolher as frases de um vídeo resumido
+CONDENSE_KEYWORDS = 50
+# Intervalo entre gravações do texto parcial (lido pelos outros workers)
+FLUSH_SECONDS = 0.5
+FOLLOW_POLL_SECONDS = 0.25
+
+
+class ScriptGenerationError(Exception):
+    """O provedor falhou ou não está disponível"""
+
+
+class ScriptProvider:
+    """Interface comum dos provedores; o cliente da SDK é criado uma vez por processo"""
+
+    name = None
+    default_model = None
+
+    def __init__(self, api_key=None, max_concurrent=4):
+        self.api_key = api_key
+        self.max_concurrent = max_concurrent
+        self._client = None
+        self._client_pid = None
+        self._lock = threading.Lock()
+
+    def _create_client(self):
+        raise NotImplementedError
+
+    @property
+    def client(self):
+        # Conexões HTTP da SDK não sobrevivem a um fork do Gunicorn
+        with self._lock:
+            if self._client is None or self._client_pid != os.getpid():
+                self._client = self._create_client()
+                self._client_pid = os.getpid()
+            return self._client
+
+    def stream(self, system, prompt, model, max_tokens, temperature):
+        """Gera o roteiro, devolvendo os pedaços de texto à medida que chegam"""
+        raise NotImplementedError
+
+
+class OpenAIProvider(ScriptProvider):
+    name = 'openai'
+    default_model = 'gpt-4'
+
+    def _create_client(self):
+        import openai
+        return openai.OpenAI(api_key=self.api_key or os.environ.get('OPENAI_API_KEY'))
+
+    def stream(self, system, prompt, model, max_tokens, temperature):
+        response = self.client.chat.completions.create(
+            model=model,
+            messages=[
+                {'role': 'system', 'content': system},
+                {'role': 'user', 'content': prompt},
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class ClaudeProvider(ScriptProvider):
+    name = 'claude'
+    default_model = 'claude-3-5-sonnet-20241022'
+
+    def _create_client(self):
+        import anthropic
+        return anthropic.Anthropic(api_key=self.api_key or os.environ.get('ANTHROPIC_API_KEY'))
+
+    def stream(self, system, prompt, model, max_tokens, temperature):
+        with self.client.messages.stream(
+            model=model,
+            system=system,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            messages=[{'role': 'user', 'content': prompt}]
+        ) as response:
+            yield from response.text_stream
+
+
+class MockProvider(ScriptProvider):
+    """Provedor local: monta um roteiro com a 1ª frase de cada vídeo, sem rede"""
+
+    name = 'mock'
+    default_model = 'mock'
+
+    _VIDEO = re.compile(r'^Vídeo \d+ \([^)]*\):\n(.+?)(?:[.!?](?:\s|$)|\n|$)', re.MULTILINE)
+
+    def __init__(self, api_key=None, max_concurrent=4, delay=0.0):
+        super().__init__(api_key, max_concurrent)
+        # Espera entre pedaços, para simular a latência de um provedor real
+        self.delay = delay
+
+    def _create_client(self):
+        return None
+
+    def stream(self, system, prompt, model, max_tokens, temperature):
+        openings = [match.group(1).strip() for match in self._VIDEO.finditer(prompt)] or ['...']
+        script = '\n'.join([
+            f'Gancho: {openings[0]}',
+            'Desenvolvimento:',
+            *(f'- {opening}' for opening in openings),
+            'Conclusão/CTA: siga para ver mais vídeos como este.',
+        ])
+        for word in re.findall(r'\S+\s*', script)[:max_tokens]:
+            if self.delay:
+                time.sleep(self.delay)
+            yield word
+
+
+PROVIDERS = {provider.name: provider for provider in (OpenAIProvider, ClaudeProvider, MockProvider)}
+
+
+def create_providers(settings):
+    """Provedores habilitados na configuração, por nome"""
+    providers = {
+        name: PROVIDERS[name](max_concurrent=settings.SCRIPT_MAX_CONCURRENT)
+        for name in ('openai', 'claude')
+    }
+    if settings.SCRIPT_MOCK_PROVIDER:
+        providers['mock'] = MockProvider(max_concurrent=settings.SCRIPT_MAX_CONCURRENT,
+                                         delay=settings.SCRIPT_MOCK_DELAY_MS / 1000)
+    return providers
+
+
+def _normalize(transcriptions):
+    return [
+        (t.get('language') or 'unknown', ' '.join((t.get('text') or '').split()))
+        for t in transcriptions
+    ]
+
+
+def request_key(videos, provider, model, max_tokens, temperature, input_tokens):
+    """Chave do pedido: mesmo conteúdo e parâmetros = mesmo roteiro"""
+    payload = json.dumps({
+        'version': PROMPT_VERSION,
+        'provider': provider,
+        'model': model,
+        'max_tokens': max_tokens,
+        'temperature': temperature,
+        'input_tokens': input_tokens,
+        'videos': videos,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def fit_to_budget(texts, max_chars):
+    """
+    Reduz os textos para caberem juntos em `max_chars`
+
+    Cada texto recebe uma parte igual do orçamento; o que um texto curto não
+    usa é dividido entre os demais. Os que passam da sua parte são resumidos.
+
+    Returns:
+        (textos, quantos foram resumidos)
+    """
+    shares = [0] * len(texts)
+    remaining = max_chars
+    order = sorted(range(len(texts)), key=lambda index: len(texts[index]))
+    for position, index in enumerate(order):
+        shares[index] = min(len(texts[index]), remaining // (len(texts) - position))
+        remaining -= shares[index]
+
+    over = [index for index, text in enumerate(texts) if len(text) > shares[index]]
+    if not over:
+        return list(texts), 0
+    keywords = analysis.extract_keywords(
+        [analysis.tokenize(texts[index]) for index in over], max_keywords=CONDENSE_KEYWORDS
+    )
+    fitted = list(texts)
+    for index, doc_keywords in zip(over, keywords):
+        fitted[index] = analysis.condense(texts[index], dict(doc_keywords), shares[index])
+    return fitted, len(over)
+
+
+def build_prompt(videos, input_tokens):
+    """Prompt com as transcrições dentro do orçamento; retorna (prompt, vídeos resumidos)"""
+    headers = [f'Vídeo {index + 1} ({language}):\n' for index, (language, _) in enumerate(videos)]
+    overhead = len(PROMPT_TEMPLATE) + sum(len(header) + 9 for header in headers)
+    texts, trimmed = fit_to_budget(
+        [text for _, text in videos], max(0, input_tokens * CHARS_PER_TOKEN - overhead)
+    )
+    combined = '\n\n---\n\n'.join(header + text for header, text in zip(headers, texts))
+    return PROMPT_TEMPLATE.format(videos=combined), trimmed
+
+
+class Generation:
+    """Um roteiro em geração (ou já pronto), que vários pedidos podem acompanhar"""
+
+    def __init__(self, key, provider, model, cached=False):
+        self.key = key
+        self.provider = provider
+        self.model = model
+        self.cached = cached
+        self.trimmed = 0
+        self._chunks = []
+        self._done = False
+        self._error = None
+        self._condition = threading.Condition()
+
+    @classmethod
+    def finished(cls, key, provider, model, text, cached=True):
+        generation = cls(key, provider, model, cached)
+        generation._chunks.append(text)
+        generation._done = True
+        return generation
+
+    def append(self, chunk):
+        with self._condition:
+            self._chunks.append(chunk)
+            self._condition.notify_all()
+
+    def finish(self, error=None):
+        with self._condition:
+            self._done = True
+            self._error = error
+            self._condition.notify_all()
+
+    @property
+    def done(self):
+        return self._done
+
+    @property
+    def text(self):
+        return ''.join(self._chunks)
+
+    def follow(self, timeout=None):
+        """
+        Pedaços do roteiro desde o início, à medida que saem
+
+        Levanta ScriptGenerationError se a geração falhar e TimeoutError se
+        passar `timeout` segundos sem terminar.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        sent = 0
+        while True:
+            with self._condition:
+                while sent == len(self._chunks) and not self._done:
+                    remaining = None if deadline is None else deadline - time.time()
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(self.key)
+                    self._condition.wait(remaining)
+                chunks = self._chunks[sent:]
+                done, error = self._done, self._error
+            sent += len(chunks)
+            yield from chunks
+            if done and sent == len(self._chunks):
+                if error is not None:
+                    raise ScriptGenerationError(error)
+                return
+
+    def result(self, timeout=None):
+        """Espera o roteiro completo"""
+        return ''.join(self.follow(timeout))
+
+
+class RemoteGeneration(Generation):
+    """Geração conduzida por outro worker, acompanhada pelo texto parcial no banco"""
+
+    def follow(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        sent = 0
+        while True:
+            row = _db().execute('SELECT * FROM scripts WHERE key = ?', (self.key,)).fetchone()
+            if row is None or (row['status'] == SCRIPT_RUNNING and row['lease_expires'] < time.time()):
+                raise ScriptGenerationError('A geração foi interrompida em outro worker; tente de novo')
+            if len(row['text']) > sent:
+                yield row['text'][sent:]
+                sent = len(row['text'])
+            if row['status'] == SCRIPT_DONE:
+                self._chunks = [row['text']]
+                return
+            if deadline is not None and time.time() >= deadline:
+                raise TimeoutError(self.key)
+            time.sleep(FOLLOW_POLL_SECONDS)
+
+
+def _db():
+    return storage.connect('scripts', _SCHEMA)
+
+
+def get_script(key):
+    """Estado salvo de um roteiro (pronto ou parcial), ou None"""
+    row = _db().execute('SELECT * FROM scripts WHERE key = ?', (key,)).fetchone()
+    if row is None:
+        return None
+    status = row['status']
+    if status == SCRIPT_RUNNING and row['lease_expires'] < time.time():
+        status = 'interrupted'
+    return {
+        'script_id': row['key'],
+        'status': status,
+        'provider': row['provider'],
+        'model': row['model'],
+        'script': row['text'],
+        'trimmed': row['trimmed'],
+    }
+
+
+class ScriptGenerator:
+    """Atende pedidos de roteiro com cache, deduplicação e execução em segundo plano"""
+
+    def __init__(self, providers, lock_dir=None, workers=4, input_tokens=6000, max_tokens=1500,
+                 ttl_hours=168, lease_seconds=30):
+        self.providers = providers
+        self.lock_dir = lock_dir or os.path.join(storage.get_data_folder(), 'locks')
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='script')
+        self.input_tokens = input_tokens
+        self.max_tokens = max_tokens
+        self.ttl = ttl_hours * 3600 if ttl_hours else None
+        self.lease_seconds = lease_seconds
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}'
+        self._slots = {
+            name: SlotSemaphore(f'llm-{name}', provider.max_concurrent, self.lock_dir)
+            for name, provider in providers.items()
+        }
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._lease_thread = None
+
+    def start(self, transcriptions, provider, model=None, max_tokens=None, temperature=0.7):
+        """
+        Inicia (ou reaproveita) a geração de um roteiro
+
+        Returns:
+            Generation; o texto sai com follow() ou result()
+
+        Raises:
+            ValueError: Provedor desconhecido ou desabilitado
+        """
+        if provider not in self.providers:
+            raise ValueError(f"Provedor inválido: {provider}. Opções: {', '.join(self.providers)}")
+        model = model or self.providers[provider].default_model
+        max_tokens = max_tokens or self.max_tokens
+        videos = _normalize(transcriptions)
+        key = request_key(videos, provider, model, max_tokens, temperature, self.input_tokens)
+
+        with self._lock:
+            generation = self._inflight.get(key)
+        if generation is not None:
+            metrics.SCRIPT_REQUESTS.labels(provider=provider, result='shared').inc()
+            return generation
+
+        now = time.time()
+        db = _db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute('SELECT * FROM scripts WHERE key = ?', (key,)).fetchone()
+            if row is not None and row['status'] == SCRIPT_DONE and (
+                    self.ttl is None or row['finished_at'] >= now - self.ttl):
+                db.execute('COMMIT')
+                metrics.SCRIPT_REQUESTS.labels(provider=provider, result='cached').inc()
+                return Generation.finished(key, provider, model, row['text'])
+            if row is not None and row['status'] == SCRIPT_RUNNING and row['lease_expires'] >= now:
+                db.execute('COMMIT')
+                metrics.SCRIPT_REQUESTS.labels(provider=provider, result='shared').inc()
+                return RemoteGeneration(key, provider, model)
+            # Novo, expirado ou abandonado por um worker morto: este worker assume
+            db.execute(
+                'INSERT OR REPLACE INTO scripts (key, provider, model, status, text, lease_owner, '
+                'lease_expires, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, provider, model, SCRIPT_RUNNING, '', self.owner, now + self.lease_seconds, now)
+            )
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+        generation = Generation(key, provider, model)
+        with self._lock:
+            self._inflight[key] = generation
+            self._start_leases()
+        metrics.SCRIPT_REQUESTS.labels(provider=provider, result='generated').inc()
+        self.executor.submit(self._run, generation, videos, max_tokens, temperature)
+        return generation
+
+    def _start_leases(self):
+        if self._lease_thread is None:
+            self._lease_thread = threading.Thread(target=self._lease_loop, name='script-leases', daemon=True)
+            self._lease_thread.start()
+
+    def _lease_loop(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            try:
+                _db().execute(
+                    'UPDATE scripts SET lease_expires = ? WHERE lease_owner = ? AND status = ?',
+                    (time.time() + self.lease_seconds, self.owner, SCRIPT_RUNNING)
+                )
+            except Exception as e:
+                print(f"[ERROR] Erro ao renovar os leases dos roteiros: {str(e)}")
+
+    def _run(self, generation, videos, max_tokens, temperature):
+        provider = self.providers[generation.provider]
+        db = _db()
+        try:
+            prompt, generation.trimmed = build_prompt(videos, self.input_tokens)
+            if generation.trimmed:
+                print(f"[INFO] Roteiro {generation.key}: {generation.trimmed} transcrição(ões) "
+                      f"resumida(s) para caber em {self.input_tokens} tokens")
+
+            slots = self._slots[generation.provider]
+            handle = slots.acquire()
+            try:
+                with metrics.stage_timer('script_generation', provider=generation.provider):
+                    last_flush = time.time()
+                    for chunk in provider.stream(SYSTEM_PROMPT, prompt, generation.model, max_tokens, temperature):
+                        generation.append(chunk)
+                        if time.time() - last_flush >= FLUSH_SECONDS:
+                            last_flush = time.time()
+                            db.execute('UPDATE scripts SET text = ? WHERE key = ?', (generation.text, generation.key))
+            finally:
+                slots.release(handle)
+
+            db.execute(
+                'UPDATE scripts SET status = ?, text = ?, input_chars = ?, trimmed = ?, lease_owner = NULL, '
+                'finished_at = ? WHERE key = ?',
+                (SCRIPT_DONE, generation.text, len(prompt), generation.trimmed, time.time(), generation.key)
+            )
+            generation.finish()
+        except Exception as e:
+            print(f"[ERROR] Erro ao gerar roteiro {generation.key}: {str(e)}")
+            metrics.SCRIPT_REQUESTS.labels(provider=generation.provider, result='failed').inc()
+            # Falhas não ficam no cache: o próximo pedido tenta de novo
+            db.execute('DELETE FROM scripts WHERE key = ? AND lease_owner = ?', (generation.key, self.owner))
+            generation.finish(error=str(e))
+        finally:
+            with self._lock:
+                self._inflight.pop(generation.key, None)
+        self.prune()
+
+    def prune(self):
+        """Remove roteiros expirados"""
+        if self.ttl is None:
+            return 0
+        return _db().execute(
+            'DELETE FROM scripts WHERE status = ? AND finished_at < ?', (SCRIPT_DONE, time.time() - self.ttl)
+        ).rowcount
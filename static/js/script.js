@@ -102,8 +102,10 @@ processBtn.addEventListener('click', async () => {
             throw new Error('Erro ao processar vídeos');
         }
         
-        const data = await response.json();
-        displayResults(data.results);
+        // O servidor apenas enfileira; os resultados chegam por SSE
+        const batch = await response.json();
+        showPendingCards(batch.jobs);
+        await streamBatch(batch);
         
     } catch (error) {
         showNotification('Erro ao processar vídeos: ' + error.message, 'error');
@@ -113,6 +115,142 @@ processBtn.addEventListener('click', async () => {
     }
 });
 
+// Acompanhar o lote por Server-Sent Events, atualizando cada card
+function streamBatch(batch) {
+    return new Promise((resolve, reject) => {
+        if (!window.EventSource) {
+            waitForBatch(batch.status_url)
+                .then(data => { displayResults(data.results); resolve(); }, reject);
+            return;
+        }
+        
+        const source = new EventSource(batch.events_url);
+        const on = (type, handler) => source.addEventListener(type, event => handler(JSON.parse(event.data)));
+        
+        on('started', data => setPendingStatus(data.position, 'Obtendo informações...'));
+        on('retrying', data => setPendingStatus(data.position,
+            `Falha temporária, tentativa ${data.attempt} em ${Math.round(data.delay)}s...`));
+        on('requeued', data => setPendingStatus(data.position, 'Retomando após interrupção do servidor...'));
+        on('metadata', data => updatePendingMetadata(data));
+        on('resumed', data => setPendingStatus(data.position, 'Retomando download interrompido...'));
+        on('download', data => setPendingStatus(data.position, formatDownloadProgress(data)));
+        on('audio_ready', data => setPendingStatus(data.position, 'Transcrevendo...'));
+        on('duplicate', data => setPendingStatus(data.position, 'Repost de um vídeo já transcrito, reaproveitando a transcrição...'));
+        on('segment', data => appendPendingSegment(data));
+        on('done', data => replaceCard(data.position, data.result));
+        on('failed', data => replaceCard(data.position, {
+            success: false,
+            error: data.error,
+            url: batch.jobs[data.position].url
+        }));
+        on('batch_done', () => {
+            source.close();
+            resolve();
+        });
+        
+        // EventSource reconecta sozinho; só desistir se a conexão foi encerrada
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) {
+                reject(new Error('Conexão com o servidor perdida'));
+            }
+        };
+    });
+}
+
+// Cards provisórios, preenchidos conforme os eventos chegam
+function showPendingCards(jobs) {
+    resultsContainer.innerHTML = '';
+    jobs.forEach((job, index) => {
+        resultsContainer.appendChild(createPendingCard(job, index));
+    });
+    resultsSection.classList.remove('hidden');
+}
+
+function createPendingCard(job, index) {
+    const card = document.createElement('div');
+    card.className = 'result-card pending';
+    card.id = `job-card-${index}`;
+    card.innerHTML = `
+        <div class="result-header">
+            <img class="thumbnail hidden" alt="Thumbnail" onerror="this.style.display='none'">
+            <div class="result-info">
+                <h3 class="result-title">Vídeo ${index + 1}</h3>
+                <p class="result-meta">
+                    <span class="job-status">Na fila...</span>
+                </p>
+                <p class="result-meta"><small>${escapeHtml(job.url)}</small></p>
+            </div>
+        </div>
+        
+        <div class="transcription-section">
+            <div class="transcription-header">
+                <h3>Transcrição</h3>
+            </div>
+            <div class="transcription-text"></div>
+        </div>
+    `;
+    return card;
+}
+
+function setPendingStatus(position, text) {
+    const status = document.querySelector(`#job-card-${position} .job-status`);
+    if (status) {
+        status.textContent = text;
+    }
+}
+
+function updatePendingMetadata(data) {
+    const card = document.getElementById(`job-card-${data.position}`);
+    if (!card) return;
+    
+    card.querySelector('.result-title').textContent = data.title;
+    if (data.thumbnail) {
+        const thumbnail = card.querySelector('.thumbnail');
+        thumbnail.src = data.thumbnail;
+        thumbnail.classList.remove('hidden');
+    }
+    setPendingStatus(data.position, 'Baixando...');
+}
+
+function formatDownloadProgress(data) {
+    if (data.finished) return 'Download concluído';
+    if (data.percent === null) return 'Baixando...';
+    return `Baixando... ${data.percent}%`;
+}
+
+function appendPendingSegment(data) {
+    const text = document.querySelector(`#job-card-${data.position} .transcription-text`);
+    // Segmentos do Whisper começam com espaço; os de legendas da plataforma, não
+    const piece = (data.text || '').trim();
+    if (text && piece) {
+        text.textContent += (text.textContent && !/\s$/.test(text.textContent) ? ' ' : '') + piece;
+    }
+}
+
+function replaceCard(position, result) {
+    const pending = document.getElementById(`job-card-${position}`);
+    if (pending) {
+        pending.replaceWith(createResultCard(result, position));
+    }
+}
+
+// Consultar o lote até todos os jobs terminarem
+async function waitForBatch(statusUrl, interval = 2000) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        if (!response.ok) {
+            throw new Error('Erro ao consultar o processamento');
+        }
+        
+        const data = await response.json();
+        if (data.status === 'done') {
+            return data;
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, interval));
+    }
+}
+
 // Limpar tudo
 clearBtn.addEventListener('click', () => {
     if (confirm('Tem certeza que deseja limpar todos os campos e resultados?')) {
@@ -179,7 +317,8 @@ function createResultCard(result, index) {
     card.setAttribute('data-video-id', result.video_id);
     
     const duration = formatDuration(result.duration);
-    const language = getLanguageName(result.transcription.language);
+    // No modo metadata não há transcrição (nem arquivo de vídeo)
+    const transcription = result.transcription;
     
     card.innerHTML = `
         <div class="result-header">
@@ -190,29 +329,61 @@ function createResultCard(result, index) {
                     <span>Duração: ${duration}</span>
                     <span class="video-id-badge">ID: ${result.video_id}</span>
                 </p>
+                ${result.filename ? `
                 <button class="download-btn" onclick="downloadVideo('${result.video_id}')">
                     <svg viewBox="0 0 24 24" fill="none" stroke="currentColor">
                         <path d="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4"/>
                     </svg>
                     Baixar Vídeo
-                </button>
+                </button>` : ''}
             </div>
         </div>
         
+        ${transcription ? `
         <div class="transcription-section">
             <div class="transcription-header">
                 <h3>Transcrição</h3>
-                <span class="language-badge">${language}</span>
+                <span class="language-badge">${getLanguageName(transcription.language)}</span>
             </div>
             <div class="transcription-text" id="transcription-${result.video_id}">
-                ${escapeHtml(result.transcription.text)}
+                ${escapeHtml(transcription.preview ?? transcription.text)}${transcription.truncated ? '…' : ''}
             </div>
-        </div>
+            ${transcription.url ? createTranscriptActions(result) : ''}
+        </div>` : ''}
     `;
     
     return card;
 }
 
+// Texto completo e exportações, servidos sob demanda por /transcripts/<video_id>
+function createTranscriptActions(result) {
+    const url = result.transcription.url;
+    const exports = ['srt', 'vtt', 'txt', 'jsonl']
+        .map(format => `<a class="export-link" href="${url}?format=${format}&download=1">${format.toUpperCase()}</a>`)
+        .join('');
+    return `
+        <div class="transcript-actions">
+            ${result.transcription.truncated ? `<button class="load-transcript-btn" onclick="loadFullTranscript('${result.video_id}', '${url}', this)">Ver transcrição completa</button>` : ''}
+            <span class="transcript-exports">${exports}</span>
+        </div>
+    `;
+}
+
+async function loadFullTranscript(videoId, url, button) {
+    button.disabled = true;
+    try {
+        const response = await fetch(`${url}?format=txt`);
+        if (!response.ok) {
+            throw new Error('Transcrição não encontrada');
+        }
+        document.getElementById(`transcription-${videoId}`).textContent = await response.text();
+        button.remove();
+    } catch (error) {
+        showNotification('Erro ao carregar a transcrição: ' + error.message, 'error');
+        button.disabled = false;
+    }
+}
+
 // Download de vídeo usando apenas ID
 function downloadVideo(videoId) {
     // Usar rota de download com ID
@@ -0,0 +1,73 @@
+"""
+Acesso aos bancos SQLite da aplicação (fila de jobs, caches e índices)
+
+Cada banco fica em um arquivo próprio dentro de DATA_FOLDER. As conexões são
+abertas por thread e em modo WAL, o que permite que os vários workers do
+Gunicorn leiam e escrevam no mesmo arquivo ao mesmo tempo.
+"""
+
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+_data_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def init_storage(data_folder):
+    """Define a pasta onde os bancos SQLite serão criados"""
+    global _data_folder
+    _data_folder = data_folder
+    os.makedirs(_data_folder, exist_ok=True)
+
+
+def get_data_folder():
+    """Retorna a pasta dos bancos SQLite"""
+    return _data_folder
+
+
+def connect(name, schema=None, migrate=None):
+    """
+    Retorna a conexão desta thread para o banco `name`
+
+    Args:
+        name: Nome do banco (vira data/<name>.db)
+        schema: Script SQL executado quando a conexão é criada (CREATE IF NOT EXISTS)
+        migrate: Função chamada com a conexão após o schema (ajustes de bancos antigos)
+
+    Returns:
+        Conexão sqlite3 em modo autocommit
+    """
+    # Conexões não sobrevivem a um fork do Gunicorn
+    if getattr(_local, 'pid', None) != os.getpid():
+        _local.pid = os.getpid()
+        _local.connections = {}
+
+    path = os.path.join(_data_folder, f'{name}.db')
+    conn = _local.connections.get(path)
+    if conn is None:
+        os.makedirs(_data_folder, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if schema:
+            conn.executescript(schema)
+        if migrate:
+            migrate(conn)
+        _local.connections[path] = conn
+    return conn
+
+
+def add_columns(conn, table, columns):
+    """Adiciona a uma tabela já existente as colunas que ela ainda não tem"""
+    existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+    for name, definition in columns.items():
+        if name in existing:
+            continue
+        try:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+        except sqlite3.OperationalError as e:
+            # Outro worker pode ter adicionado a coluna ao mesmo tempo
+            if 'duplicate column' not in str(e):
+                raise
@@ -0,0 +1,38 @@
+"""
+Configuração comum dos testes
+
+O app é importado com FLASK_ENV=testing (backend de transcrição 'stub' e
+provedor de roteiros 'mock') e com os bancos SQLite numa pasta temporária.
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ['FLASK_ENV'] = 'testing'
+
+import config  # noqa: E402
+import storage  # noqa: E402
+
+# Definido antes do import do app, que inicializa o storage nessa pasta
+config.TestingConfig.DATA_FOLDER = tempfile.mkdtemp(prefix='downloader-tests-')
+storage.init_storage(config.TestingConfig.DATA_FOLDER)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    app_module.app.config['TESTING'] = True
+    with app_module.app.test_client() as client:
+        yield client
@@ -0,0 +1,9 @@
+"""ID de retomada dos downloads da fila"""
+
+
+def test_download_key_matches_for_link_variants(app_module):
+    key = app_module.download_key('https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'full')
+
+    assert app_module.download_key('https://youtu.be/dQw4w9WgXcQ?si=abc', 'full') == key
+    assert app_module.download_key('https://m.youtube.com/watch?v=dQw4w9WgXcQ&utm_source=x', 'full') == key
+    assert app_module.download_key('https://youtu.be/dQw4w9WgXcQ', 'transcript') != key
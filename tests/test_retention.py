@@ -0,0 +1,90 @@
+"""Rodadas de retenção com arquivos fixados no começo da fila"""
+
+import os
+import time
+import uuid
+
+import analysis
+import file_index
+import retention
+import transcript_index
+import transcript_store
+
+
+def _create_files(folder, count, mtime):
+    prefix = uuid.uuid4().hex[:6]
+    video_ids = []
+    for index in range(count):
+        video_id = f'{prefix}{index:02d}'
+        path = os.path.join(folder, f'{video_id}.mp4')
+        with open(path, 'wb') as f:
+            f.write(b'x' * 100)
+        os.utime(path, (mtime + index, mtime + index))
+        file_index.register_file(video_id, path)
+        video_ids.append(video_id)
+    return video_ids
+
+
+def test_pinned_files_do_not_block_age_sweep(tmp_path):
+    folder = tmp_path / 'downloads'
+    folder.mkdir()
+    video_ids = _create_files(str(folder), 12, time.time() - 10 * 3600)
+    # Os mais antigos ficam fixados e continuam no índice
+    for video_id in video_ids[:6]:
+        retention.pin(video_id, 3600)
+
+    manager = retention.RetentionManager(str(folder), str(tmp_path / 'locks'), max_age_hours=1, batch_size=4)
+
+    assert manager._sweep_age() == 4
+    assert manager._sweep_age() == 2
+    assert sorted(file_index.lookup_file(video_id) is not None for video_id in video_ids) == [False] * 6 + [True] * 6
+    for video_id in video_ids[:6]:
+        assert file_index.contains(video_id)
+
+
+def _store_transcript(video_id, text):
+    transcription = {'text': text, 'language': 'pt', 'segments': [{'start': 0, 'end': 5, 'text': text}]}
+    transcript_store.store(video_id, transcription)
+    transcript_index.index_transcript(video_id, transcription)
+    analysis.analyze(dict(transcription, video_id=video_id), update_corpus=True)
+
+
+def _df(term):
+    row = analysis._db().execute('SELECT df FROM term_df WHERE term = ?', (term,)).fetchone()
+    return row['df'] if row else 0
+
+
+def test_removed_file_is_forgotten_by_every_store(tmp_path):
+    folder = tmp_path / 'downloads'
+    folder.mkdir()
+    video_id = _create_files(str(folder), 1, time.time())[0]
+    # Só letras: números não viram termo na análise
+    term = 'palavra' + ''.join(chr(ord('a') + int(digit, 16)) for digit in uuid.uuid4().hex[:8])
+    _store_transcript(video_id, f'Uma frase com {term} no meio.')
+    assert _df(term) == 1
+
+    manager = retention.RetentionManager(str(folder), str(tmp_path / 'locks'))
+    assert manager.remove_file(str(folder / f'{video_id}.mp4'))
+
+    assert transcript_store.get_summary(video_id) is None
+    assert transcript_index.search(term) == []
+    assert _df(term) == 0
+    assert not file_index.contains(video_id)
+
+
+def test_stored_transcripts_without_file_expire_by_age(tmp_path):
+    expired, recent, pinned = (uuid.uuid4().hex[:8] for _ in range(3))
+    for video_id in (expired, recent, pinned):
+        _store_transcript(video_id, 'Transcrição de um vídeo processado só no modo transcript.')
+    old = time.time() - 10 * 3600
+    transcript_store._db().execute(
+        'UPDATE transcripts SET created_at = ? WHERE video_id IN (?, ?)', (old, expired, pinned)
+    )
+    retention.pin(pinned, 3600)
+
+    manager = retention.RetentionManager(str(tmp_path), str(tmp_path / 'locks'), max_age_hours=1)
+    manager._sweep_stored()
+
+    assert transcript_store.get_summary(expired) is None
+    assert transcript_store.get_summary(recent) is not None
+    assert transcript_store.get_summary(pinned) is not None
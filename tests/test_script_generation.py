@@ -0,0 +1,163 @@
+"""Geração de roteiros com o MockProvider: cache, deduplicação, orçamento e rota"""
+
+import json
+import threading
+import time
+import uuid
+
+import pytest
+
+import script_generation
+from script_generation import MockProvider, ScriptGenerator, fit_to_budget
+
+
+class CountingProvider(MockProvider):
+    """MockProvider que conta as chamadas ao provedor"""
+
+    def __init__(self, delay=0.0):
+        super().__init__(delay=delay)
+        self.calls = 0
+        self._calls_lock = threading.Lock()
+
+    def stream(self, system, prompt, model, max_tokens, temperature):
+        with self._calls_lock:
+            self.calls += 1
+        yield from super().stream(system, prompt, model, max_tokens, temperature)
+
+
+def _transcriptions(count=2):
+    # Textos únicos por teste: o cache fica no banco compartilhado
+    marker = uuid.uuid4().hex[:8]
+    return [
+        {'title': f'Vídeo {index}', 'text': f'Primeira frase do vídeo {index} ({marker}). Depois vem o resto.'}
+        for index in range(count)
+    ]
+
+
+@pytest.fixture
+def generator(tmp_path):
+    def create(delay=0.0):
+        provider = CountingProvider(delay=delay)
+        return ScriptGenerator({'mock': provider}, lock_dir=str(tmp_path), workers=2), provider
+    return create
+
+
+def test_repeated_request_is_served_from_cache(generator):
+    scripts, provider = generator()
+    transcriptions = _transcriptions()
+
+    first = scripts.start(transcriptions, 'mock')
+    text = first.result(timeout=10)
+    assert text.startswith('Gancho:')
+    assert not first.cached
+
+    second = scripts.start(transcriptions, 'mock')
+    assert second.cached
+    assert second.done
+    assert second.result(timeout=1) == text
+    assert provider.calls == 1
+
+
+def test_concurrent_identical_requests_call_provider_once(generator):
+    scripts, provider = generator(delay=0.01)
+    transcriptions = _transcriptions()
+    barrier = threading.Barrier(2)
+    generations = [None, None]
+
+    def request(index):
+        barrier.wait()
+        generations[index] = scripts.start(transcriptions, 'mock')
+
+    threads = [threading.Thread(target=request, args=(index,)) for index in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert generations[0].key == generations[1].key
+    assert generations[0].result(timeout=10) == generations[1].result(timeout=10)
+    assert provider.calls == 1
+
+
+def test_fit_to_budget_condenses_only_texts_over_their_share():
+    short = 'Texto curto.'
+    long_texts = [
+        ' '.join(f'Frase {index} do vídeo {video} sobre receitas e cozinha.' for index in range(40))
+        for video in range(2)
+    ]
+    texts = [short, *long_texts]
+
+    fitted, condensed = fit_to_budget(texts, 600)
+
+    assert condensed == 2
+    assert fitted[0] == short
+    assert sum(len(text) for text in fitted) <= 600
+    for original, text in zip(long_texts, fitted[1:]):
+        assert 0 < len(text) < len(original)
+
+
+def test_fit_to_budget_keeps_texts_that_fit():
+    texts = ['Um.', 'Dois.']
+    assert fit_to_budget(texts, 100) == (texts, 0)
+
+
+def _events(body):
+    events = []
+    for block in body.strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines['event'], json.loads(lines['data'])))
+    return events
+
+
+def test_generate_script_wait_returns_script_then_cache(client):
+    payload = {'transcriptions': _transcriptions(), 'provider': 'mock'}
+
+    response = client.post('/ai/generate_script', json=payload)
+    assert response.status_code == 200
+    first = response.get_json()
+    assert first['status'] == script_generation.SCRIPT_DONE
+    assert first['script'].startswith('Gancho:')
+    assert not first['cached']
+
+    again = client.post('/ai/generate_script', json=payload).get_json()
+    assert again['cached']
+    assert again['script'] == first['script']
+    assert again['script_id'] == first['script_id']
+
+
+def test_generate_script_stream_sends_chunks_and_done(client):
+    payload = {'transcriptions': _transcriptions(), 'provider': 'mock', 'stream': True}
+
+    response = client.post('/ai/generate_script', json=payload)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+
+    events = _events(response.get_data(as_text=True))
+    chunks = [data['text'] for event, data in events if event == 'chunk']
+    assert len(chunks) > 1
+    assert events[-1][0] == 'done'
+    assert events[-1][1]['script'] == ''.join(chunks)
+
+
+def test_generate_script_without_wait_returns_202(client):
+    payload = {'transcriptions': _transcriptions(), 'provider': 'mock', 'wait': False}
+
+    response = client.post('/ai/generate_script', json=payload)
+    assert response.status_code == 202
+    started = response.get_json()
+    assert started['status'] == script_generation.SCRIPT_RUNNING
+
+    deadline = time.time() + 10
+    while True:
+        script = client.get(f"/ai/scripts/{started['script_id']}").get_json()
+        if script['status'] == script_generation.SCRIPT_DONE or time.time() > deadline:
+            break
+        time.sleep(0.05)
+    assert script['status'] == script_generation.SCRIPT_DONE
+    assert script['script'].startswith('Gancho:')
+
+
+def test_generate_script_rejects_invalid_input(client):
+    assert client.post('/ai/generate_script', json={'transcriptions': []}).status_code == 400
+    response = client.post('/ai/generate_script', json={'transcriptions': _transcriptions(), 'provider': 'nenhum'})
+    assert response.status_code == 400
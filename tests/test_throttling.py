@@ -0,0 +1,31 @@
+"""Classificação das falhas de download"""
+
+from throttling import TransientError, is_throttled, is_transient
+
+
+def _chained(message, cause):
+    try:
+        try:
+            raise Exception(cause)
+        except Exception as e:
+            raise Exception(message) from e
+    except Exception as e:
+        return e
+
+
+def test_unable_to_extract_alone_is_permanent():
+    error = Exception('ERROR: [youtube] abc: Unable to extract initial player response; Private video')
+    assert not is_transient(error)
+    assert not is_throttled(error)
+
+
+def test_unable_to_extract_caused_by_429_is_throttling():
+    error = _chained('Unable to extract video data', 'HTTP Error 429: Too Many Requests')
+    assert is_throttled(error)
+    assert is_transient(error)
+
+
+def test_server_errors_and_transient_errors_are_retried():
+    assert is_transient(_chained('Unable to extract webpage', 'HTTP Error 503: Service Unavailable'))
+    assert not is_throttled(Exception('HTTP Error 503: Service Unavailable'))
+    assert is_transient(TransientError('Falha de rede'))
@@ -0,0 +1,25 @@
+"""Ranking da busca nas transcrições"""
+
+import uuid
+
+import transcript_index
+
+
+def test_old_best_match_outranks_many_recent_matches():
+    term = f'termo{uuid.uuid4().hex[:6]}'
+    old_video = uuid.uuid4().hex[:8]
+    transcript_index.index_transcript(old_video, {
+        'language': 'pt',
+        'segments': [{'start': 0, 'end': 5, 'text': f'{term} {term} {term}'}],
+    })
+    # Muitos segmentos mais recentes com o termo diluído em texto longo
+    filler = ' '.join(['palavra'] * 30)
+    for _ in range(60):
+        transcript_index.index_transcript(uuid.uuid4().hex[:8], {
+            'language': 'pt',
+            'segments': [{'start': i, 'end': i + 1, 'text': f'{term} {filler}'} for i in range(100)],
+        })
+
+    results = transcript_index.search(term, limit=1)
+
+    assert results[0]['video_id'] == old_video
@@ -0,0 +1,64 @@
+"""Leitura de trechos do transcript_store"""
+
+import uuid
+
+import transcript_store
+
+
+def _store(count=300, seconds=5):
+    video_id = uuid.uuid4().hex[:8]
+    segments = [
+        {'start': index * seconds, 'end': (index + 1) * seconds, 'text': f' Segmento {index}.'}
+        for index in range(count)
+    ]
+    transcript_store.store(video_id, {
+        'text': ''.join(segment['text'] for segment in segments),
+        'language': 'pt',
+        'segments': segments,
+    })
+    return video_id
+
+
+def test_offset_and_limit_read_only_the_requested_range():
+    video_id = _store()
+    indexes = [index for index, _ in transcript_store.iter_segments(video_id, offset=70, limit=5)]
+    assert indexes == [70, 71, 72, 73, 74]
+
+
+def test_time_filter_with_limit_returns_segments_from_that_time():
+    video_id = _store()
+
+    segments = list(transcript_store.iter_segments(video_id, start=600, limit=3))
+
+    assert [index for index, _ in segments] == [120, 121, 122]
+    assert segments[0][1]['start'] == 600
+
+
+def test_export_with_time_range_and_limit():
+    video_id = _store()
+
+    srt = ''.join(transcript_store.export(video_id, 'srt', start=1000, end=1400, limit=2))
+
+    assert srt.startswith('201\n00:16:40,000 --> 00:16:45,000\nSegmento 200.')
+    assert srt.count(' --> ') == 2
+
+
+def test_load_keeps_caption_text_spacing():
+    # Legendas da plataforma não começam com espaço, ao contrário do Whisper
+    video_id = uuid.uuid4().hex[:8]
+    segments = [
+        {'start': 0, 'end': 2, 'text': 'Olá a todos'},
+        {'start': 2, 'end': 4, 'text': 'bem-vindos ao canal'},
+    ]
+    transcript_store.store(video_id, {
+        'text': 'Olá a todos bem-vindos ao canal',
+        'language': 'pt',
+        'source': 'subtitles',
+        'segments': segments,
+    })
+
+    loaded = transcript_store.load(video_id)
+
+    assert loaded['text'] == 'Olá a todos bem-vindos ao canal'
+    assert loaded['source'] == 'subtitles'
+    assert [segment['text'] for segment in loaded['segments']] == ['Olá a todos', 'bem-vindos ao canal']
@@ -0,0 +1,11 @@
+"""Opções do yt-dlp montadas no app"""
+
+
+def test_retry_sleep_functions_accept_n(app_module):
+    # O yt-dlp chama sleep_func(n=count - 1); a primeira nova tentativa usa n=0
+    functions = app_module.ydl_pool.base_options['retry_sleep_functions']
+    assert set(functions) == {'http', 'fragment', 'extractor'}
+    for kind, sleep_func in functions.items():
+        delay = sleep_func(n=0)
+        assert 0.5 <= delay <= 1, kind
+        assert sleep_func(n=10) <= 30, kind
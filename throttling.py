@@ -0,0 +1,239 @@
+"""
+Limites adaptativos por plataforma e classificação de falhas temporárias
+
+Cada plataforma tem um balde de tokens (novos downloads por segundo) e um
+número de vagas simultâneas, guardados em SQLite para valer no container
+inteiro. Os dois seguem um controle AIMD:
+    - sucesso: a taxa sobe um pouco e, a cada SUCCESSES_PER_SLOT sucessos
+      seguidos, uma vaga é devolvida (até o teto configurado)
+    - bloqueio (HTTP 429, "Too Many Requests"...): taxa e vagas caem pela
+      metade e o balde é esvaziado; falhas que chegam juntas (vários jobs em
+      andamento) contam como um único sinal
+
+"Unable to extract" sozinho não é bloqueio nem falha temporária: é o que o
+yt-dlp diz para vídeos privados ou removidos, e repeti-los só derrubaria os
+limites da plataforma. Quando a causa é um 429 ou 5xx, a mensagem dela está
+na cadeia da exceção e a falha é classificada por ela.
+
+Falhas temporárias viram TransientError, que a fila de jobs repete com espera
+exponencial em vez de dar a URL como perdida.
+"""
+
+import random
+import time
+
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS platform_limits (
+    platform TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    tokens REAL NOT NULL,
+    concurrency INTEGER NOT NULL,
+    successes INTEGER NOT NULL DEFAULT 0,
+    throttled INTEGER NOT NULL DEFAULT 0,
+    decreased_at REAL NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Mensagens do yt-dlp que indicam que a plataforma está limitando os acessos
+THROTTLE_MARKERS = (
+    'http error 429',
+    'too many requests',
+    'rate-limit',
+    'rate limit',
+)
+# Falhas de rede que costumam passar sozinhas
+TRANSIENT_MARKERS = THROTTLE_MARKERS + (
+    'timed out',
+    'connection reset',
+    'connection refused',
+    'connection aborted',
+    'remote end closed',
+    'incompleteread',
+    'temporary failure in name resolution',
+    'http error 500',
+    'http error 502',
+    'http error 503',
+    'http error 504',
+)
+
+# Aumento da taxa a cada sucesso, como fração do teto
+INCREASE_FRACTION = 0.1
+SUCCESSES_PER_SLOT = 5
+# Janela em que novas falhas não reduzem os limites de novo
+DECREASE_WINDOW_SECONDS = 5
+
+
+class TransientError(Exception):
+    """Falha temporária (bloqueio da plataforma, rede): o job pode ser repetido"""
+
+
+def _messages(error):
+    # A mensagem amigável pode esconder a original, que fica na cadeia
+    while error is not None:
+        yield str(error).lower()
+        error = error.__cause__ or error.__context__
+
+
+def is_throttled(error):
+    """Se a falha indica que a plataforma está limitando os acessos"""
+    return any(marker in message for message in _messages(error) for marker in THROTTLE_MARKERS)
+
+
+def is_transient(error):
+    """Se vale a pena repetir a operação que falhou"""
+    if isinstance(error, TransientError):
+        return True
+    return any(marker in message for message in _messages(error) for marker in TRANSIENT_MARKERS)
+
+
+def backoff_delay(attempt, base, maximum):
+    """Espera exponencial com jitter: metade fixa e metade aleatória"""
+    delay = min(maximum, base * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class AdaptiveThrottle:
+    """Balde de tokens e vagas por plataforma, ajustados pelos resultados"""
+
+    def __init__(self, per_minute=None, default_per_minute=60, min_per_minute=2, burst=3, cooldown=60):
+        self.per_minute = per_minute or {}
+        self.default_per_minute = default_per_minute
+        self.min_rate = min_per_minute / 60
+        self.burst = max(1, burst)
+        # Depois de um bloqueio, os limites só voltam a subir após `cooldown` segundos
+        self.cooldown = cooldown
+
+    def _max_rate(self, platform):
+        return self.per_minute.get(platform, self.default_per_minute) / 60
+
+    def _db(self):
+        return storage.connect('throttling', _SCHEMA)
+
+    def _state(self, db, platform, max_concurrency, now):
+        row = db.execute('SELECT * FROM platform_limits WHERE platform = ?', (platform,)).fetchone()
+        if row is not None:
+            state = dict(row)
+            # O teto pode ter baixado na configuração desde a última vez
+            state['rate'] = min(state['rate'], self._max_rate(platform))
+            return state
+        state = {
+            'platform': platform,
+            'rate': self._max_rate(platform),
+            'tokens': float(self.burst),
+            'concurrency': max_concurrency,
+            'successes': 0,
+            'throttled': 0,
+            'decreased_at': 0.0,
+            'updated_at': now,
+        }
+        db.execute(
+            'INSERT INTO platform_limits (platform, rate, tokens, concurrency, successes, throttled, '
+            'decreased_at, updated_at) VALUES (:platform, :rate, :tokens, :concurrency, :successes, '
+            ':throttled, :decreased_at, :updated_at)',
+            state
+        )
+        return state
+
+    def _save(self, db, state):
+        db.execute(
+            'UPDATE platform_limits SET rate = :rate, tokens = :tokens, concurrency = :concurrency, '
+            'successes = :successes, throttled = :throttled, decreased_at = :decreased_at, '
+            'updated_at = :updated_at WHERE platform = :platform',
+            state
+        )
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state['updated_at'])
+        state['tokens'] = min(float(self.burst), state['tokens'] + elapsed * state['rate'])
+        state['updated_at'] = now
+
+    def concurrency(self, platform, max_concurrency):
+        """Vagas simultâneas liberadas agora para a plataforma"""
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            state = self._state(db, platform, max_concurrency, time.time())
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+        return max(1, min(state['concurrency'], max_concurrency))
+
+    def wait(self, platform, max_concurrency):
+        """Bloqueia até haver um token no balde da plataforma; retorna a espera em segundos"""
+        waited = 0.0
+        while True:
+            db = self._db()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                state = self._state(db, platform, max_concurrency, now)
+                self._refill(state, now)
+                if state['tokens'] >= 1:
+                    state['tokens'] -= 1
+                    delay = 0
+                else:
+                    delay = (1 - state['tokens']) / state['rate']
+                self._save(db, state)
+                db.execute('COMMIT')
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+
+            if not delay:
+                return waited
+            # Jitter para os workers não acordarem todos juntos
+            delay = min(delay, 30) * (0.8 + random.random() * 0.4)
+            time.sleep(delay)
+            waited += delay
+
+    def record(self, platform, max_concurrency, error=None):
+        """Ajusta os limites com o resultado de um download (`error` None = sucesso)"""
+        throttled = error is not None and is_throttled(error)
+        if error is not None and not throttled:
+            # Falhas que não são bloqueio (vídeo privado, 404...) não dizem nada sobre a taxa
+            return
+
+        db = self._db()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            state = self._state(db, platform, max_concurrency, now)
+            self._refill(state, now)
+            max_rate = self._max_rate(platform)
+            if throttled:
+                if now - state['decreased_at'] >= DECREASE_WINDOW_SECONDS:
+                    state['rate'] = max(self.min_rate, state['rate'] / 2)
+                    state['concurrency'] = max(1, state['concurrency'] // 2)
+                    state['tokens'] = 0.0
+                    state['decreased_at'] = now
+                    print(f"[WARNING] {platform} limitando acessos: "
+                          f"{state['rate'] * 60:.1f} download(s)/min, {state['concurrency']} vaga(s)")
+                state['successes'] = 0
+                state['throttled'] += 1
+            elif now - state['decreased_at'] >= self.cooldown:
+                state['rate'] = min(max_rate, state['rate'] + max_rate * INCREASE_FRACTION)
+                state['successes'] += 1
+                if state['successes'] >= SUCCESSES_PER_SLOT:
+                    state['successes'] = 0
+                    state['concurrency'] = min(max_concurrency, state['concurrency'] + 1)
+            self._save(db, state)
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def snapshot(self):
+        """Limites atuais de cada plataforma: {plataforma: {'per_minute', 'concurrency', 'throttled'}}"""
+        rows = self._db().execute('SELECT platform, rate, concurrency, throttled FROM platform_limits').fetchall()
+        return {
+            row['platform']: {
+                'per_minute': row['rate'] * 60,
+                'concurrency': row['concurrency'],
+                'throttled': row['throttled'],
+            }
+            for row in rows
+        }
@@ -0,0 +1,190 @@
+"""
+Índice de busca das transcrições (SQLite FTS5)
+
+Cada transcrição concluída é gravada segmento a segmento, com início e fim,
+em uma tabela comum (`segments`) espelhada por um índice invertido FTS5
+(`segments_fts`, conteúdo externo mantido por triggers). A busca devolve os
+trechos mais relevantes (bm25) com o video_id, o segundo exato e um snippet
+com os termos destacados.
+
+Inserções são incrementais: cada job indexa só o seu vídeo, e reindexar um
+video_id substitui os segmentos anteriores.
+"""
+
+import re
+import time
+
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    title TEXT,
+    url TEXT,
+    language TEXT,
+    source TEXT,
+    duration REAL,
+    indexed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_video ON segments (video_id, start);
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text,
+    content = 'segments',
+    content_rowid = 'id',
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+MAX_RESULTS = 100
+SNIPPET_TOKENS = 16
+
+# Frases entre aspas ou palavras soltas da consulta do usuário
+_QUERY_TERM = re.compile(r'"([^"]+)"|(\w+)', re.UNICODE)
+
+
+def _db():
+    return storage.connect('transcripts', _SCHEMA)
+
+
+def build_query(text):
+    """
+    Converte a busca do usuário em uma consulta FTS5 segura
+
+    Cada palavra (ou "frase entre aspas") vira um termo entre aspas, exigido
+    em conjunto com os demais; operadores e pontuação do usuário não chegam
+    ao FTS5. Retorna None se não sobrar nenhum termo.
+    """
+    terms = []
+    for phrase, word in _QUERY_TERM.findall(text or ''):
+        term = ' '.join(re.findall(r'\w+', phrase)) if phrase else word
+        if term:
+            terms.append(f'"{term}"')
+    return ' '.join(terms) or None
+
+
+def index_transcript(video_id, transcription, title=None, url=None, duration=None):
+    """Grava (ou substitui) os segmentos de uma transcrição no índice"""
+    segments = [
+        (video_id, float(segment['start']), float(segment['end']), segment['text'].strip())
+        for segment in transcription.get('segments') or []
+        if segment.get('text', '').strip()
+    ]
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute('DELETE FROM segments WHERE video_id = ?', (video_id,))
+        db.executemany('INSERT INTO segments (video_id, start, end, text) VALUES (?, ?, ?, ?)', segments)
+        db.execute(
+            'INSERT OR REPLACE INTO videos (video_id, title, url, language, source, duration, indexed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (video_id, title, url, transcription.get('language'), transcription.get('source', 'asr'),
+             duration, time.time())
+        )
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    return len(segments)
+
+
+def remove_transcript(video_id):
+    """Tira um vídeo do índice"""
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute('DELETE FROM segments WHERE video_id = ?', (video_id,))
+        db.execute('DELETE FROM videos WHERE video_id = ?', (video_id,))
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+
+
+def search(text, limit=20, offset=0, video_id=None, language=None):
+    """
+    Busca trechos das transcrições
+
+    Args:
+        text: Termos da busca ("frases entre aspas" são buscadas inteiras)
+        limit: Máximo de resultados (até MAX_RESULTS)
+        offset: Resultados a pular (paginação)
+        video_id: Restringe a um vídeo
+        language: Restringe a um idioma
+
+    Returns:
+        Lista de {'video_id', 'title', 'url', 'start', 'end', 'text', 'snippet', 'score'},
+        do mais para o menos relevante
+    """
+    query = build_query(text)
+    if query is None:
+        return []
+    db = _db()
+
+    # 1ª etapa: só rowid e bm25, direto no índice, sobre todos os segmentos que
+    # casam (sem corte: termos comuns também trazem os trechos antigos mais relevantes)
+    sql = 'SELECT segments_fts.rowid AS id, bm25(segments_fts) AS score FROM segments_fts'
+    conditions = ['segments_fts MATCH ?']
+    params = [query]
+    if video_id:
+        # Os segmentos de um vídeo são gravados juntos: rowids contíguos
+        bounds = db.execute('SELECT MIN(id), MAX(id) FROM segments WHERE video_id = ?', (video_id,)).fetchone()
+        if bounds[0] is None:
+            return []
+        conditions.append('segments_fts.rowid BETWEEN ? AND ?')
+        params += list(bounds)
+    if language:
+        sql += ' JOIN segments ON segments.id = segments_fts.rowid JOIN videos ON videos.video_id = segments.video_id'
+        conditions.append('videos.language = ?')
+        params.append(language)
+    sql += ' WHERE ' + ' AND '.join(conditions) + ' ORDER BY score LIMIT ? OFFSET ?'
+    params += [max(1, min(limit, MAX_RESULTS)), max(0, offset)]
+    ranked = db.execute(sql, params).fetchall()
+    if not ranked:
+        return []
+
+    # 2ª etapa: snippets e metadados só dos resultados da página
+    scores = {row['id']: row['score'] for row in ranked}
+    rows = db.execute(
+        'SELECT segments.id, segments.video_id, segments.start, segments.end, segments.text, '
+        "snippet(segments_fts, 0, '<mark>', '</mark>', '…', ?) AS snippet, videos.title, videos.url "
+        'FROM segments_fts '
+        'JOIN segments ON segments.id = segments_fts.rowid '
+        'LEFT JOIN videos ON videos.video_id = segments.video_id '
+        f"WHERE segments_fts MATCH ? AND segments_fts.rowid IN ({', '.join('?' * len(scores))})",
+        [SNIPPET_TOKENS, query, *scores]
+    ).fetchall()
+    by_id = {row['id']: row for row in rows}
+
+    return [
+        {
+            'video_id': by_id[row_id]['video_id'],
+            'title': by_id[row_id]['title'],
+            'url': by_id[row_id]['url'],
+            'start': by_id[row_id]['start'],
+            'end': by_id[row_id]['end'],
+            'text': by_id[row_id]['text'],
+            'snippet': by_id[row_id]['snippet'],
+            # bm25 do SQLite é negativo: quanto menor, mais relevante
+            'score': round(-score, 4),
+        }
+        for row_id, score in scores.items()
+        if row_id in by_id
+    ]
+
+
+def optimize():
+    """Funde os segmentos do índice FTS5 (consultas mais rápidas após muitas inserções)"""
+    _db().execute("INSERT INTO segments_fts (segments_fts) VALUES ('optimize')")
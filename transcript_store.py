@@ -0,0 +1,270 @@
+"""
+Armazenamento compacto das transcrições completas
+
+Os segmentos de cada vídeo são gravados em blocos de BLOCK_SIZE segmentos,
+cada bloco comprimido com zlib e marcado com o índice do primeiro segmento e
+o intervalo de tempo que cobre. Assim um trecho (por índice ou por segundos)
+é lido descomprimindo só os blocos que ele toca, e uma exportação completa
+percorre os blocos um a um, sem montar a transcrição inteira em memória.
+
+As respostas da API levam só um resumo da transcrição; o texto completo sai
+de /transcripts/<video_id> em SRT, VTT, texto ou JSONL (ver export()).
+"""
+
+import json
+import time
+import zlib
+
+import storage
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcripts (
+    video_id TEXT PRIMARY KEY,
+    language TEXT,
+    source TEXT,
+    duration REAL,
+    segment_count INTEGER NOT NULL,
+    word_count INTEGER NOT NULL,
+    text_length INTEGER NOT NULL,
+    preview TEXT NOT NULL,
+    text BLOB,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    video_id TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    first_segment INTEGER NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (video_id, block)
+) WITHOUT ROWID;
+"""
+
+BLOCK_SIZE = 64
+COMPRESSION_LEVEL = 6
+PREVIEW_CHARS = 500
+
+EXPORT_FORMATS = {
+    'srt': 'application/x-subrip; charset=utf-8',
+    'vtt': 'text/vtt; charset=utf-8',
+    'txt': 'text/plain; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def _migrate(conn):
+    # Bancos antigos não guardavam o texto original (ver load())
+    storage.add_columns(conn, 'transcripts', {'text': 'BLOB'})
+
+
+def _db():
+    return storage.connect('transcript_store', _SCHEMA, migrate=_migrate)
+
+
+def _encode_block(segments):
+    lines = (
+        json.dumps([round(float(s['start']), 3), round(float(s['end']), 3), s['text']], ensure_ascii=False)
+        for s in segments
+    )
+    return zlib.compress('\n'.join(lines).encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def _decode_block(data):
+    return [json.loads(line) for line in zlib.decompress(data).decode('utf-8').split('\n') if line]
+
+
+def store(video_id, transcription, duration=None, preview_chars=PREVIEW_CHARS):
+    """Grava (ou substitui) a transcrição completa de um vídeo; retorna o resumo"""
+    segments = transcription.get('segments') or []
+    text = (transcription.get('text') or '').strip()
+    blocks = [
+        (video_id, index // BLOCK_SIZE, index, float(segments[index]['start']),
+         max(float(segment['end']) for segment in segments[index:index + BLOCK_SIZE]),
+         _encode_block(segments[index:index + BLOCK_SIZE]))
+        for index in range(0, len(segments), BLOCK_SIZE)
+    ]
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute('DELETE FROM blocks WHERE video_id = ?', (video_id,))
+        db.executemany(
+            'INSERT INTO blocks (video_id, block, first_segment, start, end, data) VALUES (?, ?, ?, ?, ?, ?)',
+            blocks
+        )
+        db.execute(
+            'INSERT OR REPLACE INTO transcripts (video_id, language, source, duration, segment_count, '
+            'word_count, text_length, preview, text, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (video_id, transcription.get('language'), transcription.get('source', 'asr'), duration,
+             len(segments), len(text.split()), len(text), text[:preview_chars],
+             zlib.compress(text.encode('utf-8'), COMPRESSION_LEVEL), time.time())
+        )
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+    return get_summary(video_id)
+
+
+def get_summary(video_id):
+    """Resumo da transcrição guardada, ou None"""
+    row = _db().execute(
+        'SELECT language, source, segment_count, word_count, text_length, preview FROM transcripts WHERE video_id = ?',
+        (video_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        'language': row['language'],
+        'source': row['source'],
+        'segment_count': row['segment_count'],
+        'word_count': row['word_count'],
+        'preview': row['preview'],
+        'truncated': len(row['preview']) < row['text_length'],
+    }
+
+
+def iter_segments(video_id, offset=0, limit=None, start=None, end=None):
+    """
+    Segmentos guardados, bloco a bloco
+
+    Args:
+        offset: Índice do primeiro segmento
+        limit: Máximo de segmentos
+        start, end: Só os segmentos que tocam esse intervalo (segundos)
+
+    Yields:
+        (índice, {'start', 'end', 'text'})
+    """
+    conditions = ['video_id = ?']
+    params = [video_id]
+    if offset:
+        conditions.append('block >= ?')
+        params.append(offset // BLOCK_SIZE)
+    if limit is not None and start is None and end is None:
+        # Só sem filtro de tempo o limite vira um bloco final; com ele, o contador abaixo para a leitura
+        conditions.append('block <= ?')
+        params.append((offset + max(limit, 1) - 1) // BLOCK_SIZE)
+    if start is not None:
+        conditions.append('end > ?')
+        params.append(start)
+    if end is not None:
+        conditions.append('start < ?')
+        params.append(end)
+
+    # Um bloco por consulta: um cliente lento não segura uma leitura aberta no banco
+    db = _db()
+    numbers = [row[0] for row in db.execute(
+        f"SELECT block FROM blocks WHERE {' AND '.join(conditions)} ORDER BY block", params
+    )]
+    remaining = limit
+    for number in numbers:
+        row = db.execute(
+            'SELECT first_segment, data FROM blocks WHERE video_id = ? AND block = ?', (video_id, number)
+        ).fetchone()
+        if row is None:
+            return  # Transcrição substituída durante a leitura
+        for index, (segment_start, segment_end, text) in enumerate(_decode_block(row['data']), row['first_segment']):
+            if index < offset:
+                continue
+            if (start is not None and segment_end <= start) or (end is not None and segment_start >= end):
+                continue
+            if remaining is not None:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            yield index, {'start': segment_start, 'end': segment_end, 'text': text}
+
+
+def load(video_id):
+    """Transcrição completa no formato do pipeline ({'text', 'language', 'segments'}), ou None"""
+    row = _db().execute('SELECT language, source, text FROM transcripts WHERE video_id = ?', (video_id,)).fetchone()
+    if row is None:
+        return None
+    segments = [segment for _, segment in iter_segments(video_id)]
+    if row['text'] is not None:
+        text = zlib.decompress(row['text']).decode('utf-8')
+    else:
+        # Gravada antes do texto original: legendas não trazem o espaço inicial do Whisper
+        text = ' '.join(' '.join(segment['text'].split()) for segment in segments if segment['text'].strip())
+    return {
+        'text': text,
+        'language': row['language'],
+        'source': row['source'],
+        'segments': segments,
+    }
+
+
+def stored_before(timestamp, limit, after=None):
+    """
+    Transcrições gravadas antes de `timestamp`, das mais antigas para as mais novas
+
+    Args:
+        after: (created_at, video_id) da última entrada da página anterior
+    """
+    if after is None:
+        rows = _db().execute(
+            'SELECT video_id, created_at FROM transcripts WHERE created_at < ? ORDER BY created_at, video_id LIMIT ?',
+            (timestamp, limit)
+        ).fetchall()
+    else:
+        rows = _db().execute(
+            'SELECT video_id, created_at FROM transcripts WHERE created_at < ? AND (created_at, video_id) > (?, ?) '
+            'ORDER BY created_at, video_id LIMIT ?',
+            (timestamp, *after, limit)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def remove(video_id):
+    """Apaga a transcrição de um vídeo"""
+    db = _db()
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        db.execute('DELETE FROM blocks WHERE video_id = ?', (video_id,))
+        db.execute('DELETE FROM transcripts WHERE video_id = ?', (video_id,))
+        db.execute('COMMIT')
+    except Exception:
+        db.execute('ROLLBACK')
+        raise
+
+
+def _timestamp(seconds, separator):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f'{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}'
+
+
+def export(video_id, fmt, **selection):
+    """
+    Gera a transcrição no formato pedido, pedaço a pedaço (para respostas em streaming)
+
+    Args:
+        fmt: 'srt', 'vtt', 'txt' ou 'jsonl'
+        selection: offset, limit, start e end de iter_segments
+
+    Yields:
+        Texto da exportação; no SRT a numeração segue o índice original do segmento
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato inválido: {fmt}. Opções: {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'vtt':
+        yield 'WEBVTT\n\n'
+
+    first = True
+    for index, segment in iter_segments(video_id, **selection):
+        text = segment['text'].strip()
+        if fmt == 'srt':
+            yield (f"{index + 1}\n{_timestamp(segment['start'], ',')} --> {_timestamp(segment['end'], ',')}\n"
+                   f"{text}\n\n")
+        elif fmt == 'vtt':
+            yield f"{_timestamp(segment['start'], '.')} --> {_timestamp(segment['end'], '.')}\n{text}\n\n"
+        elif fmt == 'jsonl':
+            yield json.dumps(dict(segment, index=index), ensure_ascii=False) + '\n'
+        elif text:
+            yield text if first else ' ' + text
+            first = False
+    if fmt == 'txt' and not first:
+        yield '\n'
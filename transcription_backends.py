@@ -0,0 +1,203 @@
+"""
+Motores de transcrição intercambiáveis
+
+Todos devolvem o mesmo formato usado pela aplicação:
+    {'text': str, 'language': str, 'segments': [{'start', 'end', 'text'}]}
+
+O motor é escolhido em Config.TRANSCRIPTION_BACKEND:
+    whisper: openai-whisper (PyTorch), com transcrição em lote opcional
+    faster-whisper: CTranslate2 com pesos quantizados (int8), bem mais rápido em CPU
+    stub: resposta fixa, sem dependências; para testes e desenvolvimento
+"""
+
+import os
+import threading
+
+
+class TranscriptionBackend:
+    """Interface comum dos motores de transcrição"""
+
+    name = None
+
+    def __init__(self, model='base', **options):
+        self.model_name = model
+        self.options = options
+
+    def load(self):
+        """Carrega o modelo (chamado uma vez, antes do primeiro uso)"""
+
+    def warmup(self):
+        """Transcrição descartável para inicializar caches do modelo"""
+
+    def detect_language(self, audio):
+        """Idioma falado em uma amostra curta (float32, 16 kHz), ou None se não suportado"""
+        return None
+
+    def transcribe(self, audio_path, language=None, on_segment=None):
+        """
+        Transcreve um arquivo de áudio ou vídeo
+
+        Args:
+            audio_path: Arquivo a transcrever, ou amostras float32 mono de 16 kHz (numpy)
+            language: Código do idioma ou None para detectar
+            on_segment: Chamado com cada segmento assim que ele fica pronto
+
+        Returns:
+            {'text', 'language', 'segments'}
+        """
+        raise NotImplementedError
+
+
+def _result(segments, language, on_segment=None, text=None):
+    """Monta o resultado padrão e repassa os segmentos ao callback"""
+    if on_segment is not None:
+        for segment in segments:
+            on_segment(segment)
+    return {
+        'text': text if text is not None else ''.join(segment['text'] for segment in segments).strip(),
+        'language': language or 'desconhecido',
+        'segments': segments
+    }
+
+
+class WhisperBackend(TranscriptionBackend):
+    """openai-whisper; com batch_size > 1 os clipes de até 30s vão pelo BatchedTranscriber"""
+
+    name = 'whisper'
+
+    def load(self):
+        import whisper
+
+        if self.options.get('torch_threads'):
+            import torch
+            torch.set_num_threads(self.options['torch_threads'])
+        self.model = whisper.load_model(self.model_name)
+        # O modelo não é seguro para chamadas simultâneas
+        self.lock = threading.Lock()
+        self.batcher = None
+        if self.options.get('batch_size', 1) > 1:
+            from batch_transcriber import BatchedTranscriber
+            self.batcher = BatchedTranscriber(
+                self.model, self.options['batch_size'], self.options.get('batch_max_wait', 0.05),
+                lock=self.lock
+            )
+
+    def warmup(self):
+        import numpy as np
+
+        with self.lock:
+            self.model.transcribe(np.zeros(16000, dtype=np.float32), language='en', fp16=False)
+
+    def detect_language(self, audio):
+        import whisper
+
+        if not self.model.is_multilingual:
+            return 'en'
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(audio), self.model.dims.n_mels)
+        with self.lock:
+            _, probs = self.model.detect_language(mel.to(self.model.device))
+        return max(probs, key=probs.get)
+
+    def transcribe(self, audio_path, language=None, on_segment=None):
+        if self.batcher is not None:
+            import whisper
+
+            audio = whisper.load_audio(audio_path) if isinstance(audio_path, str) else audio_path
+            if self.batcher.fits(audio):
+                return self.batcher.transcribe(audio, language, on_segment)
+            # Áudio longo: o model.transcribe mantém o contexto entre janelas
+            audio_path = audio
+
+        with self.lock:
+            result = self.model.transcribe(audio_path, language=language)
+        segments = [
+            {
+                'start': seg['start'],
+                'end': seg['end'],
+                'text': seg['text']
+            }
+            for seg in result.get('segments', [])
+        ]
+        return _result(segments, result.get('language'), on_segment, text=result['text'])
+
+
+class FasterWhisperBackend(TranscriptionBackend):
+    """faster-whisper (CTranslate2) com quantização int8 para CPU"""
+
+    name = 'faster-whisper'
+
+    def load(self):
+        from faster_whisper import WhisperModel
+
+        self.model = WhisperModel(
+            self.model_name,
+            device=self.options.get('device', 'cpu'),
+            compute_type=self.options.get('compute_type', 'int8'),
+            cpu_threads=self.options.get('cpu_threads') or 0,
+            num_workers=self.options.get('num_workers', 1),
+        )
+
+    def warmup(self):
+        import numpy as np
+
+        segments, _ = self.model.transcribe(np.zeros(16000, dtype=np.float32), language='en')
+        list(segments)
+
+    def detect_language(self, audio):
+        # O idioma é detectado na chamada; os segmentos nem chegam a ser decodificados
+        _, info = self.model.transcribe(audio, beam_size=1)
+        return info.language
+
+    def transcribe(self, audio_path, language=None, on_segment=None):
+        # Os segmentos são gerados sob demanda: cada um sai assim que decodificado
+        generated, info = self.model.transcribe(audio_path, language=language, beam_size=5)
+        segments = []
+        for seg in generated:
+            segment = {'start': seg.start, 'end': seg.end, 'text': seg.text}
+            segments.append(segment)
+            if on_segment is not None:
+                on_segment(segment)
+        return _result(segments, info.language)
+
+
+class StubBackend(TranscriptionBackend):
+    """Motor falso: não carrega modelo e responde na hora"""
+
+    name = 'stub'
+
+    def detect_language(self, audio):
+        return 'pt'
+
+    def transcribe(self, audio_path, language=None, on_segment=None):
+        if isinstance(audio_path, str):
+            text = f'Transcrição de teste de {os.path.basename(audio_path)}'
+            end = 1.0
+        else:
+            end = round(len(audio_path) / 16000, 2)
+            text = f'Transcrição de teste de {end}s de áudio'
+        segments = [{'start': 0.0, 'end': end, 'text': text}]
+        return _result(segments, language or 'pt', on_segment)
+
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (WhisperBackend, FasterWhisperBackend, StubBackend)
+}
+
+
+def backend_options(settings):
+    """Opções dos motores a partir da configuração da aplicação"""
+    return {
+        'model': settings.WHISPER_MODEL,
+        'batch_size': settings.TRANSCRIPTION_BATCH_SIZE,
+        'batch_max_wait': settings.TRANSCRIPTION_BATCH_MAX_WAIT_MS / 1000,
+        'compute_type': settings.FASTER_WHISPER_COMPUTE_TYPE,
+        'cpu_threads': settings.FASTER_WHISPER_CPU_THREADS,
+    }
+
+
+def create_backend(name, **options):
+    """Instancia o motor `name` (ainda sem carregar o modelo)"""
+    if name not in BACKENDS:
+        raise ValueError(f"Motor de transcrição desconhecido: {name}. Opções: {', '.join(BACKENDS)}")
+    return BACKENDS[name](**options)
@@ -0,0 +1,232 @@
+"""
+Serviço de transcrição compartilhado pelos workers do Gunicorn
+
+Um único processo carrega o motor configurado (Config.TRANSCRIPTION_BACKEND,
+modelo Config.WHISPER_MODEL), faz uma transcrição de aquecimento e atende pedidos de todos os workers por um
+socket local. Assim o carregamento do modelo sai das requisições dos usuários e
+a memória guarda um modelo, não um por worker.
+
+Áudios com mais de Config.LONG_AUDIO_MIN_SECONDS são transcritos em partes
+paralelas pelo ChunkedTranscriber (chunked_transcriber.py).
+
+Iniciado automaticamente pelo gunicorn.conf.py; também pode rodar sozinho:
+    python transcription_service.py
+"""
+
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import multiprocessing
+from multiprocessing.connection import Listener, Client
+
+import media
+from transcription_backends import create_backend, backend_options
+from chunked_transcriber import ChunkedTranscriber
+
+# Socket Unix quando disponível; no Windows, TCP apenas na interface local
+_USE_UNIX_SOCKET = hasattr(socket, 'AF_UNIX')
+_TCP_FALLBACK_ADDRESS = ('127.0.0.1', 50555)
+
+
+class TranscriptionUnavailable(Exception):
+    """O serviço de transcrição não está rodando ou não respondeu"""
+
+
+def _listener_address(address):
+    if _USE_UNIX_SOCKET:
+        return address, 'AF_UNIX'
+    return _TCP_FALLBACK_ADDRESS, 'AF_INET'
+
+
+class TranscriptionServer:
+    """Mantém o motor de transcrição carregado e atende pedidos vindos do socket"""
+
+    def __init__(self, address, authkey, options):
+        self.address = address
+        self.authkey = authkey
+        options = dict(options)
+        chunked = options.pop('chunked', None)
+        backend_name = options.pop('backend')
+        self.backend = create_backend(backend_name, **options)
+        self.chunked = ChunkedTranscriber(backend_name, options, **chunked) if chunked else None
+        self.load_error = None
+        self.ready = threading.Event()
+
+    def load(self):
+        started = time.time()
+        try:
+            print(f"[INFO] Serviço de transcrição: carregando '{self.backend.name}' "
+                  f"(modelo '{self.backend.model_name}')...")
+            self.backend.load()
+            self.backend.warmup()
+            print(f"[INFO] Serviço de transcrição pronto em {time.time() - started:.1f}s")
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"[ERROR] Serviço de transcrição: falha ao carregar o modelo: {self.load_error}")
+        finally:
+            self.ready.set()
+
+    def transcribe(self, audio_path, language=None, on_segment=None):
+        self.ready.wait()
+        if self.load_error:
+            raise Exception(f"Modelo de transcrição não carregado: {self.load_error}")
+        if self.chunked is not None and self.chunked.is_long(audio_path):
+            # Idioma detectado numa amostra curta: todos os trechos já saem em paralelo
+            if language is None:
+                language = self.detect_language(audio_path)
+            return self.chunked.transcribe(audio_path, language, on_segment)
+        return self.backend.transcribe(audio_path, language, on_segment)
+
+    def detect_language(self, audio_path, sample_seconds=30):
+        """Idioma dos primeiros `sample_seconds` do áudio, ou None"""
+        blocks = media.iter_pcm(audio_path, block_seconds=sample_seconds)
+        try:
+            sample = next(blocks, None)
+        finally:
+            blocks.close()
+        if sample is None:
+            return None
+        try:
+            return self.backend.detect_language(sample)
+        except Exception as e:
+            print(f"[WARNING] Serviço de transcrição: falha na detecção de idioma: {str(e)}")
+            return None
+
+    def close(self):
+        if self.chunked is not None:
+            self.chunked.shutdown()
+
+    def _handle(self, conn):
+        try:
+            while True:
+                try:
+                    request = conn.recv()
+                except EOFError:
+                    break
+                # Segmentos seguem pelo socket enquanto o restante é decodificado
+                on_segment = None
+                if request.get('stream'):
+                    def on_segment(segment):
+                        conn.send({'type': 'segment', 'segment': segment})
+                try:
+                    result = self.transcribe(request['audio_path'], request.get('language'), on_segment)
+                    conn.send({'type': 'result', 'ok': True, 'result': result})
+                except Exception as e:
+                    print(f"[ERROR] Serviço de transcrição: {str(e)}")
+                    conn.send({'type': 'result', 'ok': False, 'error': str(e)})
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        address, family = _listener_address(self.address)
+        if family == 'AF_UNIX' and os.path.exists(address):
+            os.remove(address)
+
+        # O socket aceita conexões já durante o carregamento; os pedidos
+        # esperam o modelo ficar pronto em vez de cair no fallback local
+        listener = Listener(address, family=family, authkey=self.authkey)
+        threading.Thread(target=self.load, daemon=True).start()
+        print(f"[INFO] Serviço de transcrição escutando em {address}")
+
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:
+                print(f"[ERROR] Serviço de transcrição: conexão recusada: {str(e)}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+def serve(address, authkey, options):
+    """Ponto de entrada do processo do serviço"""
+    server = TranscriptionServer(address, authkey, options)
+    # terminate() (gunicorn.conf.py) encerra também o pool de transcrição em partes
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    finally:
+        server.close()
+
+
+def start_service_process(address, authkey, options):
+    """Inicia o serviço em um processo separado (usado pelo gunicorn.conf.py)"""
+    # spawn: o processo do serviço não herda o estado do master do Gunicorn.
+    # Não é daemon porque cria o pool de processos dos áudios longos; o
+    # gunicorn.conf.py o encerra em on_exit
+    context = multiprocessing.get_context('spawn')
+    process = context.Process(
+        target=serve, args=(address, authkey, options),
+        name='transcription-service', daemon=False
+    )
+    process.start()
+    return process
+
+
+class TranscriptionClient:
+    """Envia pedidos de transcrição ao serviço"""
+
+    def __init__(self, address, authkey, timeout=3600):
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+
+    def transcribe(self, audio_path, language=None, on_segment=None):
+        address, family = _listener_address(self.address)
+        try:
+            conn = Client(address, family=family, authkey=self.authkey)
+        except (OSError, EOFError) as e:
+            raise TranscriptionUnavailable(str(e))
+
+        try:
+            conn.send({
+                'audio_path': os.path.abspath(audio_path),
+                'language': language,
+                'stream': on_segment is not None
+            })
+            while True:
+                if not conn.poll(self.timeout):
+                    # Não é indisponibilidade: repetir localmente só dobraria o trabalho
+                    raise Exception('Tempo esgotado aguardando o serviço de transcrição')
+                response = conn.recv()
+                if response['type'] != 'segment':
+                    break
+                on_segment(response['segment'])
+        except (OSError, EOFError) as e:
+            raise TranscriptionUnavailable(str(e))
+        finally:
+            conn.close()
+
+        if not response['ok']:
+            raise Exception(response['error'])
+        return response['result']
+
+
+def service_settings(settings, base_dir):
+    """(endereço, authkey, opções) do serviço a partir da configuração"""
+    address = os.path.join(base_dir, settings.DATA_FOLDER, settings.TRANSCRIPTION_SERVICE_SOCKET)
+    options = dict(backend_options(settings), backend=settings.TRANSCRIPTION_BACKEND)
+    if settings.LONG_AUDIO_MIN_SECONDS:
+        options['chunked'] = {
+            'workers': settings.LONG_AUDIO_WORKERS,
+            'min_seconds': settings.LONG_AUDIO_MIN_SECONDS,
+            'chunk_seconds': settings.LONG_AUDIO_CHUNK_SECONDS,
+            'overlap_seconds': settings.LONG_AUDIO_CHUNK_OVERLAP_SECONDS,
+            'vad_threshold_db': settings.VAD_THRESHOLD_DB,
+            'vad_min_silence': settings.VAD_MIN_SILENCE_MS / 1000,
+        }
+    return address, settings.TRANSCRIPTION_SERVICE_AUTHKEY.encode(), options
+
+
+if __name__ == '__main__':
+    from config import get_config
+
+    settings = get_config(os.environ.get('FLASK_ENV', 'development'))
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    os.makedirs(os.path.join(base_dir, settings.DATA_FOLDER), exist_ok=True)
+    try:
+        serve(*service_settings(settings, base_dir))
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,113 @@
+"""
+Pool de instâncias persistentes do yt-dlp
+
+Criar um YoutubeDL por vídeo descarta conexões HTTP (e o handshake TLS),
+cookies e o estado já inicializado dos extratores. Aqui as instâncias vivem
+entre jobs, separadas por perfil de plataforma (generic, tiktok, instagram)
+e variante (ex.: 'mp3', com pós-processamento), e cada uma é usada por uma
+thread de cada vez. As instâncias de um mesmo perfil compartilham o pote de
+cookies (http.cookiejar é seguro entre threads).
+
+Por vídeo mudam apenas o caminho de saída, o formato e o hook de progresso.
+"""
+
+import threading
+from contextlib import contextmanager
+
+import yt_dlp
+
+
+class _Session:
+    """Uma instância do YoutubeDL e o hook de progresso do job que a está usando"""
+
+    def __init__(self, ydl):
+        self.ydl = ydl
+        self.uses = 0
+        self.progress_hook = None
+        self.format_selectors = {}
+        ydl.add_progress_hook(self._on_progress)
+
+    def _on_progress(self, progress):
+        if self.progress_hook is not None:
+            self.progress_hook(progress)
+
+    def configure(self, outtmpl, format_spec, progress_hook):
+        params = self.ydl.params
+        # O YoutubeDL normaliza 'outtmpl' e compila o seletor de formato no
+        # construtor; os dois são refeitos aqui para a instância reaproveitada
+        params['outtmpl']['default'] = outtmpl
+        if params.get('format') != format_spec:
+            if format_spec not in self.format_selectors:
+                self.format_selectors[format_spec] = self.ydl.build_format_selector(format_spec)
+            params['format'] = format_spec
+            self.ydl.format_selector = self.format_selectors[format_spec]
+        self.progress_hook = progress_hook
+        self.uses += 1
+
+
+class YoutubeDLPool:
+    """Instâncias do YoutubeDL reaproveitadas entre jobs, por perfil e variante"""
+
+    def __init__(self, base_options, profiles, variants=None, max_idle=4, max_uses=100):
+        self.base_options = base_options
+        self.profiles = profiles
+        self.variants = variants or {}
+        self.max_idle = max_idle
+        # Instâncias são renovadas de tempos em tempos (caches e cookies crescem)
+        self.max_uses = max_uses
+        self._idle = {}
+        self._cookiejars = {}
+        self._lock = threading.Lock()
+
+    def _create(self, profile, variant):
+        options = dict(self.base_options, **self.profiles[profile], **self.variants.get(variant, {}))
+        ydl = yt_dlp.YoutubeDL(options)
+        with self._lock:
+            cookiejar = self._cookiejars.setdefault(profile, ydl.cookiejar)
+        # Mesmo pote de cookies para todas as instâncias do perfil
+        ydl.cookiejar = cookiejar
+        return _Session(ydl)
+
+    def _checkout(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        return self._create(*key)
+
+    def _checkin(self, key, session):
+        session.progress_hook = None
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if session.uses < self.max_uses and len(idle) < self.max_idle:
+                idle.append(session)
+                return
+        session.ydl.close()
+
+    @contextmanager
+    def session(self, profile, outtmpl, format_spec, progress_hook=None, variant='default'):
+        """
+        Empresta uma instância configurada para um vídeo
+
+        Args:
+            profile: Perfil da plataforma (chave de `profiles`)
+            outtmpl: Caminho de saída do download
+            format_spec: Seletor de formato do yt-dlp
+            progress_hook: Recebe os dicionários de progresso do download
+            variant: Opções extras (chave de `variants`)
+        """
+        key = (profile, variant)
+        session = self._checkout(key)
+        session.configure(outtmpl, format_spec, progress_hook)
+        try:
+            yield session.ydl
+        finally:
+            self._checkin(key, session)
+
+    def close(self):
+        """Fecha todas as instâncias ociosas"""
+        with self._lock:
+            sessions = [session for idle in self._idle.values() for session in idle]
+            self._idle.clear()
+        for session in sessions:
+            session.ydl.close()